@@ -6,16 +6,13 @@ Created on Mon Feb 10 13:53:50 2025
 """
 
 import streamlit as st
-from supabase import create_client, Client
-import datetime
-import pytz
 import time
-import requests
-from dateutil import parser
-import streamlit.components.v1 as components
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import io
 import random
+import math
+import uuid
+
+# Stdlib-only: decides whether we are open before anything heavy is imported
+from parking.booking_window import CALENDARS, bookable_pairs, get_booking_date, is_booking_open
 
 
 
@@ -34,28 +31,77 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# --------------------------------------------------
+# Fast path: closed window
+# --------------------------------------------------
+# Most traffic outside 16:00-08:30 is people checking whether booking is
+# open, so answer that before importing Supabase/PIL/requests or reading
+# secrets.
+st.title("88 Colin Street Visitor Car Bay Booking")
+
+# Check if bookings are open
+booking_open = is_booking_open()
+booking_date = get_booking_date()
+
+BOOKING_CLOSED_NOTICE = ("Booking opens at 4:00 PM and closes at 8:30 AM. "
+                         "Please return during this time to make your booking.")
+
+if not booking_open:
+    if booking_date.weekday() == 0:  # If the next day's booking date is Monday
+        st.warning("Bookings are not allowed for Mondays. Please return after 4:00 PM on Monday to book for Tuesday.")
+    else:
+        st.warning(BOOKING_CLOSED_NOTICE)
+
+    st.stop()  # Stop the app execution here to prevent form display
+
+# Every (site, date) currently open for booking, from the per-site calendars
+booking_pairs = bookable_pairs()
+if not booking_pairs:
+    # The window closed between the two checks above
+    st.warning(BOOKING_CLOSED_NOTICE)
+    st.stop()
+
 # --------------------------------------------------
 # Supabase Setup
 # --------------------------------------------------
+from parking import db, metrics
+from parking.admission import AdmissionControl
+from parking.availability import AvailabilityCache
+from parking.challenges import COLORS, ChallengeImageBank
+from parking.membership import ALLOWED, BLACKLISTED, VehicleMembership
+from parking.notify import TeamsOutbox
+from parking.resilience import ServiceBusy
+from parking.waitlist import WaitlistWatcher
+
 # Retrieve secrets from .streamlit/secrets.toml
-SUPABASE_URL = st.secrets["supabase"]["SUPABASE_URL"]
+# Storage (Supabase, direct Postgres or SQLite, per [storage]) is opened once
+# per process in parking/db.py.
 SC_BP = int(st.secrets["supabase"]["SC"])
-SUPABASE_KEY = st.secrets["supabase"]["SUPABASE_KEY"]
 TEAMS_WEBHOOK_URL = st.secrets["teams_webhook"]["TEAMS_WEBHOOK_URL"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+TEAMS_OUTBOX_PATH = st.secrets["teams_webhook"].get("OUTBOX_PATH", "teams_outbox.sqlite3")
+
+# Instrumentation (off unless [metrics] ENABLED = true); see pages/3_Metrics.py
+metrics.configure(enabled=st.secrets.get("metrics", {}).get("ENABLED", False),
+                  path=st.secrets.get("metrics", {}).get("PATH"))
 
 # --------------------------------------------------
 # Configuration
 # --------------------------------------------------
-TOTAL_BAYS = 4
-TIMEZONE = pytz.timezone("Asia/Shanghai")  # Adjust as needed
 LOCK_DURATION = 60  # 1 minute to complete form
-
-# Booking windows:
-# Opens at 16:00 (4 PM), closes at 08:30 next morning
-BOOKING_START_HOUR = 16  # 4:00 PM in 24-hour format
-BOOKING_END_HOUR = 8  # 8:30 AM
-BOOKING_END_MINUTE = 30
+FAIRNESS_DELAY_MIN = 10.0  # seconds; randomised to prevent bot-timing patterns
+FAIRNESS_DELAY_MAX = 20.0
+AVAILABILITY_TTL = 3  # seconds a cached bay count is shared across sessions
+AVAILABILITY_REFRESH = 2  # seconds between live bay-counter refreshes
+ADMISSION_MAX_CONCURRENT = 8  # availability checks/reservations running at once per process
+ADMISSION_RATE = 0.5  # attempts per second each session earns back
+ADMISSION_BURST = 3  # attempts a session may make back to back
+QUEUE_POLL = 1  # seconds between waiting-room position updates
+WAITLIST_POLL = 2  # seconds between waitlist position updates
+WAITLIST_SWEEP = 15  # seconds between promotions for bays freed by other processes
+WAITLIST_STALE = 10  # seconds without a status rerun before a waiting session stops being polled
+
+# Car parks, their capacities and booking window rules (16:00-08:30, no
+# Mondays) live in parking/booking_window.py (SITES)
 
 # --------------------------------------------------
 # Initialize session state variables
@@ -66,6 +112,8 @@ if "locked" not in st.session_state:
     st.session_state["locked"] = False
 if "temp_record_id" not in st.session_state:
     st.session_state["temp_record_id"] = None
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
 if "lock_time" not in st.session_state:
     st.session_state["timeout_reached"] = False
     st.session_state["lock_time"] = None
@@ -79,43 +127,14 @@ if "lock_time" not in st.session_state:
 # Challenge Helpers & Logic
 # --------------------------------------------------
 
-def generate_challenge_image(number):
-    """Generates a distorted image of a number to defeat OCR."""
-    # Create a blank image with a noise background
-    img = Image.new('RGB', (200, 80), color=(240, 240, 240))
-    d = ImageDraw.Draw(img)
-    
-    # Add some random 'noise' lines
-    for _ in range(10):
-        d.line([(random.randint(0,200), random.randint(0,80)), 
-                (random.randint(0,200), random.randint(0,80))], 
-               fill=(200, 200, 200), width=1)
-
-    # Use a default font (or path to a .ttf)
-    # On some systems you might need to specify a path to a font file
-    try:
-        font = ImageFont.load_default()
-    except:
-        font = None
-
-    text = str(number)
-    # Draw text with slight random offset
-    d.text((70 + random.randint(-10, 10), 20 + random.randint(-5, 5)), 
-           text, fill=(50, 50, 50), font=font, spacing=4)
-    
-    # Apply a blur or contour to mess with OCR
-    img = img.filter(ImageFilter.EDGE_ENHANCE_MORE)
-    
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    return buf.getvalue()
-
-def generate_color_block(color_rgb):
-    """Generates a simple colored square image."""
-    img = Image.new('RGB', (100, 100), color=color_rgb)
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    return buf.getvalue()
+@st.cache_resource
+def get_image_bank():
+    """
+    Challenge PNGs rendered once and shared by all sessions (and replicas,
+    with a shared cache). Their noise is seeded from [challenges] SEED if
+    set, otherwise from a random seed per process.
+    """
+    return ChallengeImageBank(cache=db.get_cache(), seed=st.secrets.get("challenges", {}).get("SEED"))
 
 def initialize_challenges():
     """Ensures all required challenge keys exist in session state."""
@@ -123,12 +142,7 @@ def initialize_challenges():
         st.session_state["slider_target"] = random.randint(10, 90)
     
     if "color_options" not in st.session_state:
-        colors = [
-            ("Red", (255, 0, 0)), 
-            ("Blue", (0, 0, 255)), 
-            ("Green", (0, 255, 0)), 
-            ("Yellow", (255, 255, 0))
-        ]
+        colors = list(COLORS)
         random.shuffle(colors)
         st.session_state["color_options"] = colors
         
@@ -141,108 +155,352 @@ def initialize_challenges():
             if name == st.session_state["target_color_name"]:
                 st.session_state["correct_color_index"] = i
 
-def is_booking_open():
+def fairness_delay_remaining():
     """
-    Returns True if the current local time is within the booking window
-    and the next day's booking date is NOT Monday.
+    Seconds left before this session may move past the colour challenge.
+
+    The deadline is a server-side timestamp in session state, so nothing
+    sleeps while the user waits.
     """
-    now_local = datetime.datetime.now(pytz.UTC).astimezone(TIMEZONE)
-    booking_date = get_booking_date()
+    not_before = st.session_state.get("fairness_not_before")
+    if not_before is None:
+        return 0
+    return max(0.0, not_before - time.time())
+
+@st.fragment(run_every=1)
+def fairness_countdown():
+    """
+    Countdown shown while the fairness delay runs. Only this fragment
+    reruns each second; the rest of the script is left alone.
+    """
+    metrics.inc("streamlit_reruns_total", stage="fairness_countdown")
+    remaining = fairness_delay_remaining()
+    if remaining > 0:
+        st.info(f"Running random time delay for fairness (10 - 20 seconds). "
+                f"Please wait... {math.ceil(remaining)}s")
+        return
+
+    if st.button("Continue"):
+        # Re-check the deadline when the user actually proceeds
+        if fairness_delay_remaining() > 0:
+            st.rerun(scope="fragment")
+        st.session_state["challenge_stage"] = 3
+        st.session_state["question_verified"] = True
+        st.rerun()
+
+def reserve_bay(site, booking_date):
+    """
+    Reserves a temporary hold on a bay at site for booking_date in a single
+    round trip. Returns the hold id, or None if all bays are taken.
+    """
+    hold_id = db.reserve_bay(booking_date, site.total_bays, LOCK_DURATION, site=site.code)
+    if hold_id is not None:
+        get_availability_cache().invalidate((site.code, booking_date))
+        get_waitlist().hold_placed(hold_id, site.code, booking_date, time.time() + LOCK_DURATION)
+    return hold_id
 
-    # If the calculated booking date is Monday, prevent booking
-    if booking_date.weekday() == 0:  # 0 = Monday
-        return False
 
-    current_hour = now_local.hour
-    current_minute = now_local.minute
+def release_hold(hold_id, site, booking_date):
+    """
+    Deletes this session's hold before it expires, freeing the bay for the
+    head of the waitlist.
+    """
+    db.release_hold(hold_id)
+    get_availability_cache().invalidate((site.code, booking_date))
+    get_waitlist().hold_settled(hold_id)
+    get_waitlist().bay_freed(site.code, booking_date)
+
 
-    # Booking is open between 16:00 (4 PM) - 08:30 the next day
-    if current_hour >= BOOKING_START_HOUR:
-        return True
-    elif current_hour < BOOKING_END_HOUR or (current_hour == BOOKING_END_HOUR and current_minute <= BOOKING_END_MINUTE):
-        return True
+# --------------------------------------------------
+# Waiting room
+# --------------------------------------------------
 
-    return False
+@st.cache_resource
+def get_admission():
+    """One waiting room shared by every session in this process."""
+    return AdmissionControl(max_concurrent=ADMISSION_MAX_CONCURRENT,
+                            rate=ADMISSION_RATE, burst=ADMISSION_BURST)
 
 
-def get_booking_date():
+def queue_action(action, slot=None):
     """
-    Determines the booking date based on the current time.
-    - If it's after 16:00, the booking is for tomorrow.
-    - If tomorrow is Monday, booking is not allowed.
+    Puts this session in the waiting room for action ("check" or
+    "reserve" a (site, date) slot). Returns False, with a warning, if the
+    session's attempt budget is spent.
     """
-    now_local = datetime.datetime.now(pytz.UTC).astimezone(TIMEZONE)
+    wait = get_admission().allow(st.session_state["session_id"])
+    if wait > 0:
+        st.warning(f"Too many attempts. Please wait {math.ceil(wait)}s and try again.")
+        return False
+    get_admission().enqueue(st.session_state["session_id"])
+    st.session_state["queued_action"] = (action, slot)
+    return True
 
-    # Determine the next day's booking date
-    if now_local.hour >= BOOKING_START_HOUR:
-        booking_date = now_local.date() + datetime.timedelta(days=1)
-    else:
-        booking_date = now_local.date()
 
-    return booking_date
+def run_queued_action(action, slot):
+    """Runs an admitted action and records its outcome in session state."""
+    if action == "check":
+        st.session_state["available_bays"] = sum(free for _, _, free in get_available_bays(booking_pairs))
+        st.session_state["availability_checked"] = True
+        return
+
+    site, booking_date = slot
+    # Expiry sweep, capacity check and hold creation happen atomically
+    # in the database, so this is a single round trip per click.
+    inserted_id = reserve_bay(site, booking_date)
+    if inserted_id is None:
+        st.session_state["availability_notice"] = "All available bays have now been allocated."
+        return
+
+    st.session_state["hold_site"] = site
+    st.session_state["hold_date"] = booking_date
+    st.session_state["temp_record_id"] = inserted_id
+    st.session_state["lock_time"] = time.time()
+    st.session_state["locked"] = True
 
 
-def cleanup_old_temporary_reservations():
+@st.fragment(run_every=QUEUE_POLL)
+def waiting_room():
     """
-    Removes 'TEMP' records older than LOCK_DURATION.
+    Shows this session's place in the queue, polling once a second without
+    rerunning the script, and runs the queued action once admitted.
     """
-    expiration_time = datetime.datetime.now(pytz.UTC) - datetime.timedelta(seconds=LOCK_DURATION)
-    response = supabase.table("maca_parking").select("id", "created_at").eq("first_name", "TEMP").execute()
-    if response.data:
-        for record in response.data:
-            try:
-                record_time = parser.isoparse(record["created_at"])
-                # Ensure UTC timezone
-                if record_time.tzinfo is None:
-                    record_time = record_time.replace(tzinfo=pytz.UTC)
-                if record_time <= expiration_time:
-                    supabase.table("maca_parking").delete().eq("id", record["id"]).execute()
-            except ValueError as e:
-                st.error(f"Error parsing timestamp: {e}")
+    metrics.inc("streamlit_reruns_total", stage="waiting_room")
+    admission = get_admission()
+    session_id = st.session_state["session_id"]
+    ahead = admission.enqueue(session_id)  # also keeps our place alive
+    if not admission.try_acquire(session_id):
+        st.info(f"You're in the queue. {ahead} ahead of you. Please keep this page open.")
+        return
+
+    try:
+        run_queued_action(*st.session_state["queued_action"])
+    except ServiceBusy as e:
+        # Backend slow, failing or breaker open: give up the turn and say so
+        st.session_state["service_notice"] = str(e)
+    finally:
+        admission.release()
+        del st.session_state["queued_action"]
+    st.rerun()
 
 
 # --------------------------------------------------
-# Teams channel integration
+# Waitlist
 # --------------------------------------------------
 
-def send_teams_notification(webhook_url: str, message: str):
+@st.cache_resource
+def get_waitlist():
+    """
+    One waitlist watcher per process. It promotes waiters as soon as a hold
+    placed here is released or lapses, and polls every live waiting
+    session's status in one batched query.
     """
-    Sends a notification to a Microsoft Teams channel
-    via an Incoming Webhook.
+    def promote(site_code, booking_date):
+        site = CALENDARS[site_code].site
+        return db.promote_waitlist(booking_date, site.total_bays, LOCK_DURATION, site=site_code)
+
+    return WaitlistWatcher(db.poll_waitlist, promote, poll_interval=WAITLIST_POLL,
+                           sweep_interval=WAITLIST_SWEEP, stale_after=WAITLIST_STALE).start()
+
+
+def join_waitlist(site, booking_date):
+    """Queues this session for the next bay freed at site on booking_date."""
+    session_id = st.session_state["session_id"]
+    db.join_waitlist(site.code, booking_date, session_id)
+    get_waitlist().watch(session_id, site.code, booking_date)
+    st.session_state["waitlist"] = (site, booking_date)
+
 
-    :param webhook_url: The full Teams webhook URL.
-    :param message:     The text to display in Teams.
+def leave_waitlist():
+    session_id = st.session_state["session_id"]
+    get_waitlist().unwatch(session_id)
+    st.session_state.pop("waitlist", None)
+    db.leave_waitlist(session_id)
+
+
+@st.fragment(run_every=WAITLIST_POLL)
+def waitlist_status():
+    """
+    Shows this session's place on the waitlist. Reads the watcher's latest
+    batched poll, so waiting costs no queries of its own, and moves straight
+    to the booking form once a freed bay has been handed to this session.
     """
-    payload = {
-        "text": message
-    }
+    metrics.inc("streamlit_reruns_total", stage="waitlist")
+    site, booking_date = st.session_state["waitlist"]
+    get_waitlist().heartbeat(st.session_state["session_id"])
+    entry = get_waitlist().status(st.session_state["session_id"])
+
+    if entry and entry["status"] == "promoted":
+        get_waitlist().unwatch(st.session_state["session_id"])
+        del st.session_state["waitlist"]
+        st.session_state["hold_site"] = site
+        st.session_state["hold_date"] = booking_date
+        st.session_state["temp_record_id"] = entry["hold_id"]
+        st.session_state["lock_time"] = entry["hold_expires_at"] - LOCK_DURATION
+        st.session_state["timeout_reached"] = False
+        st.session_state["locked"] = True
+        st.rerun()
 
-    try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()  # Raise an error if request failed
-    except Exception as e:
-        print(f"Error sending Teams notification: {e}")
+    if entry and entry["status"] == "left":
+        get_waitlist().unwatch(st.session_state["session_id"])
+        del st.session_state["waitlist"]
+        st.session_state["service_notice"] = "Your place on the waitlist lapsed. Please check available bays again."
+        st.rerun()
+
+    if entry is None:
+        st.info(f"You're on the waitlist for {site.name} on {booking_date}.")
+    else:
+        st.info(f"You're on the waitlist for {site.name} on {booking_date}. "
+                f"{entry['position']} ahead of you. Keep this page open: a freed bay "
+                f"is reserved for you automatically.")
+
+    if st.button("Leave Waitlist"):
+        try:
+            leave_waitlist()
+        except ServiceBusy as e:
+            st.session_state["service_notice"] = str(e)
+        st.rerun()
 
 
 # --------------------------------------------------
-# Main UI
+# Availability
 # --------------------------------------------------
-st.title("88 Colin Street Visitor Car Bay Booking")
 
-# Check if bookings are open
-booking_open = is_booking_open()
-booking_date = get_booking_date()
+@st.cache_resource
+def get_availability_cache():
+    """One availability cache shared by every session in this process (and replicas, with a shared cache)."""
+    return AvailabilityCache(ttl=AVAILABILITY_TTL, cache=db.get_cache())
 
-if not booking_open:
-    if booking_date.weekday() == 0:  # If the next day's booking date is Monday
-        st.warning("Bookings are not allowed for Mondays. Please return after 4:00 PM on Monday to book for Tuesday.")
+
+def get_available_bays(pairs):
+    """
+    Returns [(site, date, free_bays)] for every (site, date) pair, served
+    from the shared cache. Stale pairs are counted in one grouped query.
+    """
+    counts = get_availability_cache().get_many(
+        [(site.code, booking_date) for site, booking_date in pairs], db.count_bookings_bulk)
+    return [(site, booking_date, max(0, site.total_bays - counts[(site.code, booking_date)]))
+            for site, booking_date in pairs]
+
+
+@st.fragment(run_every=AVAILABILITY_REFRESH)
+def live_availability(pairs):
+    """
+    Self-refreshing bay counter and "Request a Bay" button. Only this
+    fragment reruns on the timer, and it reads the shared availability
+    cache, so viewers cost at most one count query per TTL between them.
+    """
+    metrics.inc("streamlit_reruns_total", stage="availability_live")
+    try:
+        availability = get_available_bays(pairs)
+    except ServiceBusy as e:
+        st.warning(f"{e} Availability will refresh automatically.")
+        return
+    open_slots = {f"{site.code}|{booking_date}": (site, booking_date, free)
+                  for site, booking_date, free in availability if free > 0}
+    st.session_state["available_bays"] = sum(free for _, _, free in availability)
+
+    if not open_slots:
+        st.error("Sorry, there are no visitor bays currently available.")
+        full_slots = {f"{site.code}|{booking_date}": (site, booking_date)
+                      for site, booking_date, _ in availability}
+        choice = next(iter(full_slots), None)
+        if choice is None:
+            # Nothing is bookable any more (the window has closed), so there is nothing to wait for
+            st.info(BOOKING_CLOSED_NOTICE)
+            return
+        if len(full_slots) > 1:
+            choice = st.radio(
+                "Choose a car park and date to wait for",
+                list(full_slots),
+                format_func=lambda slot: "{0.name}, {1:%a %d %b}".format(*full_slots[slot]),
+                key="waitlist_choice",
+            )
+        if st.button("Join Waitlist"):
+            try:
+                join_waitlist(*full_slots[choice])
+            except ServiceBusy as e:
+                st.session_state["service_notice"] = str(e)
+            st.rerun()
+        return
+
+    notice = st.session_state.pop("availability_notice", None)
+    if notice:
+        st.error(notice)
+
+    if len(availability) == 1:
+        site, booking_date, free = availability[0]
+        st.success(f"{free} bay(s) available for {booking_date}")
     else:
-        st.warning(
-            "Booking opens at 4:00 PM and closes at 8:30 AM. Please return during this time to make your booking.")
+        choice = st.radio(
+            "Choose a car park and date",
+            list(open_slots),
+            format_func=lambda slot: "{0.name}, {1:%a %d %b}: {2} bay(s) available".format(*open_slots[slot]),
+            key="slot_choice",
+        )
+        site, booking_date, free = open_slots[choice]
+
+    if st.button("Request a Bay") and queue_action("reserve", (site, booking_date)):
+        st.rerun()
 
-    st.stop()  # Stop the app execution here to prevent form display
 
-booking_date = get_booking_date()
+@st.fragment(run_every=1)
+def hold_countdown():
+    """
+    Ticks the hold countdown once a second without rerunning the script.
+    Triggers a full rerun when the hold runs out so it can be released.
+    """
+    if st.session_state.get("booking_confirmed"):
+        return
+    remaining = hold_remaining()
+    if remaining <= 0:
+        st.rerun()
+    st.progress(remaining / LOCK_DURATION, text=f"{remaining} second(s) left to complete the form")
+
+
+def hold_remaining():
+    """Whole seconds left on this session's hold."""
+    elapsed_time = time.time() - st.session_state["lock_time"]
+    return max(0, LOCK_DURATION - int(elapsed_time))
+
+
+# --------------------------------------------------
+# Approved list / blacklist
+# --------------------------------------------------
+
+@st.cache_resource
+def get_vehicle_membership():
+    """
+    In-memory mirror of approved_registrations and blacklist, loaded and
+    refreshed in the background, so the confirm path can check a
+    registration with no extra round trips. Until it has loaded, checks use
+    two indexed lookups instead.
+    """
+    return VehicleMembership(db.fetch_registration_keys, db.fetch_blacklist_after,
+                             find_approved=db.find_registration_ids,
+                             find_suspensions=db.find_suspensions).start()
+
+
+# Start loading as soon as the booking window is open, not on the first confirm
+get_vehicle_membership()
+
+
+# --------------------------------------------------
+# Teams channel integration
+# --------------------------------------------------
+
+@st.cache_resource
+def get_teams_outbox():
+    """
+    Process-wide Teams outbox. Messages are persisted locally and posted by a
+    background worker with timeouts, retries and digest batching.
+    """
+    return TeamsOutbox(TEAMS_WEBHOOK_URL, path=TEAMS_OUTBOX_PATH).start()
+
+
+# --------------------------------------------------
+# Main UI
+# --------------------------------------------------
 # Always run the check to ensure state is healthy
 initialize_challenges()
 
@@ -252,11 +510,12 @@ if "challenge_stage" not in st.session_state:
 
 # --- STAGE 1: THE SLIDER ---
 if st.session_state["challenge_stage"] == 1:
+    metrics.inc("streamlit_reruns_total", stage="challenge_1")
     st.subheader("Challenge1: Match the Number")
     st.info("Move the slider value to match the number you see in the image below.")
     
     target_val = st.session_state["slider_target"]
-    st.image(generate_challenge_image(target_val))
+    st.image(get_image_bank().number_image(target_val))
     
     user_slider = st.slider("Set value", 0, 100, 50)
 
@@ -279,114 +538,70 @@ if st.session_state["challenge_stage"] == 1:
 
 # --- STAGE 2: THE COLOR GRID ---
 elif st.session_state["challenge_stage"] == 2:
+    metrics.inc("streamlit_reruns_total", stage="challenge_2")
     target_name = st.session_state["target_color_name"]
     
     st.subheader("Challenge 2: Colour Picker")
-    st.markdown(f"Click the button located under the **{target_name}** square.")
-    
-    cols = st.columns(4)
-    for i in range(4):
-        with cols[i]:
-            color_name, color_rgb = st.session_state["color_options"][i]
+
+    if "fairness_not_before" in st.session_state:
+        # Correct colour already picked; wait out the fairness delay
+        fairness_countdown()
+    else:
+        st.markdown(f"Click the button located under the **{target_name}** square.")
+
+        cols = st.columns(4)
+        for i in range(4):
+            with cols[i]:
+                color_name, color_rgb = st.session_state["color_options"][i]
             
-            # FIXED: Uncommented the image generation
-            st.image(generate_color_block(color_rgb))
+                # FIXED: Uncommented the image generation
+                st.image(get_image_bank().color_block(color_rgb))
             
-            if st.button(f"Select {i+1}", key=f"btn_{i}"):
-                if i == st.session_state["correct_color_index"]:
-                    # Randomized delay to prevent bot-timing patterns
-                    delay = random.uniform(10.0, 20.0)
-                    with st.spinner(f"Running random time delay for fairness (10 - 20 seconds). Please wait..."):
-                        time.sleep(delay) 
-                    
-                    st.session_state["challenge_stage"] = 3
-                    st.session_state["question_verified"] = True
-                    st.rerun()
-                else:
-                    st.error("Wrong square! Resetting security check...")
-                    # FIXED: Reset all challenge data properly
-                    st.session_state["challenge_stage"] = 1
-                    keys_to_reset = ["color_options", "slider_target", "target_color_name"]
-                    for key in keys_to_reset:
-                        if key in st.session_state:
-                            del st.session_state[key]
-                    st.rerun()
+                if st.button(f"Select {i+1}", key=f"btn_{i}"):
+                    if i == st.session_state["correct_color_index"]:
+                        # Randomized delay to prevent bot-timing patterns
+                        delay = random.uniform(FAIRNESS_DELAY_MIN, FAIRNESS_DELAY_MAX)
+                        st.session_state["fairness_not_before"] = time.time() + delay
+                        st.rerun()
+                    else:
+                        st.error("Wrong square! Resetting security check...")
+                        # FIXED: Reset all challenge data properly
+                        st.session_state["challenge_stage"] = 1
+                        keys_to_reset = ["color_options", "slider_target", "target_color_name", "fairness_not_before"]
+                        for key in keys_to_reset:
+                            if key in st.session_state:
+                                del st.session_state[key]
+                        st.rerun()
 
 # --- FINAL STAGE: SUCCESS ---
 elif st.session_state["challenge_stage"] == 3:
+    metrics.inc("streamlit_reruns_total", stage="challenge_3")
     st.success("Checks Successfully Passed ✅")
     if st.button("Check Available Bays"):
-        cleanup_old_temporary_reservations()
-        response = supabase.table("maca_parking").select("id").eq("date", str(booking_date)).execute()
-        booked_count = len(response.data)
-        available_bays = TOTAL_BAYS - booked_count
+        if fairness_delay_remaining() > 0:
+            st.session_state["challenge_stage"] = 2
+            st.rerun()
 
-        st.session_state["availability_checked"] = True
-        st.session_state["available_bays"] = available_bays
-        st.rerun()
-        pass
+        if queue_action("check"):
+            st.rerun()
 
 # --------------------------------------------------
-# If availability checked and not locked, show availability
+# Queued sessions wait here; otherwise, if availability checked and not
+# locked, show availability
 # --------------------------------------------------
-if st.session_state.get("availability_checked") and not st.session_state.get("locked"):
-    available_bays = st.session_state.get("available_bays", 0)
-    if available_bays > 0:
-        st.success(f"{available_bays} bay(s) available for {booking_date}")
-
-        if st.button("Request a Bay"):
-            cleanup_old_temporary_reservations()
-
-            # Get updated bookings count INCLUDING 'TEMP' records
-            response = supabase.table("maca_parking").select("id").eq("date", str(booking_date)).execute()
-            current_count = len(response.data)
-
-            if current_count >= TOTAL_BAYS:
-                st.error("All available bays have now been allocated.")
-                st.stop()
-            else:
-                # Now insert 'TEMP' lock
-                temp_entry = supabase.table("maca_parking").insert({
-                    "date": str(booking_date),
-                    "first_name": "TEMP",
-                    "surname": "TEMP",
-                    "email": "TEMP",
-                    "mobile": "TEMP",
-                    "registration": "TEMP"
-                }).execute()
-
-                if not temp_entry.data:
-                    st.error("Failed to reserve your bay. Please try again.")
-                    st.stop()
-
-                inserted_id = temp_entry.data[0]['id']
-
-                # --- RACE CONDITION MITIGATION ---
-                # Check the total count again after we insert our TEMP record.
-                # If multiple users inserted at the exact same millisecond, this will catch it.
-                check_response = supabase.table("maca_parking").select("id, created_at").eq("date", str(booking_date)).order("created_at").execute()
-                
-                all_bays = check_response.data
-                if len(all_bays) > TOTAL_BAYS:
-                    # Find our position in the chronological list of bookings for this date
-                    our_index = next((i for i, row in enumerate(all_bays) if row['id'] == inserted_id), -1)
-                    
-                    # If our index is >= TOTAL_BAYS (meaning we are the 6th or later booking)
-                    if our_index >= TOTAL_BAYS:
-                        # Delete our temporary record and abort
-                        supabase.table("maca_parking").delete().eq("id", inserted_id).execute()
-                        st.error("Sorry, another user secured the last bay just milliseconds before you. Please try again.")
-                        st.stop()
-                # ---------------------------------
-
-                st.session_state["temp_record_id"] = inserted_id
-                st.session_state["lock_time"] = time.time()
-                st.session_state["locked"] = True
-                st.rerun()
-
-
-    else:
-        st.error("Sorry, there are no visitor bays currently available.")
+notice = st.session_state.pop("service_notice", None)
+if notice:
+    st.warning(notice)
+
+if st.session_state.get("queued_action"):
+    # Waiting room in front of the availability check and "Request a Bay"
+    waiting_room()
+elif st.session_state.get("waitlist") and not st.session_state.get("locked"):
+    # Full car park: a freed bay is handed to this session in queue order
+    waitlist_status()
+elif st.session_state.get("availability_checked") and not st.session_state.get("locked"):
+    metrics.inc("streamlit_reruns_total", stage="availability")
+    live_availability(booking_pairs)
 
 # --------------------------------------------------
 # Booking Form
@@ -396,27 +611,38 @@ if "booking_confirmed" not in st.session_state:
     st.session_state["booking_confirmed"] = False
 
 if st.session_state.get("locked") and not st.session_state.get("timeout_reached"):
+    metrics.inc("streamlit_reruns_total", stage="form")
     st.warning("You have 60 seconds to complete the form before your temporary reservation is released.")
-    elapsed_time = time.time() - st.session_state["lock_time"]
-    remaining_time = max(0, LOCK_DURATION - int(elapsed_time))
+    remaining_time = hold_remaining()
 
     # If time is up, release the lock
-    if remaining_time <= 0:
-        cleanup_old_temporary_reservations()
+    if remaining_time <= 0 and not st.session_state["booking_confirmed"]:
+        try:
+            release_hold(st.session_state["temp_record_id"], st.session_state["hold_site"],
+                         st.session_state["hold_date"])
+        except ServiceBusy:
+            pass  # the hold lapses on its own at expires_at
         st.session_state["timeout_reached"] = True
         st.session_state["locked"] = False
         st.error("Time expired! Please re-check available bays and try again.")
         st.stop()
 
     st.subheader("Complete Your Booking")
-    first_name = st.text_input("First Name")
-    surname = st.text_input("Surname")
-    email = st.text_input("Email")
-    mobile = st.text_input("Mobile")
-    registration = st.text_input("Vehicle Registration")
-
-    # The Confirm Booking button is disabled if booking_confirmed is True
-    if st.button("Confirm Booking", disabled=st.session_state["booking_confirmed"]):
+    hold_countdown()
+
+    # Inputs live in a form so typing does not rerun the script; only
+    # Confirm Booking does.
+    with st.form("booking_form"):
+        first_name = st.text_input("First Name")
+        surname = st.text_input("Surname")
+        email = st.text_input("Email")
+        mobile = st.text_input("Mobile")
+        registration = st.text_input("Vehicle Registration")
+
+        # The Confirm Booking button is disabled if booking_confirmed is True
+        confirm_clicked = st.form_submit_button("Confirm Booking", disabled=st.session_state["booking_confirmed"])
+
+    if confirm_clicked:
         # Only process if not already confirmed
         if not st.session_state["booking_confirmed"]:
 
@@ -426,25 +652,46 @@ if st.session_state.get("locked") and not st.session_state.get("timeout_reached"
                 time.sleep(3)  # Show message for 3 seconds
                 st.rerun()
            
+            # Approved list / blacklist check is served from memory once the mirror has loaded
+            try:
+                vehicle_status = get_vehicle_membership().check(registration)
+            except ServiceBusy as e:
+                st.warning(str(e))
+                st.stop()
+
             # Validate form fields
             if (not first_name or not surname or not email or not mobile or not registration
                     or ('thiess' not in email.lower() and 'maca' not in email.lower())):
                 st.error("All fields are required, and you must use a MACA or Thiess email address to book.")
+            elif vehicle_status == BLACKLISTED:
+                st.error("This vehicle is currently suspended from booking visitor bays.")
+            elif vehicle_status != ALLOWED:
+                st.error("This vehicle is not on the approved list. Please register it under "
+                         "Vehicle management before booking.")
             else:
                 # Update the temporary record to finalize
-                update_res = supabase.table("maca_parking").update({
-                    "first_name": first_name,
-                    "surname": surname,
-                    "email": email,
-                    "mobile": mobile,
-                    "registration": registration
-                }).eq("id", st.session_state["temp_record_id"]).execute()
-
-                if not update_res.data:
+                try:
+                    confirmed = db.confirm_booking(st.session_state["temp_record_id"], {
+                        "first_name": first_name,
+                        "surname": surname,
+                        "email": email,
+                        "mobile": mobile,
+                        "registration": registration
+                    })
+                except ServiceBusy as e:
+                    # The hold is still ours until it expires, so the form stays up
+                    st.warning(str(e))
+                    st.stop()
+
+                if not confirmed:
                     st.error("Your reservation timed out and was released. Please try again.")
                     st.session_state["locked"] = False
                     st.stop()
 
+                hold_site = st.session_state["hold_site"]
+                hold_date = st.session_state["hold_date"]
+                get_availability_cache().invalidate((hold_site.code, hold_date))
+                get_waitlist().hold_settled(st.session_state["temp_record_id"])
                 st.success("Booking Confirmed!")
                 st.balloons()
 
@@ -452,15 +699,16 @@ if st.session_state.get("locked") and not st.session_state.get("timeout_reached"
                 message_text = (
                     f"**New Booking Confirmed**\n\n"
                     f"**Name**: {first_name} {surname}\n"
-                    f"**Date**: {booking_date}\n"
+                    f"**Car park**: {hold_site.name}\n"
+                    f"**Date**: {hold_date}\n"
                     f"**Email**: {email}\n"
                     f"**Registration**: {registration}"
                 )
 
-                # Send Teams notification
-                send_teams_notification(TEAMS_WEBHOOK_URL, message_text)
+                # Queue Teams notification (delivered in the background)
+                get_teams_outbox().enqueue(message_text)
 
-                st.info("Notification sent to the Microsoft Teams channel.")
+                st.info("Notification queued for the Microsoft Teams channel.")
 
                 # Set the flag to prevent further clicks
                 st.session_state["booking_confirmed"] = True
@@ -0,0 +1,308 @@
+"""
+Load test for the booking flow at the 16:00 opening rush.
+
+Drives N concurrent simulated bookers through
+availability -> reserve -> confirm (or abandon and let the hold expire)
+against the local SQLite stand-in (parking/local_store.py) and a local
+Teams webhook stub. No network access is needed.
+
+With --admission N, availability checks and reservations go through the
+waiting room (parking/admission.py): at most N run at once, the rest
+queue FIFO, and each booker's retries are paced by its token bucket.
+
+--backend-delay/--backend-jitter/--backend-fail-rate wrap the store in the
+slow/failing stand-in (parking/flaky_store.py); --resilient puts it behind
+the deadlines, hedged reads and circuit breaker of parking/resilience.py,
+and sessions that get ServiceBusy back off and retry. With --resilient, any
+other exception reaching a session fails the run, and so does a breaker
+that never opens at --backend-fail-rate 1.0.
+
+Reports p50/p95/p99 latency per step, backend round trips per confirmed
+booking and throughput, and asserts that confirmed bookings never exceed
+the bay count for any date.
+
+Usage:
+    python benchmarks/bench_booking_rush.py [--bookers 500] [--dates 20] [--bays 4]
+        [--lock-seconds 2] [--abandon 0.2] [--think 0.2] [--seed 1]
+        [--admission 8] [--rate 2] [--burst 3]
+        [--backend-delay 0.05] [--backend-jitter 0.5] [--backend-fail-rate 0.05] [--resilient]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from parking.admission import AdmissionControl, AdmissionTimeout  # noqa: E402
+from parking.availability import AvailabilityCache  # noqa: E402
+from parking.flaky_store import FlakyStore  # noqa: E402
+from parking.local_store import LocalStore  # noqa: E402
+from parking.notify import TeamsOutbox  # noqa: E402
+from parking.resilience import CircuitBreaker, ResilientStore, ServiceBusy  # noqa: E402
+from parking.webhook_stub import WebhookStub  # noqa: E402
+
+
+class CountingStore:
+    """Wraps a store and counts every storage operation as one backend round trip."""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+
+    def is_service_error(self, error):
+        # Error classification, not a round trip
+        return self._store.is_service_error(error)
+
+    def __getattr__(self, name):
+        target = getattr(self._store, name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls[name] += 1
+            return target(*args, **kwargs)
+        return call
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, step, elapsed):
+        with self._lock:
+            self.samples[step].append(elapsed)
+
+    def timed(self, step, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.record(step, time.perf_counter() - start)
+
+
+class Outcomes(defaultdict):
+    """Thread-safe outcome counters."""
+
+    def __init__(self):
+        super().__init__(int)
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            self[key] += 1
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+@contextmanager
+def admitted(admission, session_id, rec, deadline):
+    """One guarded action: paced by the token bucket, then queued in the waiting room."""
+    if admission is None:
+        yield
+        return
+    wait = admission.allow(session_id)
+    if wait:
+        time.sleep(wait)  # retries are paced rather than refused outright
+        admission.allow(session_id)
+    start = time.perf_counter()
+    with admission.admit(session_id, timeout=max(0.0, deadline - time.monotonic())):
+        rec.record("queue", time.perf_counter() - start)
+        yield
+
+
+def booker(n, args, dates, store, cache, outbox, rec, results, start_gate, rng_seed, admission=None):
+    rng = random.Random(rng_seed)
+    # Behind ResilientStore every backend failure must arrive as ServiceBusy
+    busy = (ServiceBusy,) if args.resilient else (ConnectionError,)
+    booking_date = dates[n % len(dates)]
+    session_id = f"booker{n}"
+    start_gate.wait()
+    deadline = time.monotonic() + args.patience
+    while time.monotonic() < deadline:
+        try:
+            with admitted(admission, session_id, rec, deadline):
+                booked = rec.timed("availability", cache.get, booking_date, store.count_bookings)
+                hold_id = None
+                if booked < args.bays:
+                    hold_id = rec.timed("reserve", store.reserve_bay, booking_date, args.bays,
+                                        args.lock_seconds)
+        except AdmissionTimeout:
+            break
+        except busy:
+            results.add("busy")  # back off, as the app asks users to
+            time.sleep(rng.uniform(0.25, 0.5))
+            continue
+        if booked >= args.bays:
+            time.sleep(rng.uniform(0.05, 0.25))
+            continue
+
+        if hold_id is None:
+            results.add("full")
+            time.sleep(rng.uniform(0.05, 0.25))
+            continue
+        cache.invalidate(booking_date)
+
+        time.sleep(rng.uniform(0, args.think))  # filling in the form
+        if rng.random() < args.abandon:
+            results.add("abandoned")  # hold is left to expire
+            return
+
+        try:
+            ok = rec.timed("confirm", store.confirm_booking, hold_id, {
+                "first_name": f"User{n}", "surname": "Bench", "email": f"user{n}@maca.com",
+                "mobile": "0400000000", "registration": f"BENCH{n:04d}",
+            })
+        except busy:
+            results.add("busy_on_confirm")  # hold is left to expire
+            return
+        cache.invalidate(booking_date)
+        if ok:
+            rec.timed("notify_enqueue", outbox.enqueue, f"**New Booking Confirmed** user{n} {booking_date}")
+            results.add("confirmed")
+        else:
+            results.add("expired_before_confirm")
+        return
+    results.add("gave_up")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--bookers", type=int, default=500)
+    ap.add_argument("--dates", type=int, default=20, help="Distinct booking dates (car park/day pairs)")
+    ap.add_argument("--bays", type=int, default=4, help="Bays per date (TOTAL_BAYS)")
+    ap.add_argument("--lock-seconds", type=int, default=2, help="Hold duration (LOCK_DURATION, scaled down)")
+    ap.add_argument("--abandon", type=float, default=0.2, help="Fraction of holders who never confirm")
+    ap.add_argument("--think", type=float, default=0.2, help="Max seconds spent filling in the form")
+    ap.add_argument("--patience", type=float, default=5.0, help="Seconds a booker keeps retrying")
+    ap.add_argument("--cache-ttl", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--admission", type=int, default=0,
+                    help="Waiting-room slots (ADMISSION_MAX_CONCURRENT); 0 disables admission control")
+    ap.add_argument("--rate", type=float, default=2.0, help="Token-bucket refill per booker per second")
+    ap.add_argument("--burst", type=int, default=3, help="Token-bucket capacity per booker")
+    ap.add_argument("--backend-delay", type=float, default=0.0, help="Seconds added to every backend call")
+    ap.add_argument("--backend-jitter", type=float, default=0.0, help="Extra random delay per backend call")
+    ap.add_argument("--backend-fail-rate", type=float, default=0.0, help="Fraction of backend calls that raise")
+    ap.add_argument("--resilient", action="store_true",
+                    help="Wrap the store in ResilientStore (deadlines, hedged reads, circuit breaker)")
+    ap.add_argument("--read-timeout", type=float, default=1.0)
+    ap.add_argument("--write-timeout", type=float, default=2.0)
+    ap.add_argument("--hedge-after", type=float, default=0.2)
+    args = ap.parse_args()
+
+    base = datetime.date(2030, 1, 1)
+    dates = [base + datetime.timedelta(days=i) for i in range(args.dates)]
+
+    tmp = tempfile.mkdtemp(prefix="rush-")
+    local = LocalStore(os.path.join(tmp, "parking.sqlite3"))
+    backend = local
+    if args.backend_delay or args.backend_jitter or args.backend_fail_rate:
+        backend = FlakyStore(local, delay=args.backend_delay, jitter=args.backend_jitter,
+                             fail_rate=args.backend_fail_rate, seed=args.seed)
+    counting = store = CountingStore(backend)
+    breaker = CircuitBreaker(reset_timeout=1.0)
+    if args.resilient:
+        store = ResilientStore(counting, breaker,
+                               read_timeout=args.read_timeout, write_timeout=args.write_timeout,
+                               hedge_after=args.hedge_after, max_workers=32)
+    cache = AvailabilityCache(ttl=args.cache_ttl)
+    rec = Recorder()
+    results = Outcomes()
+    leaked = []
+
+    def run_booker(*booker_args):
+        try:
+            booker(*booker_args)
+        except Exception as e:
+            leaked.append(e)
+            results.add("error")
+
+    gate = threading.Barrier(args.bookers + 1)
+    admission = None
+    if args.admission:
+        admission = AdmissionControl(max_concurrent=args.admission, rate=args.rate, burst=args.burst,
+                                     ticket_ttl=args.patience)
+
+    with WebhookStub() as stub:
+        outbox = TeamsOutbox(stub.url, path=os.path.join(tmp, "outbox.sqlite3"), batch_window=0.2).start()
+        threads = [
+            threading.Thread(target=run_booker, args=(n, args, dates, store, cache, outbox, rec, results, gate,
+                                                  args.seed * 100003 + n, admission))
+            for n in range(args.bookers)
+        ]
+        for t in threads:
+            t.start()
+        gate.wait()  # 16:00
+        started = time.perf_counter()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        deadline = time.monotonic() + 10
+        while outbox.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        outbox.stop()
+        webhook_posts = len(stub.payloads)
+
+    # ---------- Report ----------
+    print(f"{args.bookers} bookers, {args.dates} date(s) x {args.bays} bay(s), "
+          f"hold {args.lock_seconds}s, abandon {args.abandon:.0%}, "
+          f"admission {args.admission or 'off'}")
+    print(f"{'step':<16}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step in ("queue", "availability", "reserve", "confirm", "notify_enqueue"):
+        ms = [v * 1000 for v in rec.samples.get(step, [])]
+        print(f"{step:<16}{len(ms):>7}{percentile(ms, 50):>10.2f}{percentile(ms, 95):>10.2f}{percentile(ms, 99):>10.2f}")
+
+    confirmed = results["confirmed"]
+    print()
+    print("outcomes:", {k: v for k, v in results.items()})
+    print("backend calls:", dict(counting.calls))
+    if confirmed:
+        print(f"round trips per confirmed booking: {counting.total_calls / confirmed:.2f}")
+    print(f"throughput: {args.bookers / elapsed:.1f} bookers/s, {confirmed / elapsed:.1f} confirmations/s "
+          f"over {elapsed:.2f}s")
+    print(f"webhook posts: {webhook_posts} (digests of {confirmed} notifications)")
+    if args.resilient:
+        print(f"circuit breaker opened {breaker.opened} time(s)")
+
+    # ---------- Invariant ----------
+    if leaked:
+        print(f"FAIL: {len(leaked)} session(s) hit an unexpected error, e.g. {leaked[0]!r}")
+        return 1
+    if args.resilient and args.backend_fail_rate >= 1.0 and not breaker.opened:
+        print("FAIL: every backend call failed but the circuit breaker never opened")
+        return 1
+    over = {str(d): local.count_confirmed(d) for d in dates if local.count_confirmed(d) > args.bays}
+    if over:
+        print(f"FAIL: confirmed bookings exceed {args.bays} bays: {over}")
+        return 1
+    if confirmed > args.bays * args.dates:
+        print("FAIL: more confirmations reported than bays exist")
+        return 1
+    print(f"OK: confirmed bookings never exceed {args.bays} per date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Import-time / first-render benchmark for app.py.
+
+Each scenario runs in a fresh interpreter so imports are cold:
+
+- closed: booking window shut; must not import any heavy module.
+- open:   first render of challenge stage 1 (checked to have rendered).
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--budget-ms 1500]
+
+Exits non-zero if the closed path imports a heavy module or its median
+first render exceeds the budget, or if the open path did not reach the
+challenge.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("supabase", "httpx", "PIL", "requests", "dateutil", "pytz", "pandas", "numpy")
+
+SECRETS = {
+    "supabase": {"SUPABASE_URL": "https://example.supabase.co", "SUPABASE_KEY": "bench", "SC": "0"},
+    "teams_webhook": {"TEAMS_WEBHOOK_URL": "http://127.0.0.1:9/webhook"},
+}
+
+
+def run_child(scenario):
+    """Runs one scenario in this (fresh) process and prints a JSON result."""
+    sys.path.insert(0, ROOT)
+    importlib.import_module("streamlit")  # baseline cost, not counted against app.py
+    from streamlit.testing.v1 import AppTest
+
+    from parking import booking_window
+    is_open = scenario == "open"
+    booking_window.is_booking_open = lambda now_local=None: is_open
+    # app.py also stops when no (site, date) is bookable, so pin that too
+    open_pairs = [(booking_window.DEFAULT_SITE, booking_window.get_booking_date())] if is_open else []
+    booking_window.bookable_pairs = lambda now_local=None: open_pairs
+
+    baseline = set(sys.modules)
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    for section, values in SECRETS.items():
+        at.secrets[section] = values
+
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+
+    loaded = set(sys.modules) - baseline
+    heavy = sorted({m.split(".")[0] for m in loaded} & set(HEAVY_MODULES))
+    print(json.dumps({
+        "scenario": scenario,
+        "first_render_ms": elapsed * 1000,
+        "modules_loaded": len(loaded),
+        "heavy_modules": heavy,
+        "challenge_rendered": any(h.value.startswith("Challenge1") for h in at.subheader),
+        "exception": [str(e.value) for e in at.exception],
+    }))
+
+
+def measure(scenario, runs):
+    results = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", scenario],
+            capture_output=True, text=True, check=True, cwd=ROOT,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=1500.0,
+                    help="Maximum median first render for the closed path")
+    ap.add_argument("--child", choices=("closed", "open"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    failed = False
+    for scenario in ("closed", "open"):
+        results = measure(scenario, args.runs)
+        times = [r["first_render_ms"] for r in results]
+        heavy = sorted({m for r in results for m in r["heavy_modules"]})
+        errors = [e for r in results for e in r["exception"]]
+        print(f"{scenario:>6}: median {statistics.median(times):8.1f} ms  "
+              f"min {min(times):8.1f} ms  modules +{results[0]['modules_loaded']}  "
+              f"heavy {heavy or '-'}")
+        if errors:
+            print(f"        exceptions: {errors}")
+            failed = True
+        if scenario == "closed":
+            if heavy:
+                print(f"FAIL: closed path imported {heavy}")
+                failed = True
+            if statistics.median(times) > args.budget_ms:
+                print(f"FAIL: closed path median exceeds {args.budget_ms} ms budget")
+                failed = True
+        elif not all(r["challenge_rendered"] for r in results):
+            print("FAIL: open path did not render challenge stage 1")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
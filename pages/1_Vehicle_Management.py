@@ -1,18 +1,13 @@
 # pages/1_Vehicle_Management.py
-import re
 import streamlit as st
-from supabase import create_client, Client
 
-st.set_page_config(page_title="Vehicle management", page_icon="🚗", layout="centered")
+from parking import db
+from parking.vehicles import FIELDS, validate_frame, validate_vehicle
 
-# --------------------------------------------------
-# Supabase Setup (mirrors your existing app)
-# --------------------------------------------------
-SUPABASE_URL = st.secrets["supabase"]["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["supabase"]["SUPABASE_KEY"]
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+IMPORT_BATCH_SIZE = 500  # rows per upsert request
+CSV_CHUNK_SIZE = 5000  # rows read from an uploaded CSV at a time
 
-TABLE_NAME = "approved_registrations"
+st.set_page_config(page_title="Vehicle management", page_icon="🚗", layout="centered")
 
 st.title("Vehicle management")
 st.caption("Add a vehicle to the register.")
@@ -34,65 +29,83 @@ with st.form("vehicle_form", clear_on_submit=True):
 
 if submitted:
     # --------- Validation ----------
-    errs = []
-
-    def req(name, val):
-        if not val or not str(val).strip():
-            errs.append(f"• {name} is required")
-
-    req("First name", first_name)
-    req("Last name", last_name)
-    req("Email", email)
-    req("Phone", phone)
-    req("Vehicle registration", registration)
-    req("Vehicle make", make)
-    req("Vehicle model", model)
-    req("Vehicle colour", colour)
-
-    # Simple email + phone sanity checks (not strict)
-    if email and not re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", email):
-        errs.append("• Please enter a valid email")
-    if phone and not re.match(r"^[0-9+\-\s()]{6,}$", phone):
-        errs.append("• Please enter a valid phone number")
-
-    # Normalise values
-    clean = {
-        "first_name": first_name.strip().title() if first_name else "",
-        "last_name":  last_name.strip().title() if last_name else "",
-        "email":      email.strip(),
-        "phone":      phone.strip(),
-        "registration": re.sub(r"\s+", "", registration).upper() if registration else "",
-        "make":       make.strip().title() if make else "",
-        "model":      model.strip().title() if model else "",
-        "colour":     colour.strip().title() if colour else "",
-    }
+    clean, errs = validate_vehicle({
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+        "phone": phone,
+        "registration": registration,
+        "make": make,
+        "model": model,
+        "colour": colour,
+    })
 
     if errs:
         st.error("Please fix the following:\n" + "\n".join(errs))
         st.stop()
 
-    # --------- Optional: Prevent obvious duplicates by (email, registration) ----------
+    # --------- Upsert (duplicates by (email, registration) are skipped) ----------
     try:
-        exists = supabase.table(TABLE_NAME)\
-            .select("id")\
-            .eq("email", clean["email"])\
-            .eq("registration", clean["registration"])\
-            .limit(1).execute()
-        if exists.data:
-            st.warning("This vehicle is already on the approved list for that email.")
-            st.stop()
+        saved = db.upsert_vehicles([clean])
     except Exception as e:
-        st.error(f"Lookup failed: {e}")
+        st.error(f"Insert failed: {e}")
         st.stop()
 
-    # --------- Insert ----------
+    if saved:
+        st.success("✅ Vehicle saved to approved list.")
+        st.balloons()
+    else:
+        st.warning("This vehicle is already on the approved list for that email.")
+
+# --------------------------------------------------
+# Bulk import
+# --------------------------------------------------
+st.divider()
+st.subheader("Bulk import")
+st.caption("Upload a CSV or XLSX with columns: " + ", ".join(FIELDS) + ". "
+           "Rows are checked with the same rules as the form above.")
+
+upload = st.file_uploader("Vehicle list", type=["csv", "xlsx"])
+
+def read_upload_chunks(file):
+    """Yields DataFrames from the upload; CSVs are streamed in chunks."""
+    import pandas as pd
+
+    if file.name.lower().endswith(".xlsx"):
+        yield pd.read_excel(file, dtype=str)
+    else:
+        yield from pd.read_csv(file, dtype=str, chunksize=CSV_CHUNK_SIZE)
+
+if upload is not None and st.button("Import vehicles", use_container_width=True):
+    import pandas as pd
+
+    inserted = skipped = 0
+    error_frames = []
+    progress = st.progress(0.0, text="Importing…")
     try:
-        res = supabase.table(TABLE_NAME).insert(clean).execute()
-        if res.data:
-            st.success("✅ Vehicle saved to approved list.")
-            st.balloons()
-        else:
-            st.error("Insert returned no data; please try again.")
+        for chunk in read_upload_chunks(upload):
+            clean, errors = validate_frame(chunk)
+            error_frames.append(errors)
+            records = clean.to_dict("records")
+            for start in range(0, len(records), IMPORT_BATCH_SIZE):
+                batch = records[start:start + IMPORT_BATCH_SIZE]
+                saved = db.upsert_vehicles(batch)
+                inserted += len(saved)
+                skipped += len(batch) - len(saved)
+                progress.progress(min(1.0, (upload.tell() or 1) / max(upload.size, 1)),
+                                  text=f"Imported {inserted} vehicle(s)…")
     except Exception as e:
-        st.error(f"Insert failed: {e}")
+        # Every batch before the failing one is already saved
+        progress.empty()
+        st.error(f"Import stopped: {e}. {inserted} vehicle(s) were added and {skipped} were already on "
+                 f"the approved list before the error; the remaining rows were not imported.")
+    else:
+        progress.empty()
+        st.success(f"✅ {inserted} vehicle(s) added. {skipped} already on the approved list.")
 
+    report = pd.concat(error_frames, ignore_index=True) if error_frames else pd.DataFrame()
+    if len(report):
+        st.error(f"{len(report)} row(s) rejected:")
+        st.dataframe(report, hide_index=True, use_container_width=True)
+        st.download_button("Download error report", report.to_csv(index=False),
+                           file_name="vehicle_import_errors.csv", mime="text/csv")
@@ -1,11 +1,26 @@
 # pages/3_🔎_Lookup_and_Blacklist.py
 
+import os
 import streamlit as st
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 
-# Supabase client
-from supabase import create_client, Client
+# Shared data access (one pooled Supabase client per process)
+from parking import db
+from parking.export import EXPORT_MAX_BYTES, FORMATS, ExportTooLarge, export_table
+from parking.registration import registration_key
+from parking.registration_index import RegistrationIndex, next_page
+from parking.resilience import ServiceBusy
+
+# Columns shown in lookup results (avoid select("*"))
+LOOKUP_COLUMNS = "id, registration, first_name, last_name, email, phone, make, model, colour"
+PAGE_SIZES = [25, 50, 100, 200]
+EXPORT_PAGE_SIZE = 1000  # rows fetched (and held in memory) per export request
+EXPORT_LABELS = {
+    db.BOOKINGS_TABLE: "Bookings (filtered by booking date)",
+    db.APPROVED_TABLE: "Approved vehicles",
+    db.BLACKLIST_TABLE: "Blacklist (filtered by suspension end)",
+}
 
 # ---------- Page setup ----------
 st.set_page_config(page_title="Lookup & Blacklist", page_icon="🔎", layout="centered")
@@ -13,12 +28,6 @@ st.set_page_config(page_title="Lookup & Blacklist", page_icon="🔎", layout="ce
 st.title("Registration Lookup & Blacklist")
 
 # ---------- Utilities ----------
-@st.cache_resource(show_spinner=False)
-def get_supabase() -> Client:
-    url = st.secrets["supabase"]["SUPABASE_URL"]
-    key = st.secrets["supabase"]["SUPABASE_KEY"]
-    return create_client(url, key)
-
 def iso_date_from_ddmmyyyy(s: str) -> str:
     """
     Parse DD/MM/YYYY string to ISO 'YYYY-MM-DD'.
@@ -30,12 +39,34 @@ def iso_date_from_ddmmyyyy(s: str) -> str:
 def ddmmyyyy_from_date(d: date) -> str:
     return d.strftime("%d/%m/%Y")
 
+@st.cache_resource(show_spinner=False)
+def get_registration_index() -> RegistrationIndex:
+    # Shared by every session; refreshed incrementally by id on each search
+    return RegistrationIndex(db.fetch_registration_keys)
+
+def load_next_lookup_page():
+    """Fetches the next page of matched rows (keyset on id) into session state."""
+    page_ids = next_page(st.session_state.lookup_ids, st.session_state.lookup_cursor,
+                         st.session_state.lookup_page_size)
+    if page_ids:
+        st.session_state.lookup_rows.extend(db.fetch_registrations_by_ids(page_ids, columns=LOOKUP_COLUMNS))
+        st.session_state.lookup_cursor = page_ids[-1]
+
+def discard_export():
+    """Deletes this session's previous export file, if any."""
+    previous = st.session_state.pop("export", None)
+    if previous and os.path.exists(previous["path"]):
+        os.remove(previous["path"])
+
+def read_export(path: str) -> bytes:
+    # Called by the download button only when clicked; export_table caps the size
+    with open(path, "rb") as f:
+        return f.read()
+
 def normalize_rego(rego: str) -> str:
     # Keep it simple per requirements: lower-case only (no other transforms)
     return (rego or "").strip().lower()
 
-supabase = get_supabase()
-
 # ---------- Password Gate ----------
 if "lookup_blacklist_authed" not in st.session_state:
     st.session_state.lookup_blacklist_authed = False
@@ -69,33 +100,53 @@ with st.form("lookup_form"):
     )
     exact_match = st.checkbox("Exact match (case-insensitive)", value=True,
                               help="If unchecked, uses 'contains' search (case-insensitive).")
+    include_people = st.checkbox("Also search name and email", value=False)
+    page_size = st.selectbox("Results per page", PAGE_SIZES, index=0)
     do_lookup = st.form_submit_button("Search")
 
 if do_lookup:
     if not lookup_rego.strip():
         st.warning("Please enter a registration to search.")
     else:
-        # Case-insensitive search. If exact -> ilike 'value' ; else -> ilike '%value%'
+        # Exact registration lookups hit the registration_key index; other
+        # searches use the in-memory index. Only matching rows are fetched.
         pattern = lookup_rego.strip()
-        if exact_match:
-            # Use ILIKE with exact string
-            query = supabase.table("approved_registrations").select("*").ilike("registration", pattern)
-        else:
-            query = supabase.table("approved_registrations").select("*").ilike("registration", f"%{pattern}%")
+        fields = ("registration", "first_name", "last_name", "email") if include_people else ("registration",)
 
         with st.spinner("Searching…"):
-            resp = query.execute()
-
-        rows = resp.data or []
-        if len(rows) == 0:
-            st.info("No matching registration found in **approved_registrations**.")
-        else:
-            st.success(f"Found {len(rows)} matching row(s).")
-            for i, row in enumerate(rows, start=1):
-                with st.expander(f"Result {i}: {row.get('registration','(no reg shown)')}"):
-                    # Pretty render key-value pairs
-                    for k in sorted(row.keys()):
-                        st.write(f"**{k}**: {row[k]}")
+            try:
+                if exact_match and not include_people:
+                    # Indexed equality on the canonical registration key
+                    st.session_state.lookup_ids = db.find_registration_ids(registration_key(pattern))
+                else:
+                    index = get_registration_index()
+                    index.refresh()
+                    st.session_state.lookup_ids = index.search(pattern, exact=exact_match, fields=fields)
+                st.session_state.lookup_rows = []
+                st.session_state.lookup_cursor = 0
+                st.session_state.lookup_page_size = page_size
+                load_next_lookup_page()
+            except ServiceBusy as e:
+                st.session_state.lookup_ids = None
+                st.warning(str(e))
+
+# Results persist across reruns so further pages can be fetched on demand
+if st.session_state.get("lookup_ids") is not None:
+    total = len(st.session_state.lookup_ids)
+    rows = st.session_state.lookup_rows
+    if total == 0:
+        st.info("No matching registration found in **approved_registrations**.")
+    else:
+        st.success(f"Found {total} matching row(s). Showing {len(rows)}.")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        if len(rows) < total and st.button(f"Load next {st.session_state.lookup_page_size}"):
+            with st.spinner("Loading…"):
+                try:
+                    load_next_lookup_page()
+                except ServiceBusy as e:
+                    st.warning(str(e))
+                    st.stop()
+            st.rerun()
 
 # ---------- Divider ----------
 st.divider()
@@ -132,25 +183,59 @@ if submit_blacklist:
             st.error("Invalid date format. Please use DD/MM/YYYY.")
             st.stop()
 
-        payload = {
-            "registration": bl_rego,
-            "suspension_end": iso_end,  # stored as 'date' type in Supabase
-        }
-
         with st.spinner("Saving to blacklist…"):
             try:
-                resp = supabase.table("blacklist").insert(payload).execute()
+                # suspension_end is stored as 'date' type in Supabase
+                db.add_to_blacklist(bl_rego, iso_end)
             except Exception as e:
                 st.error(f"Failed to insert into blacklist: {e}")
             else:
                 st.success(f"Registration **{bl_rego}** blacklisted until **{bl_end_str}**.")
 
+# ---------- Divider ----------
+st.divider()
+
+# ---------- Export ----------
+st.subheader("Export Data")
+
+with st.form("export_form"):
+    export_name = st.selectbox("Table", list(EXPORT_LABELS), format_func=EXPORT_LABELS.get)
+    export_format = st.radio("Format", list(FORMATS), horizontal=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        export_from = st.date_input("From (optional)", value=None, format="DD/MM/YYYY")
+    with col2:
+        export_to = st.date_input("To (optional)", value=None, format="DD/MM/YYYY")
+    do_export = st.form_submit_button("Prepare export")
+
+if do_export:
+    discard_export()
+    with st.spinner("Exporting…"):
+        try:
+            path, count = export_table(db.fetch_export_page, export_name, export_format,
+                                       export_from, export_to, page_size=EXPORT_PAGE_SIZE)
+        except ServiceBusy as e:
+            st.warning(str(e))
+        except ExportTooLarge as e:
+            st.error(str(e))
+        else:
+            suffix, mime = FORMATS[export_format]
+            st.session_state.export = {"path": path, "rows": count, "mime": mime,
+                                       "file_name": f"{export_name}-{date.today().isoformat()}{suffix}"}
+
+export = st.session_state.get("export")
+if export and os.path.exists(export["path"]):
+    st.success(f"{export['rows']} row(s) exported to **{export['file_name']}**.")
+    st.download_button("Download", data=lambda: read_export(export["path"]), file_name=export["file_name"],
+                       mime=export["mime"], on_click="ignore")
+
 # ---------- Helpful Notes ----------
 with st.expander("Notes"):
     st.markdown(
         """
-- **Lookup** uses case-insensitive search (`ILIKE`). Toggle *Exact match* for strict equality; otherwise it finds rows that *contain* your input.
-- **Blacklist** saves `registration` as lower-case (per your request).
+- **Lookup** compares registrations by their canonical key (upper-case letters and digits only), so `1abc-123` finds `1ABC123`. *Exact match* is an indexed database lookup; *contains* and name/email searches are served from an in-memory index of the approved list (new rows are picked up within 30 seconds).
+- **Blacklist** saves `registration` as lower-case (per your request), alongside its canonical `registration_key`.
+- **Export** reads the table in pages of 1,000 rows by id and writes each page straight to a file on the server, so large tables never sit in memory while exporting. The download itself is served from memory, so files are limited to {max_mb} MB; narrow the date range or use Parquet for larger exports. Bookings exports include confirmed bookings only.
 - `suspension_end` accepts **DD/MM/YYYY** input for convenience but is saved to Supabase as an ISO `date` (`YYYY-MM-DD`).
-        """
+        """.format(max_mb=EXPORT_MAX_BYTES // (1024 * 1024))
     )
@@ -0,0 +1,73 @@
+# pages/3_Metrics.py
+
+import streamlit as st
+
+from parking import metrics
+
+# ---------- Page setup ----------
+st.set_page_config(page_title="Metrics", page_icon="📈", layout="wide")
+
+st.title("Metrics")
+
+metrics.configure(enabled=st.secrets.get("metrics", {}).get("ENABLED", False),
+                  path=st.secrets.get("metrics", {}).get("PATH"))
+
+# ---------- Password Gate ----------
+if "metrics_authed" not in st.session_state:
+    st.session_state.metrics_authed = False
+
+if not st.session_state.metrics_authed:
+    with st.form("password_form", clear_on_submit=True):
+        pw = st.text_input("Password", type="password")
+        submitted = st.form_submit_button("Enter")
+        if submitted:
+            expected = st.secrets.get("Password")
+            if expected is None:
+                st.error("No 'Password' found in secrets. Please add it.")
+            elif pw == expected:
+                st.session_state.metrics_authed = True
+                st.rerun()
+            else:
+                st.error("Incorrect password.")
+    st.stop()
+
+if not metrics.enabled():
+    st.info("Metrics are disabled. Set `ENABLED = true` under `[metrics]` in secrets "
+            "(or `PARKING_METRICS=1` in the environment) to start collecting.")
+    st.stop()
+
+st.caption("Counts since this server process started. Quantiles are bucket upper bounds.")
+if st.button("Refresh"):
+    st.rerun()
+
+# ---------- Histograms ----------
+st.subheader("Latency and sizes")
+rows = metrics.summary()
+if rows:
+    for row in rows:
+        # Latency histograms read better in milliseconds
+        if row["metric"].endswith("_seconds"):
+            row["metric"] = row["metric"].replace("_seconds", "_ms")
+            for k in ("mean", "p50", "p95", "p99"):
+                row[k] = row[k] * 1000
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+else:
+    st.info("No timings recorded yet.")
+
+# ---------- Counters ----------
+st.subheader("Counters")
+counters, _, _ = metrics.snapshot()
+if counters:
+    st.dataframe(
+        [{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+         for (name, labels), value in sorted(counters.items())],
+        hide_index=True, use_container_width=True,
+    )
+else:
+    st.info("No counters recorded yet.")
+
+# ---------- Raw text ----------
+text = metrics.render_text()
+with st.expander("Prometheus text format"):
+    st.code(text, language="text")
+st.download_button("Download metrics.prom", text, file_name="metrics.prom", mime="text/plain")
@@ -0,0 +1,114 @@
+# pages/4_Utilisation.py
+import datetime
+
+import streamlit as st
+
+from parking import db
+from parking.booking_window import SITES, local_now
+from parking.utilisation import (bookings_by_date, headline, minutes_to_full_by_date, usage_frame,
+                                 weekday_profile)
+
+DEFAULT_DAYS = 90  # history shown when the page opens
+SUMMARY_TTL = 300  # seconds summaries and charts are cached for
+TOP_REGISTRATIONS = 10
+
+# ---------- Page setup ----------
+st.set_page_config(page_title="Utilisation", page_icon="📊", layout="wide")
+
+st.title("Utilisation")
+
+# ---------- Password Gate ----------
+if "utilisation_authed" not in st.session_state:
+    st.session_state.utilisation_authed = False
+
+if not st.session_state.utilisation_authed:
+    with st.form("password_form", clear_on_submit=True):
+        pw = st.text_input("Password", type="password")
+        submitted = st.form_submit_button("Enter")
+        if submitted:
+            expected = st.secrets.get("Password")
+            if expected is None:
+                st.error("No 'Password' found in secrets. Please add it.")
+            elif pw == expected:
+                st.session_state.utilisation_authed = True
+                st.rerun()
+            else:
+                st.error("Incorrect password.")
+    st.stop()
+
+
+# ---------- Data (cached across sessions) ----------
+@st.cache_data(ttl=SUMMARY_TTL, show_spinner=False)
+def load_usage(start_date, end_date, site_codes):
+    """
+    Daily summaries for the range plus the chart-ready tables built from
+    them. Reads one summary row per car park per day.
+    """
+    df = usage_frame(db.fetch_daily_usage(start_date, end_date))
+    df = df[df["site"].isin(site_codes)]
+    return headline(df), bookings_by_date(df), minutes_to_full_by_date(df), weekday_profile(df)
+
+
+@st.cache_data(ttl=SUMMARY_TTL, show_spinner=False)
+def load_top_registrations(limit):
+    return db.fetch_top_registrations(limit)
+
+
+# ---------- Filters ----------
+today = local_now().date()
+col1, col2 = st.columns(2)
+with col1:
+    date_range = st.date_input("Booking dates", (today - datetime.timedelta(days=DEFAULT_DAYS), today))
+with col2:
+    names = {site.code: site.name for site in SITES}
+    site_codes = st.multiselect("Car parks", list(names), default=list(names), format_func=names.get)
+
+if not isinstance(date_range, tuple) or len(date_range) != 2:
+    st.info("Pick a start and end date.")
+    st.stop()
+
+try:
+    totals, bookings, time_to_full, weekdays = load_usage(date_range[0], date_range[1], tuple(site_codes))
+    top = load_top_registrations(TOP_REGISTRATIONS)
+except db.ServiceBusy as e:
+    st.warning(str(e))
+    st.stop()
+
+if not totals["days"]:
+    st.info("No bookings in this range.")
+    st.stop()
+
+st.caption(f"Refreshed at most every {SUMMARY_TTL // 60} minutes.")
+
+# ---------- Headline ----------
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Bookings", totals["bookings"])
+c2.metric("Days fully booked", f"{totals['full_days']} of {totals['days']}", f"{totals['full_share']:.0%}",
+          delta_color="off")
+minutes = totals["median_minutes_to_full"]
+c3.metric("Median time to full", "—" if minutes is None else f"{minutes:.0f} min")
+c4.metric("Holds expired unconfirmed", f"{totals['expiry_rate']:.0%}")
+
+# ---------- Charts ----------
+st.subheader("Bookings per day")
+st.bar_chart(bookings)
+
+st.subheader("Minutes from opening until full")
+st.caption("Measured from when booking opens for the date to the booking that took the last bay.")
+st.line_chart(time_to_full)
+
+st.subheader("By weekday")
+st.dataframe(weekdays.style.format({"average bookings": "{:.1f}", "share full": "{:.0%}",
+                                    "hold expiry rate": "{:.0%}"}),
+             use_container_width=True)
+
+# ---------- Top registrations ----------
+st.subheader("Most frequent registrations (all time)")
+if top:
+    st.dataframe(
+        [{"registration": row["registration"], "bookings": row["bookings"], "last booked": row["last_date"]}
+         for row in top],
+        hide_index=True, use_container_width=True,
+    )
+else:
+    st.info("No confirmed bookings yet.")
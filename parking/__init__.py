@@ -0,0 +1,3 @@
+"""
+Shared helpers for the 88 Colin Street visitor car bay booking app.
+"""
@@ -0,0 +1,180 @@
+"""
+Process-wide admission control (a virtual waiting room) for the booking
+actions that hit the backend: "Check Available Bays" and "Request a Bay".
+
+- Each session has a token bucket, so repeated clicks and bot retries are
+  refused in memory before they cost a query.
+- At most ``max_concurrent`` admitted actions run at once per process.
+- Everyone else waits in a FIFO queue and can be told their position.
+
+Streamlit sessions poll with ``enqueue``/``try_acquire`` from a fragment,
+so nobody holds a script thread while queued; ``admit`` is the blocking
+equivalent for threads (e.g. benchmarks/bench_booking_rush.py).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from parking import metrics
+
+
+class AdmissionTimeout(Exception):
+    """Raised by ``admit`` when a slot is not granted within the timeout."""
+
+
+class AdmissionControl:
+    """
+    :param max_concurrent: Admitted actions allowed to run at the same time.
+    :param rate:           Tokens added to each session's bucket per second.
+    :param burst:          Bucket capacity (attempts allowed back to back).
+    :param ticket_ttl:     Seconds a queued session may go without polling
+                           before its place is given up.
+    :param clock:          Monotonic time source (injectable for tests).
+    """
+
+    def __init__(self, max_concurrent: int = 8, rate: float = 0.5, burst: int = 3,
+                 ticket_ttl: float = 10.0, clock=time.monotonic):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self.ticket_ttl = ticket_ttl
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._queue = OrderedDict()  # session_id -> (joined_at, last_seen), in arrival order
+        self._buckets = {}  # session_id -> (tokens, updated_at)
+        self._active = 0
+        self._pruned_at = 0.0
+
+    # ---------- Rate limiting ----------
+
+    def allow(self, session_id) -> float:
+        """
+        Takes one token from session_id's bucket. Returns 0 if the attempt is
+        allowed, otherwise the seconds until the next token is available.
+        """
+        now = self._clock()
+        with self._cond:
+            tokens, updated = self._buckets.get(session_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[session_id] = (tokens - 1, now)
+                return 0.0
+            self._buckets[session_id] = (tokens, now)
+        metrics.inc("admission_rate_limited_total")
+        return (1 - tokens) / self.rate
+
+    # ---------- Queue ----------
+
+    def _prune(self, now):
+        # Drop queued sessions that stopped polling and buckets that are full again
+        if now - self._pruned_at < 1.0:
+            return
+        self._pruned_at = now
+        stale = [sid for sid, (_, seen) in self._queue.items() if now - seen > self.ticket_ttl]
+        for sid in stale:
+            del self._queue[sid]
+        refill = self.burst / self.rate if self.rate else float("inf")
+        idle = [sid for sid, (_, updated) in self._buckets.items() if now - updated > refill]
+        for sid in idle:
+            del self._buckets[sid]
+        if stale:
+            metrics.inc("admission_abandoned_total", len(stale))
+            self._cond.notify_all()
+
+    def enqueue(self, session_id) -> int:
+        """
+        Joins the queue (or keeps an existing place alive) and returns the
+        number of sessions ahead of session_id.
+        """
+        now = self._clock()
+        with self._cond:
+            self._prune(now)
+            joined_at = self._queue[session_id][0] if session_id in self._queue else now
+            self._queue[session_id] = (joined_at, now)
+            return self._position(session_id)
+
+    def _position(self, session_id):
+        for ahead, sid in enumerate(self._queue):
+            if sid == session_id:
+                return ahead
+        return None
+
+    def position(self, session_id):
+        """Sessions ahead of session_id, or None if it is not queued."""
+        with self._cond:
+            return self._position(session_id)
+
+    def _acquire(self, session_id, now):
+        # Caller holds self._cond. Returns the admitted ticket's wait, or None.
+        self._prune(now)
+        entry = self._queue.get(session_id)
+        if entry is None:
+            return None
+        if self._position(session_id) >= self.max_concurrent - self._active:
+            self._queue[session_id] = (entry[0], now)
+            return None
+        del self._queue[session_id]
+        self._active += 1
+        return now - entry[0]
+
+    def try_acquire(self, session_id) -> bool:
+        """
+        Admits session_id if it is queued close enough to the front to take
+        a free slot. Admitted sessions leave the queue and must call
+        ``release`` when their action finishes.
+        """
+        with self._cond:
+            waited = self._acquire(session_id, self._clock())
+        if waited is None:
+            return False
+        metrics.observe("admission_wait_seconds", waited)
+        return True
+
+    def release(self):
+        """Frees a slot taken by ``try_acquire``."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def leave(self, session_id):
+        """Gives up session_id's place in the queue, if it has one."""
+        with self._cond:
+            if self._queue.pop(session_id, None) is not None:
+                self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, session_id, timeout: float = None):
+        """
+        Blocking form of enqueue/try_acquire/release for worker threads.
+        Raises AdmissionTimeout if not admitted within timeout seconds.
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        self.enqueue(session_id)
+        with self._cond:
+            while True:
+                now = self._clock()
+                waited = self._acquire(session_id, now)
+                if waited is not None:
+                    break
+                if session_id not in self._queue:  # pruned while waiting
+                    self._queue[session_id] = (now, now)
+                wait = self.ticket_ttl / 2
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+                    if wait <= 0:
+                        self._queue.pop(session_id, None)
+                        self._cond.notify_all()
+                        raise AdmissionTimeout(session_id)
+                self._cond.wait(wait)
+        metrics.observe("admission_wait_seconds", waited)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        """Current number of admitted actions and queued sessions."""
+        with self._cond:
+            return {"active": self._active, "waiting": len(self._queue)}
@@ -0,0 +1,100 @@
+"""
+Short-TTL cache of booked-bay counts per (site, booking date).
+
+One instance is shared by every Streamlit session in the process (see
+``get_availability_cache`` in app.py). Counts are stored in a cache backend
+(parking/cache.py); with a shared backend, replicas on one host share them
+too. Concurrent misses for the same key are coalesced so only one caller in
+the process hits the database, and ``get_many`` loads every stale key in a
+single backend call.
+"""
+
+import threading
+
+from parking.cache import MemoryCache, Namespace
+
+NAMESPACE = "availability"
+
+
+def _normalize(key) -> str:
+    # date objects and their ISO strings must map to the same entry
+    if isinstance(key, tuple):
+        return "|".join(str(part) for part in key)
+    return str(key)
+
+
+class AvailabilityCache:
+    """
+    Caches ``loader(key)`` results for ``ttl`` seconds. Keys are a booking
+    date or a ``(site_code, booking_date)`` pair.
+
+    :param ttl:   Seconds a cached count stays fresh.
+    :param cache: Cache backend holding the counts (default: a private MemoryCache).
+    """
+
+    def __init__(self, ttl: float = 3.0, cache=None):
+        self.ttl = ttl
+        self._entries = Namespace(cache or MemoryCache(), NAMESPACE)
+        self._locks = {}  # key -> lock held while loading
+        self._guard = threading.Lock()
+        self._bulk_lock = threading.Lock()  # held while a get_many batch loads
+
+    def _key_lock(self, key):
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def get(self, key, loader):
+        """
+        Returns the cached count for key, calling loader(key) at most once
+        per TTL no matter how many sessions ask at once.
+        """
+        norm = _normalize(key)
+        count = self._entries.get(norm)
+        if count is not None:
+            return count
+        with self._key_lock(norm):
+            # Another session may have loaded it while we waited.
+            count = self._entries.get(norm)
+            if count is None:
+                count = loader(key)
+                self._entries.set(norm, count, self.ttl)
+        return count
+
+    def get_many(self, keys, bulk_loader):
+        """
+        Returns {key: count} for every key. Stale keys are loaded together
+        with one bulk_loader(stale_keys) call, which must return a mapping
+        from key to count (missing keys count as 0).
+        """
+        keys = list(keys)
+        cached = self._entries.get_many([_normalize(key) for key in keys])
+        counts = {key: cached.get(_normalize(key)) for key in keys}
+        missing = [key for key, count in counts.items() if count is None]
+        if missing:
+            with self._bulk_lock:
+                # Another session may have loaded some while we waited.
+                cached = self._entries.get_many([_normalize(key) for key in missing])
+                stale = []
+                for key in missing:
+                    counts[key] = cached.get(_normalize(key))
+                    if counts[key] is None:
+                        stale.append(key)
+                if stale:
+                    loaded = {_normalize(key): count for key, count in bulk_loader(stale).items()}
+                    for key in stale:
+                        counts[key] = loaded.get(_normalize(key), 0)
+                    self._entries.set_many({_normalize(key): counts[key] for key in stale}, self.ttl)
+        return counts
+
+    def invalidate(self, key=None):
+        """
+        Drops the cached count for one key, or for every key if None, in
+        every replica sharing the cache.
+        """
+        if key is None:
+            self._entries.invalidate()
+        else:
+            self._entries.delete(_normalize(key))
@@ -0,0 +1,112 @@
+"""
+Booking window rules and per-site calendars.
+
+Stdlib only, so app.py can decide whether bookings are open before importing
+Supabase, PIL or requests.
+"""
+
+import datetime
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+
+TIMEZONE = ZoneInfo("Asia/Shanghai")  # Adjust as needed
+
+# Booking windows:
+# Opens at 16:00 (4 PM), closes at 08:30 next morning
+BOOKING_START_HOUR = 16  # 4:00 PM in 24-hour format
+BOOKING_END_HOUR = 8  # 8:30 AM
+BOOKING_END_MINUTE = 30
+
+MONDAY = 0
+
+
+@dataclass(frozen=True)
+class Site:
+    """A car park offering visitor bays."""
+    code: str  # stored in maca_parking.site
+    name: str
+    total_bays: int
+    closed_weekdays: tuple = (MONDAY,)  # no bookings for these days
+    days_ahead: int = 1  # consecutive days offered from the booking date
+    start_hour: int = BOOKING_START_HOUR
+    end_hour: int = BOOKING_END_HOUR
+    end_minute: int = BOOKING_END_MINUTE
+
+
+# Add car parks here. The first site is the default for existing bookings.
+SITES = (
+    Site(code="colin_st", name="88 Colin Street", total_bays=4),
+)
+
+
+class SiteCalendar:
+    """
+    Window and closure rules for one site, precompiled into lookup tables:
+    a per-minute open/closed table for the week and, for each weekday the
+    booking date can fall on, the day offsets that are bookable.
+    """
+
+    def __init__(self, site: Site):
+        self.site = site
+        end = site.end_hour * 60 + site.end_minute
+        start = site.start_hour * 60
+        self._open_minute = bytes(
+            1 if minute >= start or minute <= end else 0 for minute in range(24 * 60)
+        )
+        self._offsets = tuple(
+            tuple(k for k in range(site.days_ahead) if (weekday + k) % 7 not in site.closed_weekdays)
+            for weekday in range(7)
+        )
+
+    def booking_date(self, now_local):
+        """After the window opens, bookings are for tomorrow; before it closes, for today."""
+        if now_local.hour >= self.site.start_hour:
+            return now_local.date() + datetime.timedelta(days=1)
+        return now_local.date()
+
+    def bookable_dates(self, now_local):
+        """The dates this site currently takes bookings for (closed days skipped)."""
+        first = self.booking_date(now_local)
+        return [first + datetime.timedelta(days=k) for k in self._offsets[first.weekday()]]
+
+    def is_open(self, now_local):
+        """True within the booking window when at least one date is bookable."""
+        if not self._open_minute[now_local.hour * 60 + now_local.minute]:
+            return False
+        return bool(self._offsets[self.booking_date(now_local).weekday()])
+
+
+CALENDARS = {site.code: SiteCalendar(site) for site in SITES}
+DEFAULT_SITE = SITES[0]
+
+
+def local_now():
+    return datetime.datetime.now(datetime.timezone.utc).astimezone(TIMEZONE)
+
+
+def get_booking_date(now_local=None):
+    """
+    Determines the booking date based on the current time.
+    - If it's after 16:00, the booking is for tomorrow.
+    - If tomorrow is Monday, booking is not allowed.
+    """
+    return CALENDARS[DEFAULT_SITE.code].booking_date(now_local or local_now())
+
+
+def is_booking_open(now_local=None):
+    """
+    Returns True if any site is within its booking window and has a
+    bookable date (e.g. the next day's booking date is NOT Monday).
+    """
+    now_local = now_local or local_now()
+    return any(calendar.is_open(now_local) for calendar in CALENDARS.values())
+
+
+def bookable_pairs(now_local=None):
+    """(site, date) pairs open for booking right now, in display order."""
+    now_local = now_local or local_now()
+    return [
+        (calendar.site, booking_date)
+        for calendar in CALENDARS.values() if calendar.is_open(now_local)
+        for booking_date in calendar.bookable_dates(now_local)
+    ]
@@ -0,0 +1,282 @@
+"""
+Cache backends shared by the availability counter, the registration pages
+behind the lookup index and membership mirror, and the challenge images.
+
+- ``memory`` (default): in-process LRU with per-entry TTL. Each Streamlit
+  process (replica) has its own.
+- ``sqlite``: one memory-mapped SQLite file in WAL mode that every replica
+  on the host opens, e.g. on /dev/shm. One replica's query or render then
+  serves the others.
+
+Invalidation uses version stamps: keys live in a Namespace whose current
+version is part of every key, so ``Namespace.invalidate()`` bumps the
+version and every replica sharing the backend stops seeing the old entries
+at once; ``Namespace.delete()`` drops single keys. Superseded entries are
+never read again and age out by TTL (and, in memory, LRU eviction).
+
+Chosen per process in secrets (see db.get_cache):
+
+    [cache]
+    BACKEND = "memory"                      # or "sqlite"
+    PATH = "/dev/shm/parking-cache.sqlite3"  # sqlite: file shared by replicas
+    MAX_ENTRIES = 4096
+
+Shared entries are pickled, so only point replicas run by the same user at
+the same file.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+CACHE_BACKENDS = ("memory", "sqlite")
+MAX_ENTRIES = 4096
+MMAP_SIZE = 64 * 1024 * 1024  # bytes of the SQLite file mapped into memory
+
+
+class CacheBackend:
+    """
+    Key/value store with per-entry TTL and per-namespace version counters.
+    Implementations must be safe to share between threads.
+    """
+
+    shared = False  # entries are visible to other processes
+
+    def get_many(self, keys) -> Dict[str, object]:
+        """Unexpired values for whichever of keys are present."""
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, object], ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete_many(self, keys) -> None:
+        raise NotImplementedError
+
+    def version(self, namespace: str) -> int:
+        """Current version stamp of namespace (0 until first bumped)."""
+        raise NotImplementedError
+
+    def bump(self, namespace: str) -> int:
+        """Advances namespace's version stamp. Returns the new version."""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache with per-entry TTL.
+
+    :param max_entries: Least recently used entries beyond this are evicted.
+    :param clock:       Monotonic time source (injectable for tests).
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at), least recent first
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, items, ttl):
+        expires_at = self._clock() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (value, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def version(self, namespace):
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            return self._versions[namespace]
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a SQLite file shared by every process that opens it.
+
+    WAL mode lets replicas read while one writes, the file is memory-mapped
+    so hot reads do not go through read() calls, and synchronous=off skips
+    fsyncs because losing cached data in a crash is harmless. When a write
+    takes the table past max_entries, expired entries and then those
+    closest to expiry are dropped.
+
+    :param path:        Cache file, ideally on a RAM-backed filesystem.
+    :param max_entries: Approximate upper bound on stored entries.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES, mmap_size: int = MMAP_SIZE):
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._lock = threading.Lock()
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute("pragma synchronous = off")
+        self._conn.execute(f"pragma mmap_size = {int(mmap_size)}")
+        self._conn.executescript("""
+            create table if not exists cache_entries (
+                key text primary key,
+                value blob not null,
+                expires_at real not null
+            ) without rowid;
+            create index if not exists cache_entries_expiry_idx on cache_entries (expires_at);
+            create table if not exists cache_versions (
+                namespace text primary key,
+                version integer not null
+            ) without rowid;
+        """)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"select key, value from cache_entries where key in ({', '.join('?' for _ in keys)}) "
+                "and expires_at > ?",
+                (*keys, time.time()),
+            ).fetchall()
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def set_many(self, items, ttl):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl) for key, value in items.items()]
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                cur.executemany("insert or replace into cache_entries (key, value, expires_at) values (?, ?, ?)",
+                                rows)
+                (count,) = cur.execute("select count(*) from cache_entries").fetchone()
+                if count > self.max_entries:
+                    cur.execute("delete from cache_entries where expires_at <= ?", (now,))
+                    cur.execute(
+                        "delete from cache_entries where key in (select key from cache_entries "
+                        "order by expires_at limit max(0, (select count(*) from cache_entries) - ?))",
+                        (self.max_entries,),
+                    )
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            self._conn.execute(f"delete from cache_entries where key in ({', '.join('?' for _ in keys)})", keys)
+
+    def version(self, namespace):
+        with self._lock:
+            row = self._conn.execute("select version from cache_versions where namespace = ?",
+                                     (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        with self._lock:
+            (version,) = self._conn.execute(
+                "insert into cache_versions (namespace, version) values (?, 1) "
+                "on conflict (namespace) do update set version = version + 1 returning version",
+                (namespace,),
+            ).fetchone()
+        return version
+
+
+class Namespace:
+    """
+    A group of keys sharing one version stamp on a CacheBackend.
+
+    :param cache: The backend.
+    :param name:  Namespace name; also the prefix of every stored key.
+    """
+
+    def __init__(self, cache: CacheBackend, name: str):
+        self.cache = cache
+        self.name = name
+
+    def _prefix(self) -> str:
+        return f"{self.name}@{self.cache.version(self.name)}:"
+
+    def get_many(self, keys) -> Dict[str, object]:
+        prefix = self._prefix()
+        found = self.cache.get_many([prefix + key for key in keys])
+        return {key[len(prefix):]: value for key, value in found.items()}
+
+    def set_many(self, items: Dict[str, object], ttl: float) -> None:
+        prefix = self._prefix()
+        self.cache.set_many({prefix + key: value for key, value in items.items()}, ttl)
+
+    def get(self, key: str) -> Optional[object]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value, ttl: float) -> None:
+        self.set_many({key: value}, ttl)
+
+    def delete(self, *keys: str) -> None:
+        """Drops individual entries, for all processes sharing the backend."""
+        prefix = self._prefix()
+        self.cache.delete_many([prefix + key for key in keys])
+
+    def invalidate(self) -> int:
+        """Retires every entry in the namespace, for all processes sharing the backend."""
+        return self.cache.bump(self.name)
+
+
+def cached_pages(namespace: Namespace, fetch_page, full_ttl: float, tail_ttl: float):
+    """
+    Wraps a keyset fetch_page(after_id, limit) so pages are served from
+    namespace. Full pages (limit rows) change rarely and are kept for
+    full_ttl; the last, partial page is where new rows appear and is kept
+    only for tail_ttl. Invalidate the namespace when rows are written.
+    """
+    def fetch(after_id: int, limit: int):
+        key = f"{after_id}:{limit}"
+        rows = namespace.get(key)
+        if rows is None:
+            rows = fetch_page(after_id, limit)
+            namespace.set(key, rows, full_ttl if len(rows) >= limit else tail_ttl)
+        return rows
+
+    return fetch
+
+
+def open_cache(settings) -> CacheBackend:
+    """Builds the cache backend named by a ``[cache]`` secrets section."""
+    kind = settings.get("BACKEND", "memory")
+    max_entries = int(settings.get("MAX_ENTRIES", MAX_ENTRIES))
+    if kind == "memory":
+        return MemoryCache(max_entries=max_entries)
+    if kind == "sqlite":
+        return SQLiteCache(settings["PATH"], max_entries=max_entries)
+    raise ValueError(f"Unknown [cache] BACKEND {kind!r}; expected one of {', '.join(CACHE_BACKENDS)}")
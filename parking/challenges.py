@@ -0,0 +1,138 @@
+"""
+Pre-rendered images for the booking page's anti-bot challenges.
+
+Slider targets are only 10-90 and there are four colours, so every image the
+challenges can show is rendered once and then served from memory.
+"""
+
+import io
+import os
+import random
+import threading
+
+from PIL import Image, ImageDraw, ImageFont, ImageFilter
+
+from parking import metrics
+from parking.cache import Namespace
+
+SLIDER_MIN = 10
+SLIDER_MAX = 90
+NOISE_VARIANTS = 4  # distinct noise/offset renders kept per number
+SHARED_IMAGE_TTL = 86400.0  # seconds rendered PNGs stay in a shared cache
+
+COLORS = [
+    ("Red", (255, 0, 0)),
+    ("Blue", (0, 0, 255)),
+    ("Green", (0, 255, 0)),
+    ("Yellow", (255, 255, 0))
+]
+
+
+def generate_challenge_image(number, rng=random):
+    """Generates a distorted image of a number to defeat OCR."""
+    # Create a blank image with a noise background
+    img = Image.new('RGB', (200, 80), color=(240, 240, 240))
+    d = ImageDraw.Draw(img)
+
+    # Add some random 'noise' lines
+    for _ in range(10):
+        d.line([(rng.randint(0, 200), rng.randint(0, 80)),
+                (rng.randint(0, 200), rng.randint(0, 80))],
+               fill=(200, 200, 200), width=1)
+
+    # Use a default font (or path to a .ttf)
+    # On some systems you might need to specify a path to a font file
+    try:
+        font = ImageFont.load_default()
+    except Exception:
+        font = None
+
+    text = str(number)
+    # Draw text with slight random offset
+    d.text((70 + rng.randint(-10, 10), 20 + rng.randint(-5, 5)),
+           text, fill=(50, 50, 50), font=font, spacing=4)
+
+    # Apply a blur or contour to mess with OCR
+    img = img.filter(ImageFilter.EDGE_ENHANCE_MORE)
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def generate_color_block(color_rgb):
+    """Generates a simple colored square image."""
+    img = Image.new('RGB', (100, 100), color=color_rgb)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class ChallengeImageBank:
+    """
+    Process-wide store of rendered challenge PNGs.
+
+    Number images are rendered lazily, NOISE_VARIANTS per number, so the bank
+    never holds more than (SLIDER_MAX - SLIDER_MIN + 1) * NOISE_VARIANTS
+    images plus one block per colour.
+
+    Each render's noise is seeded from a secret seed plus the number and
+    variant, so the PNGs cannot be rebuilt offline from this repo and mapped
+    back to their numbers. With a shared cache backend (parking/cache.py),
+    each image is rendered by whichever replica on the host needs it first
+    and read from the cache by the rest.
+
+    :param variants: Noise variants rendered per number.
+    :param cache:    Optional cache backend; used only if it is shared.
+    :param seed:     Secret seed (str or bytes); random per bank if None.
+    """
+
+    def __init__(self, variants: int = NOISE_VARIANTS, cache=None, seed=None):
+        self.variants = variants
+        self._seed = os.urandom(32) if seed is None else seed.encode() if isinstance(seed, str) else bytes(seed)
+        self._numbers = {}  # (number, variant) -> PNG bytes
+        self._colors = {}  # rgb tuple -> PNG bytes
+        self._lock = threading.Lock()
+        self._shared = Namespace(cache, "challenges") if cache is not None and cache.shared else None
+
+    def _render(self, local, key, kind, render):
+        """Returns local[key], taking it from the shared cache or render() on a miss."""
+        shared_key = f"{kind}:{'-'.join(str(part) for part in key)}"
+        png = self._shared.get(shared_key) if self._shared is not None else None
+        if png is None:
+            with metrics.timed("image_render_seconds", kind=kind):
+                png = render()
+            if self._shared is not None:
+                self._shared.set(shared_key, png, SHARED_IMAGE_TTL)
+        with self._lock:
+            return local.setdefault(key, png)
+
+    def number_image(self, number: int, variant: int = None) -> bytes:
+        """Returns a PNG of number; picks a random noise variant if none given."""
+        if not SLIDER_MIN <= number <= SLIDER_MAX:
+            raise ValueError(f"Slider target {number} outside {SLIDER_MIN}-{SLIDER_MAX}")
+        if variant is None:
+            variant = random.randrange(self.variants)
+        key = (number, variant % self.variants)
+        png = self._numbers.get(key)
+        if png is None:
+            # Seeded per key so a variant looks the same whichever thread renders it
+            rng = random.Random(self._seed + f":{key[0]}:{key[1]}".encode())
+            png = self._render(self._numbers, key, "number", lambda: generate_challenge_image(number, rng=rng))
+        return png
+
+    def color_block(self, color_rgb) -> bytes:
+        """Returns a PNG square of color_rgb."""
+        key = tuple(color_rgb)
+        png = self._colors.get(key)
+        if png is None:
+            png = self._render(self._colors, key, "color", lambda: generate_color_block(key))
+        return png
+
+    def warm(self, colors=COLORS):
+        """Renders every number variant and colour block up front."""
+        for number in range(SLIDER_MIN, SLIDER_MAX + 1):
+            for variant in range(self.variants):
+                self.number_image(number, variant)
+        for _, rgb in colors:
+            self.color_block(rgb)
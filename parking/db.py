@@ -0,0 +1,347 @@
+"""
+Shared data access for app.py and the pages.
+
+Every script goes through these functions instead of talking to storage
+directly. Each process opens one backend, chosen in secrets:
+
+    [storage]
+    BACKEND = "supabase"   # default; or "postgres" / "sqlite"
+    DSN = "postgresql://..."   # postgres: direct connection string
+    POOL_MIN = 1               # postgres: connections kept open
+    POOL_MAX = 10              # postgres: connection limit per process
+    PATH = "parking.sqlite3"   # sqlite: database file
+    READ_TIMEOUT = 3           # seconds; optional overrides of the
+    WRITE_TIMEOUT = 8          # resilience settings below
+    HEDGE_AFTER = 0.5
+    BREAKER_FAILURES = 5
+    BREAKER_RESET = 30
+
+See parking/storage.py for the interface and its implementations. Every
+backend is wrapped in parking/resilience.py, so calls that fail, run past
+their deadline or arrive while the circuit breaker is open raise
+ServiceBusy instead of hanging the script.
+
+get_cache() opens the cache chosen by ``[cache]`` (parking/cache.py). When
+it is shared between replicas, the approved-list and blacklist pages read
+by the lookup index and membership mirror are served from it.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from parking.booking_window import DEFAULT_SITE
+from parking.cache import CacheBackend, Namespace, cached_pages, open_cache
+from parking.resilience import CircuitBreaker, ResilientStore, ServiceBusy
+from parking.storage import APPROVED_TABLE, BLACKLIST_TABLE, BOOKINGS_TABLE, StorageBackend
+
+# Public API; the table names and ServiceBusy are re-exported for callers of db
+__all__ = ["APPROVED_TABLE", "BLACKLIST_TABLE", "BOOKINGS_TABLE", "BACKENDS", "ServiceBusy", "get_client",
+           "open_backend", "get_backend", "get_cache", "reserve_bay", "confirm_booking", "release_hold",
+           "expire_holds", "count_bookings", "count_bookings_bulk", "join_waitlist", "leave_waitlist",
+           "promote_waitlist", "poll_waitlist", "fetch_daily_usage", "fetch_top_registrations",
+           "fetch_export_page", "archive_rows", "purge_rows", "backfill_registration_keys",
+           "fetch_registration_keys", "find_registration_ids", "fetch_registrations_by_ids",
+           "upsert_vehicles", "fetch_blacklist_after", "find_suspensions", "add_to_blacklist"]
+
+BACKENDS = ("supabase", "postgres", "sqlite")
+
+HTTP_TIMEOUT = 10  # seconds
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE = 10
+HTTP_KEEPALIVE_EXPIRY = 60  # seconds
+
+READ_TIMEOUT = 3.0  # seconds a read may take, hedges included
+WRITE_TIMEOUT = 8.0  # seconds a write may take
+HEDGE_AFTER = 0.5  # seconds before a slow read is sent again
+BREAKER_FAILURES = 5  # consecutive failures that open the circuit breaker
+BREAKER_RESET = 30.0  # seconds the breaker stays open before a trial call
+
+SHARED_PAGE_TTL = 600.0  # seconds a full approved/blacklist page is shared between replicas
+SHARED_TAIL_TTL = 15.0  # seconds for the last page, where new rows appear
+REGISTRATION_PAGES = "registration_keys"  # cache namespaces, invalidated on writes
+BLACKLIST_PAGES = "blacklist"
+
+
+# --------------------------------------------------
+# Client / backend
+# --------------------------------------------------
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """
+    Returns the process-wide Supabase client.
+
+    Built once per process; the underlying httpx client keeps TLS connections
+    alive and pools them across all sessions and reruns. supabase and httpx
+    are imported here, on first real use, to keep app startup light.
+    """
+    import httpx
+    from supabase import ClientOptions, create_client
+
+    url = st.secrets["supabase"]["SUPABASE_URL"]
+    key = st.secrets["supabase"]["SUPABASE_KEY"]
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                          max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                          keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    http = httpx.Client(timeout=HTTP_TIMEOUT, limits=limits)
+    return create_client(url, key, options=ClientOptions(httpx_client=http))
+
+
+def open_backend(settings) -> StorageBackend:
+    """
+    Opens the storage backend named by settings["BACKEND"] (no resilience
+    wrapper). Backend modules are imported here so unused drivers are
+    never loaded.
+    """
+    kind = settings.get("BACKEND", "supabase")
+    if kind == "supabase":
+        from parking.supabase_store import SupabaseStore
+        return SupabaseStore(get_client())
+    if kind == "postgres":
+        from parking.pg_store import PostgresStore
+        return PostgresStore(settings["DSN"], min_size=settings.get("POOL_MIN", 1),
+                             max_size=settings.get("POOL_MAX", 10))
+    if kind == "sqlite":
+        from parking.local_store import LocalStore
+        return LocalStore(settings.get("PATH", "parking.sqlite3"))
+    raise ValueError(f"Unknown [storage] BACKEND {kind!r}; expected one of {', '.join(BACKENDS)}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_backend() -> StorageBackend:
+    """
+    Returns the process-wide storage backend selected by [storage] BACKEND,
+    behind deadlines, hedged reads and a circuit breaker.
+    """
+    settings = st.secrets.get("storage", {})
+    breaker = CircuitBreaker(failure_threshold=settings.get("BREAKER_FAILURES", BREAKER_FAILURES),
+                             reset_timeout=settings.get("BREAKER_RESET", BREAKER_RESET))
+    return ResilientStore(open_backend(settings), breaker,
+                          read_timeout=settings.get("READ_TIMEOUT", READ_TIMEOUT),
+                          write_timeout=settings.get("WRITE_TIMEOUT", WRITE_TIMEOUT),
+                          hedge_after=settings.get("HEDGE_AFTER", HEDGE_AFTER))
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache() -> CacheBackend:
+    """Returns the process's cache backend, selected by [cache] BACKEND."""
+    return open_cache(st.secrets.get("cache", {}))
+
+
+def _shared_pages(namespace: str, fetch_page):
+    # Only worth a second copy of the rows when other replicas can read it
+    cache = get_cache()
+    if not cache.shared:
+        return fetch_page
+    return cached_pages(Namespace(cache, namespace), fetch_page, SHARED_PAGE_TTL, SHARED_TAIL_TTL)
+
+
+# --------------------------------------------------
+# Bookings
+# --------------------------------------------------
+
+def reserve_bay(booking_date, total_bays: int, lock_seconds: int,
+                site: str = DEFAULT_SITE.code) -> Optional[int]:
+    """
+    Reserves a temporary hold on a bay at site for booking_date.
+
+    Expired holds are swept, capacity checked and the hold inserted in one
+    transaction. Returns the hold id, or None if all bays are taken.
+    """
+    return get_backend().reserve_bay(booking_date, total_bays, lock_seconds, site=site)
+
+
+def confirm_booking(hold_id: int, details: dict) -> bool:
+    """
+    Turns an unexpired hold into a confirmed booking with the given details.
+    Returns False if the hold has lapsed or no longer exists.
+    """
+    return get_backend().confirm_booking(hold_id, details)
+
+
+def release_hold(hold_id: int) -> None:
+    """Deletes a hold before it expires, freeing the bay."""
+    get_backend().release_hold(hold_id)
+
+
+def expire_holds() -> int:
+    """Deletes every lapsed hold. Returns the number removed."""
+    return get_backend().expire_holds()
+
+
+def count_bookings(booking_date, site: str = DEFAULT_SITE.code) -> int:
+    """
+    Counts confirmed bookings plus unexpired holds at site for booking_date.
+    Lapsed holds are excluded by the filter rather than swept first.
+    """
+    return get_backend().count_bookings(booking_date, site=site)
+
+
+def count_bookings_bulk(pairs) -> Dict[Tuple[str, str], int]:
+    """
+    Counts confirmed bookings plus unexpired holds for every (site, date)
+    pair in one grouped query (booking_counts in sql/005_sites.sql).
+
+    Returns {(site, iso_date): booked}; pairs with no bookings map to 0.
+    """
+    return get_backend().count_bookings_bulk(pairs)
+
+
+# --------------------------------------------------
+# Waitlist
+# --------------------------------------------------
+
+def join_waitlist(site: str, booking_date, token: str) -> None:
+    """
+    Queues token (a session id) for the next free bay at site on
+    booking_date. Re-joining keeps the original place.
+    """
+    get_backend().join_waitlist(site, booking_date, token)
+
+
+def leave_waitlist(token: str) -> None:
+    """Gives up token's place in any waitlist."""
+    get_backend().leave_waitlist(token)
+
+
+def promote_waitlist(booking_date, total_bays: int, lock_seconds: int,
+                     site: str = DEFAULT_SITE.code) -> List[dict]:
+    """
+    Hands freed bays at site on booking_date to the head of its waitlist as
+    new holds (promote_waitlist in sql/006_waitlist.sql).
+    Returns [{token, hold_id, hold_expires_at}] for each promotion.
+    """
+    return get_backend().promote_waitlist(booking_date, total_bays, lock_seconds, site=site)
+
+
+def poll_waitlist(tokens) -> Dict[str, dict]:
+    """
+    Latest waitlist entry for each token in one round trip:
+    {token: {status, site, booking_date, position, hold_id, hold_expires_at}}.
+    """
+    return get_backend().poll_waitlist(tokens)
+
+
+# --------------------------------------------------
+# Usage summaries
+# --------------------------------------------------
+
+def fetch_daily_usage(start_date, end_date) -> List[dict]:
+    """
+    Per-(site, date) usage summaries for start_date..end_date, maintained
+    incrementally as bookings happen (sql/007_daily_usage.sql), so this
+    never scans maca_parking.
+    """
+    return get_backend().fetch_daily_usage(start_date, end_date)
+
+
+def fetch_top_registrations(limit: int = 10) -> List[dict]:
+    """The limit most-booked registrations, most bookings first."""
+    return get_backend().fetch_top_registrations(limit)
+
+
+# --------------------------------------------------
+# Export
+# --------------------------------------------------
+
+def fetch_export_page(table: str, after_id: int, limit: int, start_date=None, end_date=None) -> List[dict]:
+    """
+    One keyset page (id > after_id, ordered by id) of bookings, approved
+    vehicles or blacklist rows for parking/export.py; see storage.EXPORTS.
+    """
+    return get_backend().fetch_export_page(table, after_id, limit, start_date, end_date)
+
+
+# --------------------------------------------------
+# Archiving
+# --------------------------------------------------
+
+def archive_rows(table: str, before, limit: int) -> int:
+    """
+    Moves up to limit rows older than `before` from maca_parking or blacklist
+    into its archive table in one transaction (tools/archive.py). Returns
+    the number moved.
+    """
+    return get_backend().archive_rows(table, before, limit)
+
+
+def purge_rows(table: str, ids) -> int:
+    """Deletes rows already archived to files by tools/archive.py."""
+    return get_backend().purge_rows(table, ids)
+
+
+def backfill_registration_keys(table: str, after_id: int, limit: int) -> Optional[int]:
+    """
+    Fills registration_key for the next limit rows with id > after_id
+    (tools/backfill_registration_keys.py). Returns the last id examined, or
+    None when the table is done.
+    """
+    return get_backend().backfill_registration_keys(table, after_id, limit)
+
+
+# --------------------------------------------------
+# Approved registrations
+# --------------------------------------------------
+
+def fetch_registration_keys(after_id: int, limit: int) -> List[dict]:
+    """
+    Returns up to limit approved rows with id > after_id, ordered by id,
+    projected to the columns the in-memory registration index needs.
+    Shared between replicas when the cache is.
+    """
+    return _shared_pages(REGISTRATION_PAGES, get_backend().fetch_registration_keys)(after_id, limit)
+
+
+def find_registration_ids(key: str) -> List[int]:
+    """
+    Ids of approved rows whose registration_key equals key (an indexed
+    equality match; see sql/004_registration_key.sql).
+    """
+    return get_backend().find_registration_ids(key)
+
+
+def fetch_registrations_by_ids(ids, columns: str = "*") -> List[dict]:
+    """Fetches approved_registrations rows for the given ids, projected to columns."""
+    return get_backend().fetch_registrations_by_ids(ids, columns=columns)
+
+
+def upsert_vehicles(rows: List[dict]) -> List[dict]:
+    """
+    Inserts vehicles into approved_registrations, skipping any
+    (email, registration) pair that is already approved (see
+    sql/003_approved_unique.sql). Returns only the newly inserted rows.
+    """
+    inserted = get_backend().upsert_vehicles(rows)
+    if inserted:
+        Namespace(get_cache(), REGISTRATION_PAGES).invalidate()
+    return inserted
+
+
+# --------------------------------------------------
+# Blacklist
+# --------------------------------------------------
+
+def fetch_blacklist_after(after_id: int, limit: int) -> List[dict]:
+    """
+    Returns up to limit blacklist rows with id > after_id, ordered by id.
+    Entries whose suspension has already ended are skipped. Shared between
+    replicas when the cache is.
+    """
+    return _shared_pages(BLACKLIST_PAGES, get_backend().fetch_blacklist_after)(after_id, limit)
+
+
+def find_suspensions(key: str) -> List[str]:
+    """
+    suspension_end dates of unexpired blacklist entries whose
+    registration_key equals key (an indexed equality match).
+    """
+    return get_backend().find_suspensions(key)
+
+
+def add_to_blacklist(registration: str, suspension_end: str) -> None:
+    """
+    Blacklists a registration until suspension_end (ISO 'YYYY-MM-DD').
+    """
+    get_backend().add_to_blacklist(registration, suspension_end)
+    Namespace(get_cache(), BLACKLIST_PAGES).invalidate()
@@ -0,0 +1,133 @@
+"""
+Constant-memory table exports for the admin page.
+
+Rows are fetched in keyset pages (id > last id seen, see
+db.fetch_export_page) and each page is written straight to a temporary
+file on disk before the next is requested, so at most one page is held in
+memory however large the table. CSV pages are appended as text; Parquet
+pages become one row group each. pyarrow (a Streamlit dependency) is
+imported only for Parquet exports.
+
+Streamlit's download button serves a file from memory, so the finished
+file is read in whole when downloaded. Exports are therefore capped at
+EXPORT_MAX_BYTES: writing stops with ExportTooLarge as soon as the file
+passes the cap.
+"""
+
+import csv
+import io
+import os
+import tempfile
+import time
+
+from parking.storage import EXPORTS
+
+FORMATS = {"CSV": (".csv", "text/csv"), "Parquet": (".parquet", "application/vnd.apache.parquet")}
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "parking-exports")
+EXPORT_MAX_AGE = 3600  # seconds an unclaimed export file is kept
+EXPORT_MAX_BYTES = 50 * 1024 * 1024  # largest file the download button is asked to serve
+
+
+class ExportTooLarge(Exception):
+    """The export passed max_bytes and was abandoned."""
+
+
+def iter_pages(fetch_page, table: str, start_date=None, end_date=None, page_size: int = 1000):
+    """Yields lists of rows from fetch_page, one keyset page at a time."""
+    after_id = 0
+    while True:
+        rows = fetch_page(table, after_id, page_size, start_date, end_date)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1]["id"]
+
+
+def write_csv(pages, columns, out):
+    """Writes pages of rows to the binary file out as UTF-8 CSV. Returns the row count."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.DictWriter(text, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for rows in pages:
+        writer.writerows(rows)
+        count += len(rows)
+    text.flush()
+    text.detach()  # leave out open for the caller
+    return count
+
+
+def write_parquet(pages, spec, out):
+    """Writes pages of rows to the binary file out as Parquet, one row group per page."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (column, pa.int64() if column == "id" else pa.date32() if column == spec.date_column else pa.string())
+        for column in spec.columns
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema, compression="snappy") as writer:
+        for rows in pages:
+            arrays = []
+            for field in schema:
+                values = [row.get(field.name) for row in rows]
+                if field.type == pa.date32():
+                    # ISO date text, as every backend returns it
+                    arrays.append(pa.array(values, type=pa.string()).cast(pa.date32()))
+                else:
+                    arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def remove_stale_exports(now=None):
+    """Deletes export files left behind by sessions that never downloaded them."""
+    now = time.time() if now is None else now
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass  # already removed by another session
+
+
+def export_table(fetch_page, table: str, fmt: str, start_date=None, end_date=None, page_size: int = 1000,
+                 max_bytes: int = EXPORT_MAX_BYTES):
+    """
+    Exports table to a new file under EXPORT_DIR in fmt ("CSV" or
+    "Parquet"). Returns (path, row_count). The caller removes the file.
+    Raises ExportTooLarge (and removes the file) once it passes max_bytes.
+    """
+    spec = EXPORTS[table]
+    suffix, _ = FORMATS[fmt]
+    remove_stale_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{table}-", suffix=suffix, dir=EXPORT_DIR)
+    pages = iter_pages(fetch_page, table, start_date, end_date, page_size)
+
+    def capped(pages, out):
+        for rows in pages:
+            yield rows
+            # Resumed once the writer has written the page
+            if out.tell() > max_bytes:
+                raise ExportTooLarge(f"The export is larger than the {max_bytes // (1024 * 1024)} MB download "
+                                     "limit. Narrow the date range or choose Parquet.")
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            pages = capped(pages, out)
+            if fmt == "CSV":
+                count = write_csv(pages, spec.columns, out)
+            else:
+                count = write_parquet(pages, spec, out)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, count
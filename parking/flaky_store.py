@@ -0,0 +1,64 @@
+"""
+Slow or failing stand-in for a storage backend.
+
+Wraps any StorageBackend (usually parking/local_store.py) and can be told
+to answer slowly or raise, so the circuit breaker, deadlines and hedged
+reads in parking/resilience.py can be exercised with no network access.
+"""
+
+import random
+import threading
+import time
+
+
+class BackendDown(ConnectionError):
+    """Raised by FlakyStore in place of a real driver error."""
+
+
+class FlakyStore:
+    """
+    Forwards every storage operation to ``backend`` after injecting faults.
+    is_service_error is answered without faults, since ResilientStore relies
+    on it while handling the injected ones. Attributes may be changed while
+    calls are in flight.
+
+    :param delay:     Seconds added to every call.
+    :param jitter:    Extra random delay, up to this many seconds.
+    :param fail_next: Number of upcoming calls that raise BackendDown.
+    :param fail_rate: Probability that any other call raises BackendDown.
+    :param seed:      Seed for the jitter and fail_rate draws.
+    """
+
+    def __init__(self, backend, delay: float = 0.0, jitter: float = 0.0,
+                 fail_next: int = 0, fail_rate: float = 0.0, seed: int = None):
+        self.backend = backend
+        self.delay = delay
+        self.jitter = jitter
+        self.fail_next = fail_next
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _fault(self):
+        with self._lock:
+            pause = self.delay + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            failing = self.fail_next > 0 or self._rng.random() < self.fail_rate
+            if self.fail_next > 0:
+                self.fail_next -= 1
+        if pause:
+            time.sleep(pause)
+        if failing:
+            raise BackendDown("injected backend failure")
+
+    def is_service_error(self, error):
+        return isinstance(error, BackendDown) or self.backend.is_service_error(error)
+
+    def __getattr__(self, name):
+        target = getattr(self.backend, name)
+        if not callable(target):
+            return target
+
+        def call(*args, **kwargs):
+            self._fault()
+            return target(*args, **kwargs)
+        return call
@@ -0,0 +1,591 @@
+"""
+Local SQLite storage backend (``[storage] BACKEND = "sqlite"``).
+
+Mirrors the Supabase tables and the behaviour of the database functions in
+``sql/`` so the app and benchmarks can run without network access.
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+
+from parking.booking_window import DEFAULT_SITE
+from parking.registration import registration_key
+from parking.storage import (ARCHIVE_TABLES, BLACKLIST_TABLE, BOOKINGS_TABLE, EXPORTS, REGISTRATION_KEY_TABLES,
+                             StorageBackend, parse_columns)
+
+HOLD = "hold"
+CONFIRMED = "confirmed"
+WAITLIST_STALE_SECONDS = 30  # waiters not seen for this long lose their place
+
+# Rows archive_rows moves, as in sql/008_archive.sql
+ARCHIVE_WHERE = {
+    BOOKINGS_TABLE: "date < ? and status = 'confirmed'",
+    BLACKLIST_TABLE: "suspension_end < ?",
+}
+
+SCHEMA = """
+create table if not exists maca_parking (
+    id integer primary key autoincrement,
+    created_at real not null,
+    site text not null default 'colin_st',
+    date text not null,
+    status text not null default 'confirmed',
+    expires_at real,
+    first_name text,
+    surname text,
+    email text,
+    mobile text,
+    registration text,
+    registration_key text
+);
+create index if not exists maca_parking_date_idx on maca_parking (date);
+create index if not exists maca_parking_site_date_idx on maca_parking (site, date);
+create index if not exists maca_parking_hold_expiry_idx on maca_parking (expires_at) where status = 'hold';
+
+create table if not exists maca_parking_archive (
+    id integer primary key,
+    created_at real not null,
+    site text not null,
+    date text not null,
+    status text not null,
+    expires_at real,
+    first_name text,
+    surname text,
+    email text,
+    mobile text,
+    registration text,
+    registration_key text,
+    archived_at real not null
+);
+create index if not exists maca_parking_archive_date_idx on maca_parking_archive (date);
+
+create table if not exists maca_waitlist (
+    id integer primary key autoincrement,
+    created_at real not null,
+    site text not null,
+    date text not null,
+    token text not null,
+    status text not null default 'waiting',
+    last_seen real not null,
+    hold_id integer,
+    hold_expires_at real
+);
+create unique index if not exists maca_waitlist_waiting_token_idx
+    on maca_waitlist (site, date, token) where status = 'waiting';
+create index if not exists maca_waitlist_queue_idx on maca_waitlist (site, date, id) where status = 'waiting';
+create index if not exists maca_waitlist_token_idx on maca_waitlist (token);
+
+create table if not exists maca_daily_usage (
+    site text not null,
+    date text not null,
+    holds_created integer not null default 0,
+    holds_expired integer not null default 0,
+    holds_released integer not null default 0,
+    bookings integer not null default 0,
+    first_hold_at real,
+    last_booking_at real,
+    primary key (site, date)
+);
+
+create table if not exists maca_registration_usage (
+    registration_key text primary key,
+    registration text,
+    bookings integer not null default 0,
+    last_date text
+);
+create index if not exists maca_registration_usage_bookings_idx on maca_registration_usage (bookings desc);
+
+create table if not exists approved_registrations (
+    id integer primary key autoincrement,
+    registration text,
+    registration_key text,
+    first_name text,
+    last_name text,
+    email text,
+    phone text,
+    make text,
+    model text,
+    colour text,
+    unique (email, registration)
+);
+create index if not exists approved_registrations_registration_key_idx
+    on approved_registrations (registration_key);
+
+create table if not exists blacklist (
+    id integer primary key autoincrement,
+    registration text,
+    registration_key text,
+    suspension_end text not null
+);
+create index if not exists blacklist_suspension_end_idx on blacklist (suspension_end);
+create index if not exists blacklist_registration_key_idx on blacklist (registration_key);
+
+create table if not exists blacklist_archive (
+    id integer primary key,
+    registration text,
+    registration_key text,
+    suspension_end text not null,
+    archived_at real not null
+);
+"""
+
+
+class LocalStore(StorageBackend):
+    """
+    Thread-safe SQLite implementation of the storage backend.
+
+    :param path: SQLite database path, defaults to a private in-memory database.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def is_service_error(self, error):
+        # "database is locked", disk I/O errors and the like
+        return isinstance(error, (OSError, sqlite3.OperationalError))
+
+    def _rows(self, query, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, params).fetchall()]
+
+    def _expire_holds(self, cur, now: float) -> int:
+        lapsed = cur.execute(
+            "delete from maca_parking where status = 'hold' and expires_at <= ? returning site, date", (now,)
+        ).fetchall()
+        for site, date in lapsed:
+            cur.execute(
+                "update maca_daily_usage set holds_expired = holds_expired + 1 where site = ? and date = ?",
+                (site, date),
+            )
+        return len(lapsed)
+
+    def _hold_created(self, cur, site, date_str, now):
+        # Usage summary bookkeeping; mirrors the trigger in sql/007_daily_usage.sql
+        cur.execute(
+            "insert into maca_daily_usage (site, date, holds_created, first_hold_at) values (?, ?, 1, ?) "
+            "on conflict (site, date) do update set holds_created = holds_created + 1, "
+            "first_hold_at = min(coalesce(first_hold_at, excluded.first_hold_at), excluded.first_hold_at)",
+            (site, date_str, now),
+        )
+
+    def expire_holds(self, now: float = None) -> int:
+        """Equivalent of the ``expire_holds`` RPC. Returns the number of holds removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                removed = self._expire_holds(cur, now)
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return removed
+
+    def reserve_bay(self, booking_date, total_bays: int, lock_seconds: int,
+                    site: str = DEFAULT_SITE.code, now: float = None):
+        """
+        Equivalent of the ``reserve_bay`` RPC: sweeps expired holds, serves
+        the waitlist, checks capacity and inserts a new hold in one transaction.
+
+        Returns the new hold id, or None if the site is full for that date or
+        anyone is still waiting for it.
+        """
+        now = time.time() if now is None else now
+        date_str = str(booking_date)
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                self._expire_holds(cur, now)
+                self._promote(cur, site, date_str, total_bays, lock_seconds, now)
+                (count,) = cur.execute(
+                    "select count(*) from maca_parking where site = ? and date = ?", (site, date_str)
+                ).fetchone()
+                (waiting,) = cur.execute(
+                    "select count(*) from maca_waitlist where site = ? and date = ? and status = 'waiting'",
+                    (site, date_str),
+                ).fetchone()
+                if count >= total_bays or waiting:
+                    cur.execute("commit")
+                    return None
+                cur.execute(
+                    "insert into maca_parking (created_at, site, date, status, expires_at) "
+                    "values (?, ?, ?, ?, ?)",
+                    (now, site, date_str, HOLD, now + lock_seconds),
+                )
+                hold_id = cur.lastrowid
+                self._hold_created(cur, site, date_str, now)
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return hold_id
+
+    def confirm_booking(self, hold_id: int, details: dict, now: float = None) -> bool:
+        """
+        Turns an unexpired hold into a confirmed booking.
+        Returns False if the hold has already lapsed or does not exist.
+        """
+        now = time.time() if now is None else now
+        columns = ("first_name", "surname", "email", "mobile", "registration", "registration_key")
+        details = dict(details, registration_key=registration_key(details.get("registration")))
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                confirmed = cur.execute(
+                    "update maca_parking set status = 'confirmed', expires_at = null, "
+                    + ", ".join(f"{c} = ?" for c in columns)
+                    + " where id = ? and status = 'hold' and expires_at > ? returning site, date",
+                    tuple(details.get(c) for c in columns) + (hold_id, now),
+                ).fetchone()
+                if confirmed is not None:
+                    self._booking_confirmed(cur, confirmed["site"], confirmed["date"], details, now)
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return confirmed is not None
+
+    def _booking_confirmed(self, cur, site, date_str, details, now):
+        cur.execute(
+            "insert into maca_daily_usage (site, date, bookings, last_booking_at) values (?, ?, 1, ?) "
+            "on conflict (site, date) do update set bookings = bookings + 1, "
+            "last_booking_at = max(coalesce(last_booking_at, excluded.last_booking_at), excluded.last_booking_at)",
+            (site, date_str, now),
+        )
+        if details["registration_key"]:
+            cur.execute(
+                "insert into maca_registration_usage (registration_key, registration, bookings, last_date) "
+                "values (?, ?, 1, ?) on conflict (registration_key) do update set bookings = bookings + 1, "
+                "registration = excluded.registration, last_date = max(last_date, excluded.last_date)",
+                (details["registration_key"], details.get("registration"), date_str),
+            )
+
+    def release_hold(self, hold_id: int, now: float = None) -> bool:
+        """Deletes a hold before it expires. Returns False if it was already gone."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                released = cur.execute(
+                    "delete from maca_parking where id = ? and status = 'hold' returning site, date, expires_at",
+                    (hold_id,),
+                ).fetchone()
+                if released is not None:
+                    lapsed = int(released["expires_at"] <= now)
+                    cur.execute(
+                        "update maca_daily_usage set holds_expired = holds_expired + ?, "
+                        "holds_released = holds_released + ? where site = ? and date = ?",
+                        (lapsed, 1 - lapsed, released["site"], released["date"]),
+                    )
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return released is not None
+
+    def count_bookings(self, booking_date, site: str = DEFAULT_SITE.code, now: float = None) -> int:
+        """
+        Equivalent of db.count_bookings: confirmed bookings plus unexpired
+        holds at a site for a date.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            (count,) = self._conn.execute(
+                "select count(*) from maca_parking where site = ? and date = ? "
+                "and (status = 'confirmed' or expires_at > ?)",
+                (site, str(booking_date), now),
+            ).fetchone()
+        return count
+
+    def count_bookings_bulk(self, pairs, now: float = None) -> dict:
+        """
+        Equivalent of db.count_bookings_bulk: one grouped count for every
+        (site, date) pair. Returns {(site, iso_date): booked}.
+        """
+        now = time.time() if now is None else now
+        pairs = [(site, str(booking_date)) for site, booking_date in pairs]
+        if not pairs:
+            return {}
+        values = ", ".join("(?, ?)" for _ in pairs)
+        with self._lock:
+            rows = self._conn.execute(
+                f"with q(site, date) as (values {values}) "
+                "select q.site, q.date, count(m.id) from q "
+                "left join maca_parking m on m.site = q.site and m.date = q.date "
+                "and (m.status = 'confirmed' or m.expires_at > ?) "
+                "group by q.site, q.date",
+                tuple(part for pair in pairs for part in pair) + (now,),
+            ).fetchall()
+        return {(site, date): count for site, date, count in rows}
+
+    # ---------- Waitlist ----------
+
+    def _promote(self, cur, site, date_str, total_bays, lock_seconds, now):
+        # Caller holds the write transaction and has swept expired holds
+        cur.execute(
+            "update maca_waitlist set status = 'left' "
+            "where site = ? and date = ? and status = 'waiting' and last_seen < ?",
+            (site, date_str, now - WAITLIST_STALE_SECONDS),
+        )
+        (count,) = cur.execute(
+            "select count(*) from maca_parking where site = ? and date = ?", (site, date_str)
+        ).fetchone()
+        heads = cur.execute(
+            "select id, token from maca_waitlist where site = ? and date = ? and status = 'waiting' "
+            "order by id limit ?",
+            (site, date_str, max(total_bays - count, 0)),
+        ).fetchall()
+        promoted = []
+        for entry_id, token in heads:
+            expires_at = now + lock_seconds
+            cur.execute(
+                "insert into maca_parking (created_at, site, date, status, expires_at) values (?, ?, ?, ?, ?)",
+                (now, site, date_str, HOLD, expires_at),
+            )
+            hold_id = cur.lastrowid
+            self._hold_created(cur, site, date_str, now)
+            cur.execute(
+                "update maca_waitlist set status = 'promoted', hold_id = ?, hold_expires_at = ? where id = ?",
+                (hold_id, expires_at, entry_id),
+            )
+            promoted.append({"token": token, "hold_id": hold_id, "hold_expires_at": expires_at})
+        return promoted
+
+    def join_waitlist(self, site: str, booking_date, token: str, now: float = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute(
+                "insert into maca_waitlist (created_at, site, date, token, last_seen) values (?, ?, ?, ?, ?) "
+                "on conflict (site, date, token) where status = 'waiting' do update set last_seen = excluded.last_seen",
+                (now, site, str(booking_date), token, now),
+            )
+
+    def leave_waitlist(self, token: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "update maca_waitlist set status = 'left' where token = ? and status = 'waiting'", (token,)
+            )
+
+    def promote_waitlist(self, booking_date, total_bays: int, lock_seconds: int,
+                         site: str = DEFAULT_SITE.code, now: float = None):
+        """Equivalent of the ``promote_waitlist`` RPC."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                self._expire_holds(cur, now)
+                promoted = self._promote(cur, site, str(booking_date), total_bays, lock_seconds, now)
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return promoted
+
+    def poll_waitlist(self, tokens, now: float = None) -> dict:
+        """Equivalent of the ``poll_waitlist`` RPC."""
+        now = time.time() if now is None else now
+        tokens = list(tokens)
+        if not tokens:
+            return {}
+        marks = ", ".join("?" for _ in tokens)
+        with self._lock:
+            self._conn.execute(
+                f"update maca_waitlist set last_seen = ? where token in ({marks}) and status = 'waiting'",
+                (now, *tokens),
+            )
+            rows = self._conn.execute(
+                "select l.token, l.status, l.site, l.date as booking_date, "
+                "(select count(*) from maca_waitlist a where a.site = l.site and a.date = l.date "
+                " and a.status = 'waiting' and a.id < l.id) as position, l.hold_id, l.hold_expires_at "
+                f"from maca_waitlist l where l.id in (select max(id) from maca_waitlist "
+                f"where token in ({marks}) group by token)",
+                tuple(tokens),
+            ).fetchall()
+        return {row["token"]: dict(row) for row in rows}
+
+    def count_confirmed(self, booking_date) -> int:
+        """Returns the number of confirmed bookings for a date."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "select count(*) from maca_parking where date = ? and status = 'confirmed'",
+                (str(booking_date),),
+            ).fetchone()
+        return count
+
+    # ---------- Usage summaries ----------
+
+    def fetch_daily_usage(self, start_date, end_date):
+        return self._rows(
+            "select site, date, holds_created, holds_expired, holds_released, bookings, "
+            "first_hold_at, last_booking_at from maca_daily_usage "
+            "where date >= ? and date <= ? order by date, site",
+            (str(start_date), str(end_date)),
+        )
+
+    def fetch_top_registrations(self, limit: int):
+        return self._rows(
+            "select registration_key, registration, bookings, last_date from maca_registration_usage "
+            "order by bookings desc, registration_key limit ?",
+            (limit,),
+        )
+
+    # ---------- Export ----------
+
+    def fetch_export_page(self, table: str, after_id: int, limit: int, start_date=None, end_date=None):
+        spec = EXPORTS[table]
+        # created_at is stored as a Unix timestamp here; export it as ISO text like Postgres
+        projection = ", ".join(
+            "strftime('%Y-%m-%dT%H:%M:%fZ', created_at, 'unixepoch') as created_at" if column == "created_at"
+            else column for column in spec.columns
+        )
+        where, params = ["id > ?"], [after_id]
+        if spec.confirmed_only:
+            where.append("status = 'confirmed'")
+        if spec.date_column and start_date is not None:
+            where.append(f"{spec.date_column} >= ?")
+            params.append(str(start_date))
+        if spec.date_column and end_date is not None:
+            where.append(f"{spec.date_column} <= ?")
+            params.append(str(end_date))
+        return self._rows(
+            f"select {projection} from {spec.table} where {' and '.join(where)} order by id limit ?",
+            (*params, limit),
+        )
+
+    # ---------- Archiving ----------
+
+    def archive_rows(self, table: str, before, limit: int, now: float = None) -> int:
+        """Equivalent of the ``archive_rows`` RPC."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                ids = [row[0] for row in cur.execute(
+                    f"select id from {table} where {ARCHIVE_WHERE[table]} order by id limit ?",
+                    (str(before), limit),
+                )]
+                if ids:
+                    marks = ", ".join("?" for _ in ids)
+                    cur.execute(f"insert into {ARCHIVE_TABLES[table]} select *, ? from {table} "
+                                f"where id in ({marks})", (now, *ids))
+                    cur.execute(f"delete from {table} where id in ({marks})", ids)
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return len(ids)
+
+    def purge_rows(self, table: str, ids) -> int:
+        if table not in ARCHIVE_TABLES:
+            raise ValueError(f"{table} is not archived")
+        ids = list(ids)
+        if not ids:
+            return 0
+        confirmed = " and status = 'confirmed'" if table == BOOKINGS_TABLE else ""
+        with self._lock:
+            cur = self._conn.execute(
+                f"delete from {table} where id in ({', '.join('?' for _ in ids)}){confirmed}", ids
+            )
+            return cur.rowcount
+
+    def backfill_registration_keys(self, table: str, after_id: int, limit: int):
+        """Equivalent of the ``backfill_registration_keys`` RPC."""
+        if table not in REGISTRATION_KEY_TABLES:
+            raise ValueError(f"unsupported table {table}")
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin immediate")
+            try:
+                rows = cur.execute(f"select id, registration, registration_key from {table} "
+                                   "where id > ? order by id limit ?", (after_id, limit)).fetchall()
+                cur.executemany(f"update {table} set registration_key = ? where id = ?",
+                                [(registration_key(row[1]), row[0]) for row in rows
+                                 if row[2] != registration_key(row[1])])
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return rows[-1][0] if rows else None
+
+    # ---------- Approved registrations ----------
+
+    def fetch_registration_keys(self, after_id: int, limit: int):
+        return self._rows(
+            "select id, registration, registration_key, first_name, last_name, email "
+            "from approved_registrations where id > ? order by id limit ?",
+            (after_id, limit),
+        )
+
+    def find_registration_ids(self, key: str):
+        rows = self._rows("select id from approved_registrations where registration_key = ? order by id", (key,))
+        return [row["id"] for row in rows]
+
+    def fetch_registrations_by_ids(self, ids, columns: str = "*"):
+        ids = list(ids)
+        if not ids:
+            return []
+        names = parse_columns(columns)
+        projection = "*" if names is None else ", ".join(names)
+        return self._rows(
+            f"select {projection} from approved_registrations "
+            f"where id in ({', '.join('?' for _ in ids)}) order by id",
+            tuple(ids),
+        )
+
+    def upsert_vehicles(self, rows):
+        """Inserts rows, skipping (email, registration) pairs already present."""
+        if not rows:
+            return []
+        names = parse_columns(", ".join(rows[0]))
+        inserted = []
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("begin")
+            try:
+                for row in rows:
+                    cur.execute(
+                        f"insert or ignore into approved_registrations ({', '.join(names)}) "
+                        f"values ({', '.join('?' for _ in names)})",
+                        tuple(row.get(name) for name in names),
+                    )
+                    if cur.rowcount == 1:
+                        inserted.append(dict(row, id=cur.lastrowid))
+                cur.execute("commit")
+            except Exception:
+                cur.execute("rollback")
+                raise
+        return inserted
+
+    # ---------- Blacklist ----------
+
+    def fetch_blacklist_after(self, after_id: int, limit: int):
+        return self._rows(
+            "select id, registration, registration_key, suspension_end from blacklist "
+            "where id > ? and suspension_end >= ? order by id limit ?",
+            (after_id, datetime.date.today().isoformat(), limit),
+        )
+
+    def find_suspensions(self, key: str):
+        rows = self._rows(
+            "select suspension_end from blacklist where registration_key = ? and suspension_end >= ?",
+            (key, datetime.date.today().isoformat()),
+        )
+        return [row["suspension_end"] for row in rows]
+
+    def add_to_blacklist(self, registration: str, suspension_end: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert into blacklist (registration, registration_key, suspension_end) values (?, ?, ?)",
+                (registration, registration_key(registration), suspension_end),
+            )
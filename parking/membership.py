@@ -0,0 +1,171 @@
+"""
+Process-wide approved-list and blacklist membership for the booking flow.
+
+Both tables are mirrored in memory so "Confirm Booking" can reject
+blacklisted or unapproved vehicles without any extra round trips:
+
+- approved registrations live in a hash set;
+- blacklist entries live in a dict (registration -> latest suspension_end)
+  with a min-heap on suspension_end so lapsed suspensions drop out lazily.
+
+A daemon thread loads both when the mirror is started, then tops them up
+incrementally by id and periodically rebuilds them to pick up edits and
+deletes. Until the first load finishes, check() falls back to indexed
+lookups (find_registration_ids / find_suspensions) so no caller waits for
+the full tables.
+"""
+
+import datetime
+import heapq
+import threading
+import time
+
+from parking.registration import registration_key
+
+ALLOWED = "allowed"
+BLACKLISTED = "blacklisted"
+UNAPPROVED = "unapproved"
+
+
+def _as_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+class VehicleMembership:
+    """
+    :param fetch_approved_after:  callable(after_id, limit) -> approved rows ordered by id.
+    :param fetch_blacklist_after: callable(after_id, limit) -> blacklist rows ordered by id.
+    :param refresh_interval:      Seconds between background incremental refreshes.
+    :param rebuild_interval:      Seconds between full rebuilds.
+    :param find_approved:         callable(key) -> ids of approved rows; used before the first load.
+    :param find_suspensions:      callable(key) -> unexpired suspension_end dates; used before the first load.
+    """
+
+    def __init__(self, fetch_approved_after, fetch_blacklist_after, batch_size: int = 1000,
+                 refresh_interval: float = 60.0, rebuild_interval: float = 900.0,
+                 find_approved=None, find_suspensions=None):
+        self._fetch_approved_after = fetch_approved_after
+        self._fetch_blacklist_after = fetch_blacklist_after
+        self._find_approved = find_approved
+        self._find_suspensions = find_suspensions
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._approved = set()
+        self._suspended = {}  # registration -> suspension_end
+        self._expiry = []  # heap of (suspension_end, registration)
+        self._approved_after = 0
+        self._blacklist_after = 0
+        self._built_at = 0.0
+        self._loaded = threading.Event()
+
+    # ---------- Maintenance ----------
+
+    def add_approved(self, registration):
+        key = registration_key(registration)
+        if key:
+            with self._lock:
+                self._approved.add(key)
+
+    def add_suspension(self, registration, suspension_end):
+        key = registration_key(registration)
+        if not key:
+            return
+        end = _as_date(suspension_end)
+        with self._lock:
+            if end > self._suspended.get(key, datetime.date.min):
+                self._suspended[key] = end
+                heapq.heappush(self._expiry, (end, key))
+
+    def _pull(self, fetch, after_id):
+        while True:
+            rows = fetch(after_id, self.batch_size)
+            for row in rows:
+                yield row
+                after_id = max(after_id, row["id"])
+            if len(rows) < self.batch_size:
+                return
+
+    def refresh(self):
+        """Loads rows added since the last refresh (or everything, when due a rebuild)."""
+        if time.monotonic() - self._built_at >= self.rebuild_interval:
+            fresh = VehicleMembership(self._fetch_approved_after, self._fetch_blacklist_after, self.batch_size)
+            fresh._load_new()
+            with self._lock:
+                self._approved, self._suspended, self._expiry = fresh._approved, fresh._suspended, fresh._expiry
+                self._approved_after, self._blacklist_after = fresh._approved_after, fresh._blacklist_after
+            self._built_at = time.monotonic()
+        else:
+            self._load_new()
+
+    def _load_new(self):
+        for row in self._pull(self._fetch_approved_after, self._approved_after):
+            self.add_approved(row.get("registration_key") or row.get("registration"))
+            self._approved_after = max(self._approved_after, row["id"])
+        for row in self._pull(self._fetch_blacklist_after, self._blacklist_after):
+            if row.get("suspension_end"):
+                self.add_suspension(row.get("registration_key") or row.get("registration"), row["suspension_end"])
+            self._blacklist_after = max(self._blacklist_after, row["id"])
+
+    def _expire(self, today):
+        # Caller holds the lock. Drops suspensions that ended before today.
+        while self._expiry and self._expiry[0][0] < today:
+            end, key = heapq.heappop(self._expiry)
+            if self._suspended.get(key) == end:
+                del self._suspended[key]
+
+    # ---------- Queries ----------
+
+    @property
+    def loaded(self) -> bool:
+        """True once both tables have been mirrored."""
+        return self._loaded.is_set()
+
+    def check(self, registration, today=None) -> str:
+        """Returns ALLOWED, BLACKLISTED or UNAPPROVED for a registration."""
+        key = registration_key(registration)
+        today = today or datetime.date.today()
+        if not self.loaded and self._find_approved is not None:
+            return self._check_indexed(key, today)
+        with self._lock:
+            self._expire(today)
+            if key in self._suspended:
+                return BLACKLISTED
+            if key not in self._approved:
+                return UNAPPROVED
+        return ALLOWED
+
+    def _check_indexed(self, key, today) -> str:
+        # Two indexed lookups instead of the mirror, while it is still loading
+        if not key:
+            return UNAPPROVED
+        if any(_as_date(end) >= today for end in self._find_suspensions(key)):
+            return BLACKLISTED
+        return ALLOWED if self._find_approved(key) else UNAPPROVED
+
+    # ---------- Background refresh ----------
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.refresh()
+                self._loaded.set()
+            except Exception as e:
+                print(f"Error refreshing vehicle membership: {e}")
+            self._stopping.wait(self.refresh_interval)
+
+    def start(self):
+        """Loads everything, then keeps refreshing, in a daemon thread. Returns at once."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="vehicle-membership", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
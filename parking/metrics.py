@@ -0,0 +1,227 @@
+"""
+Lightweight in-process instrumentation.
+
+Counters and fixed-bucket histograms keyed by name and labels, rendered in
+the Prometheus text format. Disabled by default; when disabled every call
+returns immediately, so instrumented hot paths cost next to nothing.
+
+Enable with configure(enabled=True) (app.py reads [metrics] ENABLED from
+secrets) or PARKING_METRICS=1 in the environment. When a path is given the
+text is also written to that file every few seconds for scraping.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+HELP = {
+    "supabase_request_seconds": "Latency of Supabase requests",
+    "supabase_rows_returned": "Rows returned per Supabase request",
+    "supabase_errors_total": "Supabase requests that raised",
+    "postgres_request_seconds": "Latency of direct PostgreSQL queries",
+    "postgres_errors_total": "Direct PostgreSQL queries that raised",
+    "storage_timeouts_total": "Storage calls that missed their deadline",
+    "storage_errors_total": "Storage calls that failed",
+    "storage_rejected_total": "Storage calls refused while the circuit breaker was open",
+    "storage_hedged_total": "Reads sent a second time",
+    "circuit_breaker_opened_total": "Times the storage circuit breaker opened",
+    "webhook_request_seconds": "Latency of Teams webhook posts",
+    "webhook_errors_total": "Teams webhook posts that failed",
+    "streamlit_reruns_total": "Script reruns by booking stage",
+    "image_render_seconds": "Time spent rendering challenge images",
+    "admission_wait_seconds": "Time spent queued in the waiting room",
+    "admission_rate_limited_total": "Attempts refused by a session's token bucket",
+    "admission_abandoned_total": "Queued sessions that stopped polling",
+}
+
+_ENV_ENABLED = os.environ.get("PARKING_METRICS", "") not in ("", "0", "false")
+_enabled = _ENV_ENABLED
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_buckets = {}  # name -> bucket bounds
+_writer = None
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Adds value to a counter."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Records value in a histogram."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    i = bisect.bisect_left(buckets, value)
+    with _lock:
+        _buckets.setdefault(name, buckets)
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(buckets) + 2)
+        hist[i] += 1
+        hist[-1] += value
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+@contextmanager
+def _timer(name, error_counter, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if error_counter:
+            inc(error_counter, **labels)
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, error_counter=None, **labels):
+    """
+    Context manager recording the block's duration in histogram name.
+    Exceptions also bump error_counter (if given) and are re-raised.
+    """
+    if not _enabled:
+        return _NOOP
+    return _timer(name, error_counter, labels)
+
+
+# --------------------------------------------------
+# Export
+# --------------------------------------------------
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def snapshot():
+    """
+    Returns copies of (counters, histograms, buckets): counters and
+    histograms map (name, labels) to a value / [counts..., sum], and buckets
+    maps each histogram name to its bucket bounds.
+    """
+    with _lock:
+        return dict(_counters), {k: list(v) for k, v in _histograms.items()}, dict(_buckets)
+
+
+def _bucket_quantile(bounds, hist, q):
+    total = sum(hist[:-1])
+    target = q * total
+    cumulative = 0
+    for bound, count in zip(list(bounds) + [float("inf")], hist[:-1]):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+
+def summary():
+    """
+    One dict per histogram series with count, mean and bucket-resolution
+    p50/p95/p99 (the upper bound of the bucket holding each quantile).
+    """
+    _, histograms, buckets = snapshot()
+    rows = []
+    for (name, labels), hist in sorted(histograms.items()):
+        count = sum(hist[:-1])
+        bounds = buckets[name]
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels),
+            "count": count,
+            "mean": hist[-1] / count if count else 0.0,
+            "p50": _bucket_quantile(bounds, hist, 0.50),
+            "p95": _bucket_quantile(bounds, hist, 0.95),
+            "p99": _bucket_quantile(bounds, hist, 0.99),
+        })
+    return rows
+
+
+def render_text() -> str:
+    """Current metrics in the Prometheus text exposition format."""
+    counters, histograms, buckets = snapshot()
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(buckets[name], hist):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+        cumulative += hist[len(buckets[name])]
+        lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {hist[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(render_text())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
+
+
+def configure(enabled: bool = None, path: str = None, interval: float = 5.0):
+    """
+    Turns metrics on or off and optionally starts a thread that writes the
+    text format to path every interval seconds. Safe to call on every rerun.
+    """
+    global _enabled, _writer
+    if enabled is not None:
+        _enabled = bool(enabled) or _ENV_ENABLED
+    if _enabled and path and _writer is None:
+        _writer = threading.Thread(target=_write_loop, args=(path, interval), name="metrics-writer", daemon=True)
+        _writer.start()
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _buckets.clear()
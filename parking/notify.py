@@ -0,0 +1,213 @@
+"""
+Durable, asynchronous Microsoft Teams notifications.
+
+Messages are written to a local SQLite outbox and delivered by a background
+thread, so confirming a booking never waits on the webhook. Delivery uses
+timeouts, exponential backoff on failure, and bursts of messages are
+coalesced into a single digest post.
+
+Several processes (e.g. replicas on one host) may share the outbox file.
+A worker claims a batch atomically before posting it, so each message is
+posted by one worker; a claim not settled within the lease (the worker
+died mid-post) is picked up again by any worker.
+"""
+
+import sqlite3
+import threading
+import time
+
+from parking import metrics
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+SCHEMA = """
+create table if not exists outbox (
+    id integer primary key autoincrement,
+    message text not null,
+    created_at real not null,
+    status text not null default 'pending',
+    attempts integer not null default 0,
+    next_attempt_at real not null,
+    sent_at real,
+    last_error text,
+    claimed_until real
+);
+create index if not exists outbox_due_idx on outbox (next_attempt_at) where status = 'pending';
+"""
+
+# Outbox files created before claims existed lack the column and its index
+CLAIMS = """
+create index if not exists outbox_claim_idx on outbox (claimed_until) where status = 'sending';
+"""
+
+
+def send_teams_notification(webhook_url: str, message: str, timeout: float = 5.0):
+    """
+    Sends a notification to a Microsoft Teams channel
+    via an Incoming Webhook. Raises on timeout or a non-2xx response.
+
+    :param webhook_url: The full Teams webhook URL.
+    :param message:     The text to display in Teams.
+    :param timeout:     Seconds to wait for connect and for the response.
+    """
+    import requests  # deferred: only the outbox worker thread needs it
+
+    payload = {
+        "text": message
+    }
+    with metrics.timed("webhook_request_seconds", "webhook_errors_total"):
+        response = requests.post(webhook_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+
+
+def build_digest(messages):
+    """Combines several messages into one Teams post."""
+    if len(messages) == 1:
+        return messages[0]
+    header = f"**{len(messages)} new notifications**"
+    return "\n\n---\n\n".join([header] + list(messages))
+
+
+class TeamsOutbox:
+    """
+    SQLite-backed outbox with a background delivery worker.
+
+    :param webhook_url:  Teams Incoming Webhook URL.
+    :param path:         SQLite file holding undelivered messages.
+    :param timeout:      Per-request timeout in seconds.
+    :param max_attempts: Attempts before a message is marked dead.
+    :param backoff:      Base delay in seconds; doubles after each failure.
+    :param max_backoff:  Upper bound on the retry delay.
+    :param batch_window: Seconds to wait after a wake-up so bursts coalesce.
+    :param max_batch:    Most messages combined into one digest.
+    :param lease:        Seconds a worker's claim on a batch lasts; must exceed timeout.
+    """
+
+    def __init__(self, webhook_url: str, path: str = "teams_outbox.sqlite3", timeout: float = 5.0,
+                 max_attempts: int = 6, backoff: float = 2.0, max_backoff: float = 300.0,
+                 batch_window: float = 2.0, max_batch: int = 20, lease: float = 60.0,
+                 sender=send_teams_notification):
+        self.webhook_url = webhook_url
+        self.timeout = timeout
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._sender = sender
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.executescript(SCHEMA)
+        if "claimed_until" not in {row[1] for row in self._conn.execute("pragma table_info(outbox)")}:
+            self._conn.execute("alter table outbox add column claimed_until real")
+        self._conn.executescript(CLAIMS)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    # ---------- Producer side ----------
+
+    def enqueue(self, message: str) -> None:
+        """Stores message for delivery and wakes the worker. Never touches the network."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "insert into outbox (message, created_at, next_attempt_at) values (?, ?, ?)",
+                (message, now, now),
+            )
+        self._wake.set()
+
+    def pending_count(self) -> int:
+        """Messages not yet delivered, including batches being posted."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "select count(*) from outbox where status in ('pending', 'sending')"
+            ).fetchone()
+        return count
+
+    # ---------- Delivery ----------
+
+    def flush_once(self, now: float = None) -> int:
+        """
+        Claims one batch of due messages (and any whose claim lapsed) and
+        delivers it as a single post. Returns the number of messages
+        delivered (0 if none due or the post failed).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            # One statement, so two workers can never claim the same row
+            rows = self._conn.execute(
+                "update outbox set status = 'sending', claimed_until = ? where id in ("
+                "select id from outbox where (status = 'pending' and next_attempt_at <= ?) "
+                "or (status = 'sending' and claimed_until <= ?) order by id limit ?) "
+                "returning id, message, attempts",
+                (now + self.lease, now, now, self.max_batch),
+            ).fetchall()
+        if not rows:
+            return 0
+        rows.sort()
+
+        ids = [row[0] for row in rows]
+        marks = ",".join("?" * len(ids))
+        try:
+            self._sender(self.webhook_url, build_digest([row[1] for row in rows]), timeout=self.timeout)
+        except Exception as e:
+            with self._lock:
+                for row_id, _, attempts in rows:
+                    attempts += 1
+                    delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                    status = DEAD if attempts >= self.max_attempts else PENDING
+                    self._conn.execute(
+                        "update outbox set attempts = ?, status = ?, next_attempt_at = ?, last_error = ?, "
+                        "claimed_until = null where id = ?",
+                        (attempts, status, now + delay, str(e)[:500], row_id),
+                    )
+            print(f"Error sending Teams notification: {e}")
+            return 0
+
+        with self._lock:
+            self._conn.execute(
+                f"update outbox set status = 'sent', sent_at = ?, attempts = attempts + 1, claimed_until = null "
+                f"where id in ({marks})",
+                [now] + ids,
+            )
+        return len(ids)
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            (due,) = self._conn.execute(
+                "select min(case status when 'pending' then next_attempt_at else claimed_until end) "
+                "from outbox where status in ('pending', 'sending')"
+            ).fetchone()
+        return None if due is None else max(0.0, due - time.time())
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(timeout=self._next_due_in())
+            if self._stopping.is_set():
+                break
+            self._wake.clear()
+            # Give a burst of confirmations a moment to land in one digest
+            self._stopping.wait(self.batch_window)
+            while self.flush_once():
+                pass
+
+    def start(self):
+        """Starts the background worker (idempotent). Picks up anything left from a previous run."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="teams-outbox", daemon=True)
+            self._thread.start()
+            self._wake.set()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,286 @@
+"""
+Direct PostgreSQL storage backend.
+
+Talks to the database over a bounded psycopg connection pool instead of
+PostgREST, so each call is one round trip on an already-open connection
+rather than an HTTPS request. The hot booking queries (count, reserve,
+confirm, release, expire) run as server-side prepared statements, parsed
+and planned once per pooled connection.
+
+psycopg and psycopg_pool are imported on first use, so they are only
+needed when ``[storage] BACKEND = "postgres"``.
+"""
+
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+from parking import metrics
+from parking.booking_window import DEFAULT_SITE
+from parking.registration import registration_key
+from parking.storage import (APPROVED_TABLE, ARCHIVE_TABLES, BLACKLIST_TABLE, BOOKINGS_TABLE, EXPORTS,
+                             REGISTRATION_USAGE_TABLE, USAGE_TABLE, WAITLIST_TABLE, StorageBackend,
+                             parse_columns)
+
+# Hot statements, executed with prepare=True
+COUNT_BOOKINGS_SQL = """
+    select count(*) as booked
+      from public.maca_parking
+     where site = %s and "date" = %s::date
+       and (status = 'confirmed' or expires_at > now())
+"""
+BOOKING_COUNTS_SQL = "select site, booking_date::text, booked from public.booking_counts(%s::text[], %s::date[])"
+RESERVE_BAY_SQL = "select public.reserve_bay(%s::date, %s, %s, %s) as id"
+CONFIRM_BOOKING_SQL = """
+    update public.maca_parking
+       set first_name = %s, surname = %s, email = %s, mobile = %s,
+           registration = %s, registration_key = %s,
+           status = 'confirmed', expires_at = null
+     where id = %s and status = 'hold' and expires_at > now()
+"""
+RELEASE_HOLD_SQL = "delete from public.maca_parking where id = %s and status = 'hold'"
+EXPIRE_HOLDS_SQL = "select public.expire_holds() as removed"
+PROMOTE_WAITLIST_SQL = "select token, hold_id, hold_expires_at from public.promote_waitlist(%s, %s::date, %s, %s)"
+POLL_WAITLIST_SQL = """
+    select token, status, site, booking_date, "position", hold_id, hold_expires_at
+      from public.poll_waitlist(%s::text[])
+"""
+
+
+class PostgresStore(StorageBackend):
+    """
+    :param dsn:      libpq connection string, e.g. the Supabase "direct connection" URI.
+    :param min_size: Connections kept open.
+    :param max_size: Upper bound on connections; callers beyond it wait up to timeout.
+    :param timeout:  Seconds to wait for a free connection before raising.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, timeout: float = 10.0):
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        self.pool = ConnectionPool(dsn, min_size=min_size, max_size=max_size, timeout=timeout,
+                                   kwargs={"autocommit": True, "row_factory": dict_row},
+                                   name="parking", open=True)
+
+    def close(self):
+        self.pool.close()
+
+    def is_service_error(self, error):
+        # Connection failures, pool timeouts (PoolTimeout), cancelled
+        # statements, serialization failures and resource exhaustion
+        import psycopg
+
+        return isinstance(error, (OSError, psycopg.OperationalError))
+
+    def _run(self, table, operation, query, params=(), prepare=None):
+        """Executes one statement on a pooled connection; returns the cursor's rows and rowcount."""
+        with metrics.timed("postgres_request_seconds", "postgres_errors_total",
+                           table=table, operation=operation):
+            with self.pool.connection() as conn:
+                cur = conn.execute(query, params, prepare=prepare)
+                rows = cur.fetchall() if cur.description else []
+                return rows, cur.rowcount
+
+    # ---------- Bookings ----------
+
+    def reserve_bay(self, booking_date, total_bays: int, lock_seconds: int,
+                    site: str = DEFAULT_SITE.code) -> Optional[int]:
+        rows, _ = self._run(BOOKINGS_TABLE, "reserve", RESERVE_BAY_SQL,
+                            (str(booking_date), total_bays, lock_seconds, site), prepare=True)
+        return rows[0]["id"]
+
+    def confirm_booking(self, hold_id: int, details: dict) -> bool:
+        _, updated = self._run(BOOKINGS_TABLE, "confirm", CONFIRM_BOOKING_SQL, (
+            details.get("first_name"), details.get("surname"), details.get("email"),
+            details.get("mobile"), details.get("registration"),
+            registration_key(details.get("registration")), hold_id,
+        ), prepare=True)
+        return updated == 1
+
+    def release_hold(self, hold_id: int) -> None:
+        self._run(BOOKINGS_TABLE, "release", RELEASE_HOLD_SQL, (hold_id,), prepare=True)
+
+    def expire_holds(self) -> int:
+        rows, _ = self._run(BOOKINGS_TABLE, "expire", EXPIRE_HOLDS_SQL, prepare=True)
+        return rows[0]["removed"]
+
+    def count_bookings(self, booking_date, site: str = DEFAULT_SITE.code) -> int:
+        rows, _ = self._run(BOOKINGS_TABLE, "count", COUNT_BOOKINGS_SQL,
+                            (site, str(booking_date)), prepare=True)
+        return rows[0]["booked"]
+
+    def count_bookings_bulk(self, pairs) -> Dict[Tuple[str, str], int]:
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        rows, _ = self._run(BOOKINGS_TABLE, "count_bulk", BOOKING_COUNTS_SQL, (
+            [site for site, _ in pairs], [str(booking_date) for _, booking_date in pairs],
+        ), prepare=True)
+        return {(row["site"], row["booking_date"]): row["booked"] for row in rows}
+
+    # ---------- Waitlist ----------
+
+    def join_waitlist(self, site: str, booking_date, token: str) -> None:
+        self._run(WAITLIST_TABLE, "join", "select public.join_waitlist(%s, %s::date, %s)",
+                  (site, str(booking_date), token))
+
+    def leave_waitlist(self, token: str) -> None:
+        self._run(WAITLIST_TABLE, "leave", "select public.leave_waitlist(%s)", (token,))
+
+    def promote_waitlist(self, booking_date, total_bays: int, lock_seconds: int,
+                         site: str = DEFAULT_SITE.code) -> List[dict]:
+        rows, _ = self._run(WAITLIST_TABLE, "promote", PROMOTE_WAITLIST_SQL,
+                            (site, str(booking_date), total_bays, lock_seconds), prepare=True)
+        return rows
+
+    def poll_waitlist(self, tokens) -> Dict[str, dict]:
+        tokens = list(tokens)
+        if not tokens:
+            return {}
+        rows, _ = self._run(WAITLIST_TABLE, "poll", POLL_WAITLIST_SQL, (tokens,), prepare=True)
+        return {row["token"]: row for row in rows}
+
+    # ---------- Usage summaries ----------
+
+    def fetch_daily_usage(self, start_date, end_date) -> List[dict]:
+        rows, _ = self._run(USAGE_TABLE, "scan", """
+            select site, "date"::text as date, holds_created, holds_expired, holds_released, bookings,
+                   extract(epoch from first_hold_at)::float8 as first_hold_at,
+                   extract(epoch from last_booking_at)::float8 as last_booking_at
+              from public.maca_daily_usage
+             where "date" between %s::date and %s::date
+             order by "date", site
+        """, (str(start_date), str(end_date)))
+        return rows
+
+    def fetch_top_registrations(self, limit: int) -> List[dict]:
+        rows, _ = self._run(REGISTRATION_USAGE_TABLE, "top", """
+            select registration_key, registration, bookings, last_date::text as last_date
+              from public.maca_registration_usage
+             order by bookings desc, registration_key
+             limit %s
+        """, (limit,))
+        return rows
+
+    # ---------- Export ----------
+
+    def fetch_export_page(self, table: str, after_id: int, limit: int,
+                          start_date=None, end_date=None) -> List[dict]:
+        from psycopg import sql
+
+        spec = EXPORTS[table]
+        projection = sql.SQL(", ").join(
+            sql.Identifier(column) if column == "id"
+            else sql.SQL("{0}::text as {0}").format(sql.Identifier(column))
+            for column in spec.columns
+        )
+        where, params = [sql.SQL("id > %s")], [after_id]
+        if spec.confirmed_only:
+            where.append(sql.SQL("status = 'confirmed'"))
+        if spec.date_column and start_date is not None:
+            where.append(sql.SQL("{} >= %s::date").format(sql.Identifier(spec.date_column)))
+            params.append(str(start_date))
+        if spec.date_column and end_date is not None:
+            where.append(sql.SQL("{} <= %s::date").format(sql.Identifier(spec.date_column)))
+            params.append(str(end_date))
+        query = sql.SQL("select {} from public.{} where {} order by id limit %s").format(
+            projection, sql.Identifier(spec.table), sql.SQL(" and ").join(where))
+        rows, _ = self._run(spec.table, "export", query, (*params, limit))
+        return rows
+
+    # ---------- Archiving ----------
+
+    def archive_rows(self, table: str, before, limit: int) -> int:
+        rows, _ = self._run(table, "archive", "select public.archive_rows(%s, %s::date, %s) as moved",
+                            (table, str(before), limit))
+        return rows[0]["moved"]
+
+    def purge_rows(self, table: str, ids) -> int:
+        from psycopg import sql
+
+        if table not in ARCHIVE_TABLES:
+            raise ValueError(f"{table} is not archived")
+        ids = list(ids)
+        if not ids:
+            return 0
+        query = sql.SQL("delete from public.{} where id = any(%s)").format(sql.Identifier(table))
+        if table == BOOKINGS_TABLE:
+            query += sql.SQL(" and status = 'confirmed'")
+        _, deleted = self._run(table, "purge", query, (ids,))
+        return deleted
+
+    def backfill_registration_keys(self, table: str, after_id: int, limit: int) -> Optional[int]:
+        rows, _ = self._run(table, "backfill",
+                            "select public.backfill_registration_keys(%s, %s, %s) as last_id",
+                            (table, after_id, limit))
+        return rows[0]["last_id"]
+
+    # ---------- Approved registrations ----------
+
+    def fetch_registration_keys(self, after_id: int, limit: int) -> List[dict]:
+        rows, _ = self._run(APPROVED_TABLE, "scan", """
+            select id, registration, registration_key, first_name, last_name, email
+              from public.approved_registrations
+             where id > %s order by id limit %s
+        """, (after_id, limit))
+        return rows
+
+    def find_registration_ids(self, key: str) -> List[int]:
+        rows, _ = self._run(APPROVED_TABLE, "lookup",
+                            "select id from public.approved_registrations where registration_key = %s order by id",
+                            (key,))
+        return [row["id"] for row in rows]
+
+    def fetch_registrations_by_ids(self, ids, columns: str = "*") -> List[dict]:
+        from psycopg import sql
+
+        ids = list(ids)
+        if not ids:
+            return []
+        names = parse_columns(columns)
+        projection = sql.SQL("*") if names is None else sql.SQL(", ").join(map(sql.Identifier, names))
+        query = sql.SQL("select {} from public.approved_registrations where id = any(%s) order by id")
+        rows, _ = self._run(APPROVED_TABLE, "fetch", query.format(projection), (ids,))
+        return rows
+
+    def upsert_vehicles(self, rows: List[dict]) -> List[dict]:
+        from psycopg import sql
+
+        if not rows:
+            return []
+        names = parse_columns(", ".join(rows[0]))
+        query = sql.SQL(
+            "insert into public.approved_registrations ({}) values {} "
+            "on conflict (email, registration) do nothing returning *"
+        ).format(
+            sql.SQL(", ").join(map(sql.Identifier, names)),
+            sql.SQL(", ").join(sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * len(names)))
+                               for _ in rows),
+        )
+        inserted, _ = self._run(APPROVED_TABLE, "upsert", query,
+                                [row.get(name) for row in rows for name in names])
+        return inserted
+
+    # ---------- Blacklist ----------
+
+    def fetch_blacklist_after(self, after_id: int, limit: int) -> List[dict]:
+        rows, _ = self._run(BLACKLIST_TABLE, "scan", """
+            select id, registration, registration_key, suspension_end::text
+              from public.blacklist
+             where id > %s and suspension_end >= %s::date
+             order by id limit %s
+        """, (after_id, datetime.date.today().isoformat(), limit))
+        return rows
+
+    def find_suspensions(self, key: str) -> List[str]:
+        rows, _ = self._run(BLACKLIST_TABLE, "lookup",
+                            "select suspension_end::text from public.blacklist "
+                            "where registration_key = %s and suspension_end >= %s::date",
+                            (key, datetime.date.today().isoformat()))
+        return [row["suspension_end"] for row in rows]
+
+    def add_to_blacklist(self, registration: str, suspension_end: str) -> None:
+        self._run(BLACKLIST_TABLE, "insert",
+                  "insert into public.blacklist (registration, registration_key, suspension_end) "
+                  "values (%s, %s, %s::date)",
+                  (registration, registration_key(registration), suspension_end))
@@ -0,0 +1,19 @@
+"""
+Canonical registration key.
+
+Registrations are typed in every style ("1abc 123", "1ABC-123", " 1Abc123").
+Every script stores and compares them through registration_key(), which
+matches the registration_key() SQL function in sql/004_registration_key.sql.
+"""
+
+import re
+
+_NON_ALNUM = re.compile(r"[^0-9A-Za-z]+")
+
+# Same rule as a pandas str.replace pattern, for vectorised use
+KEY_STRIP_PATTERN = _NON_ALNUM.pattern
+
+
+def registration_key(value) -> str:
+    """Upper-case letters and digits only: '1abc-123 ' -> '1ABC123'."""
+    return _NON_ALNUM.sub("", str(value or "")).upper()
@@ -0,0 +1,148 @@
+"""
+In-memory trigram index over approved registrations.
+
+Loaded once per process and topped up incrementally by id, so exact and
+"contains" lookups are answered in memory; only the matching rows are then
+fetched from Supabase.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from parking.registration import registration_key
+
+N = 3  # trigram
+INDEXED_FIELDS = ("registration", "first_name", "last_name", "email")
+
+
+def normalize(value) -> str:
+    """Lower-case with all whitespace removed, matching how lookups are typed."""
+    return "".join(str(value or "").split()).lower()
+
+
+def normalizer(field):
+    # Registrations use the canonical key; names and emails the looser rule
+    return registration_key if field == "registration" else normalize
+
+
+def ngrams(text: str, n: int = N):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def next_page(ids, after_id: int, limit: int):
+    """
+    Keyset pagination over a sorted id list: the next limit ids greater
+    than after_id.
+    """
+    start = bisect.bisect_right(ids, after_id)
+    return ids[start:start + limit]
+
+
+class RegistrationIndex:
+    """
+    Exact and substring search over approved_registrations.
+
+    :param fetch_after:  callable(after_id, limit) -> rows ordered by id with
+                         "id" plus the INDEXED_FIELDS columns.
+    :param batch_size:   Rows per incremental fetch.
+    :param refresh_ttl:  Seconds between incremental refreshes.
+    :param rebuild_ttl:  Seconds between full rebuilds (picks up edits/deletes).
+    """
+
+    def __init__(self, fetch_after, batch_size: int = 1000, refresh_ttl: float = 30.0,
+                 rebuild_ttl: float = 600.0):
+        self._fetch_after = fetch_after
+        self.batch_size = batch_size
+        self.refresh_ttl = refresh_ttl
+        self.rebuild_ttl = rebuild_ttl
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._values = {}  # field -> {id: normalized value}
+        self._exact = {}  # field -> {normalized value: set(ids)}
+        self._grams = {}  # field -> {trigram: set(ids)}
+        for field in INDEXED_FIELDS:
+            self._values[field] = {}
+            self._exact[field] = defaultdict(set)
+            self._grams[field] = defaultdict(set)
+        self.last_id = 0
+        self._refreshed_at = 0.0
+        self._built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._values["registration"])
+
+    # ---------- Maintenance ----------
+
+    def add(self, row: dict):
+        """Indexes (or re-indexes) a single row."""
+        row_id = row["id"]
+        with self._lock:
+            for field in INDEXED_FIELDS:
+                old = self._values[field].get(row_id)
+                if old is not None:
+                    self._exact[field][old].discard(row_id)
+                    for gram in ngrams(old):
+                        self._grams[field][gram].discard(row_id)
+                value = normalizer(field)(row.get(field))
+                self._values[field][row_id] = value
+                self._exact[field][value].add(row_id)
+                for gram in ngrams(value):
+                    self._grams[field][gram].add(row_id)
+            self.last_id = max(self.last_id, row_id)
+
+    def refresh(self, force: bool = False):
+        """
+        Pulls rows with id > last_id. Rebuilds from scratch every rebuild_ttl
+        seconds so edits and deletes are eventually reflected.
+        """
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_ttl:
+            return
+        if now - self._built_at >= self.rebuild_ttl:
+            # Build off to the side so searches keep working meanwhile
+            fresh = RegistrationIndex(self._fetch_after, self.batch_size)
+            fresh._load_new()
+            with self._lock:
+                self._values, self._exact, self._grams = fresh._values, fresh._exact, fresh._grams
+                self.last_id = fresh.last_id
+                self._built_at = now
+        else:
+            self._load_new()
+        self._refreshed_at = now
+
+    def _load_new(self):
+        while True:
+            rows = self._fetch_after(self.last_id, self.batch_size)
+            for row in rows:
+                self.add(row)
+            if len(rows) < self.batch_size:
+                break
+
+    # ---------- Queries ----------
+
+    def search(self, pattern: str, exact: bool = True, fields=("registration",)):
+        """
+        Returns the sorted ids whose field equals (exact) or contains pattern,
+        case-insensitively, across any of fields.
+        """
+        hits = set()
+        with self._lock:
+            for field in fields:
+                needle = normalizer(field)(pattern)
+                if not needle:
+                    continue
+                if exact:
+                    hits |= self._exact[field].get(needle, set())
+                    continue
+                values = self._values[field]
+                if len(needle) < N:
+                    candidates = values.keys()
+                else:
+                    postings = sorted((self._grams[field].get(g, set()) for g in ngrams(needle)), key=len)
+                    candidates = set.intersection(*postings) if postings else set()
+                hits.update(i for i in candidates if needle in values[i])
+        return sorted(hits)
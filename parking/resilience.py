@@ -0,0 +1,237 @@
+"""
+Deadlines, a circuit breaker and hedged reads around the storage backend.
+
+Every call runs on a small shared worker pool and the caller waits at most
+the operation's deadline, so a slow database never pins a Streamlit script
+thread for longer than that. Repeated failures open the breaker, and while
+it is open calls fail immediately with ServiceBusy instead of queueing
+behind a struggling backend. Idempotent reads are hedged: if the first
+attempt has not answered within ``hedge_after`` seconds a second one is
+started and whichever finishes first wins.
+
+Only service errors (see StorageBackend.is_service_error) count against the
+breaker, are hedged and become ServiceBusy. Anything else is a bug or bad
+input: it is re-raised unchanged so its traceback stays visible.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from parking import metrics
+from parking.storage import StorageBackend
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Safe to repeat, so eligible for hedging
+READ_OPERATIONS = frozenset({
+    "count_bookings", "count_bookings_bulk", "fetch_registration_keys", "find_registration_ids",
+    "fetch_registrations_by_ids", "fetch_blacklist_after", "find_suspensions", "poll_waitlist",
+    "fetch_daily_usage", "fetch_top_registrations", "fetch_export_page",
+})
+
+
+class ServiceBusy(Exception):
+    """Storage is failing, too slow, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    :param failure_threshold: Consecutive failures that open the breaker.
+    :param reset_timeout:     Seconds the breaker stays open before letting
+                              one trial call through (half-open).
+    :param clock:             Monotonic time source (injectable for tests).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.opened = 0  # times the breaker has opened
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may proceed now. In half-open, only one trial call at a time."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call that says nothing about the backend's health (e.g. it hit a bug)."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                    metrics.inc("circuit_breaker_opened_total")
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+
+class ResilientStore(StorageBackend):
+    """
+    Wraps a StorageBackend with per-operation deadlines, a circuit breaker
+    and hedged reads. Raises ServiceBusy instead of hanging or raising
+    driver-specific errors; other exceptions pass through unchanged.
+
+    :param backend:      The StorageBackend to protect.
+    :param breaker:      Shared CircuitBreaker (one per process).
+    :param read_timeout: Deadline in seconds for reads.
+    :param write_timeout: Deadline in seconds for writes. A write that misses
+                         its deadline may still complete in the background.
+    :param hedge_after:  Seconds before a read is sent a second time; None disables hedging.
+    :param max_workers:  Size of the worker pool that runs backend calls.
+    """
+
+    def __init__(self, backend: StorageBackend, breaker: CircuitBreaker = None,
+                 read_timeout: float = 3.0, write_timeout: float = 8.0,
+                 hedge_after: float = 0.5, max_workers: int = 16):
+        self.backend = backend
+        self.breaker = breaker or CircuitBreaker()
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.hedge_after = hedge_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    def _call(self, operation, *args, **kwargs):
+        if not self.breaker.allow():
+            metrics.inc("storage_rejected_total", operation=operation)
+            raise ServiceBusy("The booking service is busy. Please try again shortly.")
+
+        read = operation in READ_OPERATIONS
+        deadline = time.monotonic() + (self.read_timeout if read else self.write_timeout)
+        fn = getattr(self.backend, operation)
+        pending = {self._pool.submit(fn, *args, **kwargs)}
+        hedge_spent = not read or self.hedge_after is None
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = remaining if hedge_spent else min(remaining, self.hedge_after)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    self.breaker.record_success()
+                    return future.result()
+                if not self.backend.is_service_error(error):
+                    # Would fail the same way again: not retried, not counted
+                    self.breaker.release()
+                    raise error
+            if not hedge_spent and (pending or error is not None):
+                # First attempt is slow (or failed fast): send the read once more
+                hedge_spent = True
+                metrics.inc("storage_hedged_total", operation=operation)
+                pending.add(self._pool.submit(fn, *args, **kwargs))
+
+        self.breaker.record_failure()
+        if error is not None and not pending:
+            metrics.inc("storage_errors_total", operation=operation)
+            raise ServiceBusy(f"The booking service returned an error ({error}). "
+                              "Please try again shortly.") from error
+        metrics.inc("storage_timeouts_total", operation=operation)
+        raise ServiceBusy("The booking service is responding slowly. Please try again shortly.")
+
+    # ---------- StorageBackend ----------
+
+    def reserve_bay(self, *args, **kwargs):
+        return self._call("reserve_bay", *args, **kwargs)
+
+    def confirm_booking(self, *args, **kwargs):
+        return self._call("confirm_booking", *args, **kwargs)
+
+    def release_hold(self, *args, **kwargs):
+        return self._call("release_hold", *args, **kwargs)
+
+    def expire_holds(self, *args, **kwargs):
+        return self._call("expire_holds", *args, **kwargs)
+
+    def count_bookings(self, *args, **kwargs):
+        return self._call("count_bookings", *args, **kwargs)
+
+    def count_bookings_bulk(self, *args, **kwargs):
+        return self._call("count_bookings_bulk", *args, **kwargs)
+
+    def join_waitlist(self, *args, **kwargs):
+        return self._call("join_waitlist", *args, **kwargs)
+
+    def leave_waitlist(self, *args, **kwargs):
+        return self._call("leave_waitlist", *args, **kwargs)
+
+    def promote_waitlist(self, *args, **kwargs):
+        return self._call("promote_waitlist", *args, **kwargs)
+
+    def poll_waitlist(self, *args, **kwargs):
+        return self._call("poll_waitlist", *args, **kwargs)
+
+    def fetch_daily_usage(self, *args, **kwargs):
+        return self._call("fetch_daily_usage", *args, **kwargs)
+
+    def fetch_top_registrations(self, *args, **kwargs):
+        return self._call("fetch_top_registrations", *args, **kwargs)
+
+    def fetch_export_page(self, *args, **kwargs):
+        return self._call("fetch_export_page", *args, **kwargs)
+
+    def archive_rows(self, *args, **kwargs):
+        return self._call("archive_rows", *args, **kwargs)
+
+    def purge_rows(self, *args, **kwargs):
+        return self._call("purge_rows", *args, **kwargs)
+
+    def backfill_registration_keys(self, *args, **kwargs):
+        return self._call("backfill_registration_keys", *args, **kwargs)
+
+    def fetch_registration_keys(self, *args, **kwargs):
+        return self._call("fetch_registration_keys", *args, **kwargs)
+
+    def find_registration_ids(self, *args, **kwargs):
+        return self._call("find_registration_ids", *args, **kwargs)
+
+    def fetch_registrations_by_ids(self, *args, **kwargs):
+        return self._call("fetch_registrations_by_ids", *args, **kwargs)
+
+    def upsert_vehicles(self, *args, **kwargs):
+        return self._call("upsert_vehicles", *args, **kwargs)
+
+    def fetch_blacklist_after(self, *args, **kwargs):
+        return self._call("fetch_blacklist_after", *args, **kwargs)
+
+    def find_suspensions(self, *args, **kwargs):
+        return self._call("find_suspensions", *args, **kwargs)
+
+    def add_to_blacklist(self, *args, **kwargs):
+        return self._call("add_to_blacklist", *args, **kwargs)
@@ -0,0 +1,248 @@
+"""
+Storage backend interface.
+
+parking/db.py picks one implementation per process from the ``[storage]``
+secrets section and forwards every call to it:
+
+- ``supabase`` (default): PostgREST over HTTPS, parking/supabase_store.py
+- ``postgres``: direct connection pool with prepared statements, parking/pg_store.py
+- ``sqlite``:   local file or in-memory database, parking/local_store.py
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from parking.booking_window import DEFAULT_SITE
+
+BOOKINGS_TABLE = "maca_parking"
+APPROVED_TABLE = "approved_registrations"
+BLACKLIST_TABLE = "blacklist"
+WAITLIST_TABLE = "maca_waitlist"
+USAGE_TABLE = "maca_daily_usage"
+REGISTRATION_USAGE_TABLE = "maca_registration_usage"
+
+# Hot table -> table archive_rows moves its old rows into (sql/008_archive.sql)
+ARCHIVE_TABLES = {
+    BOOKINGS_TABLE: "maca_parking_archive",
+    BLACKLIST_TABLE: "blacklist_archive",
+}
+
+# Tables with a registration_key column (sql/004_registration_key.sql)
+REGISTRATION_KEY_TABLES = (BOOKINGS_TABLE, APPROVED_TABLE, BLACKLIST_TABLE)
+
+# Columns callers may request from approved_registrations
+APPROVED_COLUMNS = ("id", "registration", "registration_key", "first_name", "last_name",
+                    "email", "phone", "make", "model", "colour")
+
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """What fetch_export_page returns for one table."""
+    table: str
+    columns: tuple  # "id" first; every other column is exported as text
+    date_column: Optional[str] = None  # filtered by the export's date range
+    confirmed_only: bool = False  # skip in-flight holds
+
+
+EXPORTS = {
+    BOOKINGS_TABLE: ExportSpec(BOOKINGS_TABLE, ("id", "created_at", "site", "date", "first_name", "surname",
+                                                "email", "mobile", "registration", "registration_key"),
+                               date_column="date", confirmed_only=True),
+    APPROVED_TABLE: ExportSpec(APPROVED_TABLE, APPROVED_COLUMNS),
+    BLACKLIST_TABLE: ExportSpec(BLACKLIST_TABLE, ("id", "registration", "registration_key", "suspension_end"),
+                                date_column="suspension_end"),
+}
+
+
+def parse_columns(columns: str) -> Optional[List[str]]:
+    """
+    Splits a PostgREST-style column list ("id, registration") for the SQL
+    backends. Returns None for "*". Unknown columns raise ValueError.
+    """
+    if columns.strip() == "*":
+        return None
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in APPROVED_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown {APPROVED_TABLE} column(s): {', '.join(unknown)}")
+    return names
+
+
+class StorageBackend:
+    """
+    Operations the app and pages need from storage. Implementations must be
+    safe to share between threads (one instance serves every session).
+    """
+
+    def is_service_error(self, error: BaseException) -> bool:
+        """
+        True if error means storage is unreachable, overloaded or too slow
+        (a driver, connection or timeout error) rather than a bug or bad
+        input. Only service errors trip the circuit breaker.
+        """
+        return isinstance(error, OSError)  # includes ConnectionError and TimeoutError
+
+    # ---------- Bookings ----------
+
+    def reserve_bay(self, booking_date, total_bays: int, lock_seconds: int,
+                    site: str = DEFAULT_SITE.code) -> Optional[int]:
+        """
+        Sweeps expired holds, checks capacity and inserts a hold in one
+        transaction. Returns the hold id, or None if all bays are taken.
+        """
+        raise NotImplementedError
+
+    def confirm_booking(self, hold_id: int, details: dict) -> bool:
+        """
+        Turns an unexpired hold into a confirmed booking with the given details.
+        Returns False if the hold has lapsed or no longer exists.
+        """
+        raise NotImplementedError
+
+    def release_hold(self, hold_id: int):
+        """Deletes a hold before it expires, freeing the bay."""
+        raise NotImplementedError
+
+    def expire_holds(self) -> int:
+        """Deletes every lapsed hold. Returns the number removed."""
+        raise NotImplementedError
+
+    def count_bookings(self, booking_date, site: str = DEFAULT_SITE.code) -> int:
+        """Counts confirmed bookings plus unexpired holds at site for booking_date."""
+        raise NotImplementedError
+
+    def count_bookings_bulk(self, pairs) -> Dict[Tuple[str, str], int]:
+        """
+        Counts confirmed bookings plus unexpired holds for every (site, date)
+        pair in one query. Returns {(site, iso_date): booked}.
+        """
+        raise NotImplementedError
+
+    # ---------- Waitlist ----------
+
+    def join_waitlist(self, site: str, booking_date, token: str) -> None:
+        """Queues token for a bay at site on booking_date. Re-joining keeps the original place."""
+        raise NotImplementedError
+
+    def leave_waitlist(self, token: str) -> None:
+        """Gives up token's place in any waitlist."""
+        raise NotImplementedError
+
+    def promote_waitlist(self, booking_date, total_bays: int, lock_seconds: int,
+                         site: str = DEFAULT_SITE.code) -> List[dict]:
+        """
+        Sweeps expired holds and turns the head of the site/date waitlist into
+        holds until the site is full. Returns [{token, hold_id, hold_expires_at}]
+        for each promotion (hold_expires_at is a Unix timestamp).
+        """
+        raise NotImplementedError
+
+    def poll_waitlist(self, tokens) -> Dict[str, dict]:
+        """
+        Latest waitlist entry for each token, as {token: {status, site,
+        booking_date, position, hold_id, hold_expires_at}}, where position is
+        the number of sessions ahead. Marks waiting entries as seen.
+        """
+        raise NotImplementedError
+
+    # ---------- Usage summaries ----------
+
+    def fetch_daily_usage(self, start_date, end_date) -> List[dict]:
+        """
+        Per-(site, date) usage summaries for start_date..end_date inclusive,
+        ordered by date: {site, date, holds_created, holds_expired,
+        holds_released, bookings, first_hold_at, last_booking_at}. The two
+        timestamps are Unix timestamps, or None.
+        """
+        raise NotImplementedError
+
+    def fetch_top_registrations(self, limit: int) -> List[dict]:
+        """
+        The limit most-booked registrations, as {registration_key,
+        registration, bookings, last_date}, most bookings first.
+        """
+        raise NotImplementedError
+
+    # ---------- Export ----------
+
+    def fetch_export_page(self, table: str, after_id: int, limit: int,
+                          start_date=None, end_date=None) -> List[dict]:
+        """
+        Up to limit rows of an EXPORTS table with id > after_id, ordered by
+        id, projected to its columns. Non-id values are text (ISO dates and
+        timestamps). start_date/end_date bound the table's date column,
+        inclusive, when it has one.
+        """
+        raise NotImplementedError
+
+    # ---------- Archiving ----------
+
+    def archive_rows(self, table: str, before, limit: int) -> int:
+        """
+        Moves up to limit old rows of an ARCHIVE_TABLES table into its archive
+        table in one transaction: confirmed bookings dated before `before`,
+        or blacklist entries whose suspension ended before it. Returns the
+        number moved; 0 means nothing is left.
+        """
+        raise NotImplementedError
+
+    def purge_rows(self, table: str, ids) -> int:
+        """
+        Deletes the given rows of an ARCHIVE_TABLES table once they have been
+        archived elsewhere (only confirmed bookings are ever deleted).
+        Returns the number deleted.
+        """
+        raise NotImplementedError
+
+    def backfill_registration_keys(self, table: str, after_id: int, limit: int) -> Optional[int]:
+        """
+        Fills registration_key for the next limit rows of a
+        REGISTRATION_KEY_TABLES table with id > after_id, in one short
+        transaction. Returns the last id examined, or None when finished.
+        """
+        raise NotImplementedError
+
+    # ---------- Approved registrations ----------
+
+    def fetch_registration_keys(self, after_id: int, limit: int) -> List[dict]:
+        """
+        Returns up to limit approved rows with id > after_id, ordered by id,
+        projected to the columns the in-memory registration index needs.
+        """
+        raise NotImplementedError
+
+    def find_registration_ids(self, key: str) -> List[int]:
+        """Ids of approved rows whose registration_key equals key."""
+        raise NotImplementedError
+
+    def fetch_registrations_by_ids(self, ids, columns: str = "*") -> List[dict]:
+        """Fetches approved rows for the given ids, ordered by id, projected to columns."""
+        raise NotImplementedError
+
+    def upsert_vehicles(self, rows: List[dict]) -> List[dict]:
+        """
+        Inserts approved vehicles, skipping any (email, registration) pair
+        that is already approved. Returns only the newly inserted rows.
+        """
+        raise NotImplementedError
+
+    # ---------- Blacklist ----------
+
+    def fetch_blacklist_after(self, after_id: int, limit: int) -> List[dict]:
+        """
+        Returns up to limit blacklist rows with id > after_id, ordered by id.
+        Entries whose suspension has already ended are skipped.
+        """
+        raise NotImplementedError
+
+    def find_suspensions(self, key: str) -> List[str]:
+        """
+        suspension_end (ISO 'YYYY-MM-DD') of each blacklist row whose
+        registration_key equals key and whose suspension has not ended.
+        """
+        raise NotImplementedError
+
+    def add_to_blacklist(self, registration: str, suspension_end: str) -> None:
+        """Blacklists a registration until suspension_end (ISO 'YYYY-MM-DD')."""
+        raise NotImplementedError
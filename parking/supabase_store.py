@@ -0,0 +1,286 @@
+"""
+Supabase (PostgREST over HTTPS) storage backend.
+
+Wraps one long-lived supabase client, whose httpx client keeps TLS
+connections alive and pools them across all sessions and reruns.
+"""
+
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+from parking import metrics
+from parking.booking_window import DEFAULT_SITE
+from parking.registration import registration_key
+from parking.storage import (APPROVED_TABLE, ARCHIVE_TABLES, BLACKLIST_TABLE, BOOKINGS_TABLE, EXPORTS,
+                             REGISTRATION_USAGE_TABLE, USAGE_TABLE, WAITLIST_TABLE, StorageBackend)
+
+# SQLSTATE classes and PostgREST codes that mean the database is unreachable,
+# overloaded or too slow: connection exception, transaction rollback,
+# insufficient resources, operator intervention (incl. statement timeout),
+# system error; PGRST000-003 are PostgREST's own connection errors.
+SERVICE_ERROR_CODES = ("08", "40", "53", "57", "58", "PGRST00")
+
+
+def _utc_now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _epoch(timestamp) -> Optional[float]:
+    """PostgREST timestamptz (ISO 8601 text) as a Unix timestamp."""
+    return None if timestamp is None else datetime.datetime.fromisoformat(timestamp).timestamp()
+
+
+def _execute(request, table: str, operation: str):
+    """
+    Executes a built Supabase request, recording latency, rows returned and
+    errors per table/operation when metrics are enabled.
+    """
+    with metrics.timed("supabase_request_seconds", "supabase_errors_total",
+                       table=table, operation=operation):
+        response = request.execute()
+    if metrics.enabled():
+        rows = len(response.data) if isinstance(response.data, list) else int(response.data is not None)
+        metrics.observe("supabase_rows_returned", rows, buckets=metrics.ROW_BUCKETS,
+                        table=table, operation=operation)
+    return response
+
+
+class SupabaseStore(StorageBackend):
+    """
+    :param client:     A supabase Client (see db.get_client).
+    :param chunk_size: Ids sent per request by fetch_registrations_by_ids,
+                       to keep each request URL short.
+    """
+
+    def __init__(self, client, chunk_size: int = 200):
+        self.client = client
+        self.chunk_size = chunk_size
+
+    def is_service_error(self, error):
+        import httpx
+        from postgrest.exceptions import APIError
+
+        if isinstance(error, APIError):
+            if isinstance(error.code, int):
+                # Not JSON from PostgREST: a gateway error page, code is the HTTP status
+                return error.code >= 500 or error.code == 429
+            return str(error.code or "").startswith(SERVICE_ERROR_CODES)
+        return isinstance(error, (OSError, httpx.TransportError))
+
+    # ---------- Bookings ----------
+
+    def reserve_bay(self, booking_date, total_bays: int, lock_seconds: int,
+                    site: str = DEFAULT_SITE.code) -> Optional[int]:
+        """
+        Calls the reserve_bay database function (sql/006_waitlist.sql), which
+        sweeps expired holds, serves the waitlist, checks capacity and inserts
+        the hold in one transaction. Returns the hold id, or None if all bays
+        are taken or others are waiting.
+        """
+        response = _execute(self.client.rpc("reserve_bay", {
+            "p_date": str(booking_date),
+            "p_total_bays": total_bays,
+            "p_lock_seconds": lock_seconds,
+            "p_site": site
+        }), BOOKINGS_TABLE, "reserve")
+        return response.data
+
+    def confirm_booking(self, hold_id: int, details: dict) -> bool:
+        response = _execute(self.client.table(BOOKINGS_TABLE).update({
+            **details,
+            "registration_key": registration_key(details.get("registration")),
+            "status": "confirmed",
+            "expires_at": None
+        }).eq("id", hold_id).eq("status", "hold").gt("expires_at", _utc_now_iso()), BOOKINGS_TABLE, "confirm")
+        return bool(response.data)
+
+    def release_hold(self, hold_id: int) -> None:
+        _execute(self.client.table(BOOKINGS_TABLE).delete().eq("id", hold_id).eq("status", "hold"),
+                 BOOKINGS_TABLE, "release")
+
+    def expire_holds(self) -> int:
+        response = _execute(self.client.rpc("expire_holds", {}), BOOKINGS_TABLE, "expire")
+        return response.data or 0
+
+    def count_bookings(self, booking_date, site: str = DEFAULT_SITE.code) -> int:
+        """
+        Uses a server-side exact count with head=True, so no rows are sent back.
+        Lapsed holds are excluded by the filter rather than swept first.
+        """
+        request = self.client.table(BOOKINGS_TABLE).select("id", count="exact", head=True)\
+            .eq("site", site)\
+            .eq("date", str(booking_date))\
+            .or_(f"status.eq.confirmed,expires_at.gt.{_utc_now_iso()}")
+        response = _execute(request, BOOKINGS_TABLE, "count")
+        return response.count or 0
+
+    def count_bookings_bulk(self, pairs) -> Dict[Tuple[str, str], int]:
+        """One grouped query via booking_counts (sql/005_sites.sql)."""
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        response = _execute(self.client.rpc("booking_counts", {
+            "p_sites": [site for site, _ in pairs],
+            "p_dates": [str(booking_date) for _, booking_date in pairs]
+        }), BOOKINGS_TABLE, "count_bulk")
+        return {(row["site"], row["booking_date"]): row["booked"] for row in response.data or []}
+
+    # ---------- Waitlist ----------
+
+    def join_waitlist(self, site: str, booking_date, token: str) -> None:
+        _execute(self.client.rpc("join_waitlist", {
+            "p_site": site, "p_date": str(booking_date), "p_token": token
+        }), WAITLIST_TABLE, "join")
+
+    def leave_waitlist(self, token: str) -> None:
+        _execute(self.client.rpc("leave_waitlist", {"p_token": token}), WAITLIST_TABLE, "leave")
+
+    def promote_waitlist(self, booking_date, total_bays: int, lock_seconds: int,
+                         site: str = DEFAULT_SITE.code) -> List[dict]:
+        """Calls promote_waitlist (sql/006_waitlist.sql)."""
+        response = _execute(self.client.rpc("promote_waitlist", {
+            "p_site": site,
+            "p_date": str(booking_date),
+            "p_total_bays": total_bays,
+            "p_lock_seconds": lock_seconds
+        }), WAITLIST_TABLE, "promote")
+        return response.data or []
+
+    def poll_waitlist(self, tokens) -> Dict[str, dict]:
+        tokens = list(tokens)
+        if not tokens:
+            return {}
+        response = _execute(self.client.rpc("poll_waitlist", {"p_tokens": tokens}), WAITLIST_TABLE, "poll")
+        return {row["token"]: row for row in response.data or []}
+
+    # ---------- Usage summaries ----------
+
+    def fetch_daily_usage(self, start_date, end_date) -> List[dict]:
+        request = self.client.table(USAGE_TABLE)\
+            .select("site, date, holds_created, holds_expired, holds_released, bookings, "
+                    "first_hold_at, last_booking_at")\
+            .gte("date", str(start_date))\
+            .lte("date", str(end_date))\
+            .order("date")\
+            .order("site")
+        response = _execute(request, USAGE_TABLE, "scan")
+        return [dict(row, first_hold_at=_epoch(row["first_hold_at"]),
+                     last_booking_at=_epoch(row["last_booking_at"]))
+                for row in response.data or []]
+
+    def fetch_top_registrations(self, limit: int) -> List[dict]:
+        request = self.client.table(REGISTRATION_USAGE_TABLE)\
+            .select("registration_key, registration, bookings, last_date")\
+            .order("bookings", desc=True)\
+            .order("registration_key")\
+            .limit(limit)
+        response = _execute(request, REGISTRATION_USAGE_TABLE, "top")
+        return response.data or []
+
+    # ---------- Export ----------
+
+    def fetch_export_page(self, table: str, after_id: int, limit: int,
+                          start_date=None, end_date=None) -> List[dict]:
+        spec = EXPORTS[table]
+        request = self.client.table(spec.table).select(", ".join(spec.columns)).gt("id", after_id)
+        if spec.confirmed_only:
+            request = request.eq("status", "confirmed")
+        if spec.date_column and start_date is not None:
+            request = request.gte(spec.date_column, str(start_date))
+        if spec.date_column and end_date is not None:
+            request = request.lte(spec.date_column, str(end_date))
+        response = _execute(request.order("id").limit(limit), spec.table, "export")
+        return response.data or []
+
+    # ---------- Archiving ----------
+
+    def archive_rows(self, table: str, before, limit: int) -> int:
+        """Calls archive_rows (sql/008_archive.sql)."""
+        response = _execute(self.client.rpc("archive_rows", {
+            "p_table": table, "p_before": str(before), "p_batch": limit
+        }), table, "archive")
+        return response.data or 0
+
+    def purge_rows(self, table: str, ids) -> int:
+        if table not in ARCHIVE_TABLES:
+            raise ValueError(f"{table} is not archived")
+        ids = list(ids)
+        deleted = 0
+        for start in range(0, len(ids), self.chunk_size):
+            request = self.client.table(table).delete().in_("id", ids[start:start + self.chunk_size])
+            if table == BOOKINGS_TABLE:
+                request = request.eq("status", "confirmed")
+            deleted += len(_execute(request, table, "purge").data or [])
+        return deleted
+
+    def backfill_registration_keys(self, table: str, after_id: int, limit: int) -> Optional[int]:
+        """Calls backfill_registration_keys (sql/004_registration_key.sql)."""
+        response = _execute(self.client.rpc("backfill_registration_keys", {
+            "p_table": table, "p_after_id": after_id, "p_batch": limit
+        }), table, "backfill")
+        return response.data
+
+    # ---------- Approved registrations ----------
+
+    def fetch_registration_keys(self, after_id: int, limit: int) -> List[dict]:
+        request = self.client.table(APPROVED_TABLE)\
+            .select("id, registration, registration_key, first_name, last_name, email")\
+            .gt("id", after_id)\
+            .order("id")\
+            .limit(limit)
+        response = _execute(request, APPROVED_TABLE, "scan")
+        return response.data or []
+
+    def find_registration_ids(self, key: str) -> List[int]:
+        """An indexed equality match; see sql/004_registration_key.sql."""
+        request = self.client.table(APPROVED_TABLE).select("id").eq("registration_key", key).order("id")
+        response = _execute(request, APPROVED_TABLE, "lookup")
+        return [row["id"] for row in response.data or []]
+
+    def fetch_registrations_by_ids(self, ids, columns: str = "*") -> List[dict]:
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), self.chunk_size):
+            request = self.client.table(APPROVED_TABLE).select(columns)\
+                .in_("id", ids[start:start + self.chunk_size])\
+                .order("id")
+            response = _execute(request, APPROVED_TABLE, "fetch")
+            rows.extend(response.data or [])
+        return rows
+
+    def upsert_vehicles(self, rows: List[dict]) -> List[dict]:
+        """One request; duplicates are skipped by sql/003_approved_unique.sql."""
+        if not rows:
+            return []
+        request = self.client.table(APPROVED_TABLE)\
+            .upsert(rows, on_conflict="email,registration", ignore_duplicates=True)
+        response = _execute(request, APPROVED_TABLE, "upsert")
+        return response.data or []
+
+    # ---------- Blacklist ----------
+
+    def fetch_blacklist_after(self, after_id: int, limit: int) -> List[dict]:
+        request = self.client.table(BLACKLIST_TABLE)\
+            .select("id, registration, registration_key, suspension_end")\
+            .gt("id", after_id)\
+            .gte("suspension_end", datetime.date.today().isoformat())\
+            .order("id")\
+            .limit(limit)
+        response = _execute(request, BLACKLIST_TABLE, "scan")
+        return response.data or []
+
+    def find_suspensions(self, key: str) -> List[str]:
+        """An indexed equality match; see sql/004_registration_key.sql."""
+        request = self.client.table(BLACKLIST_TABLE)\
+            .select("suspension_end")\
+            .eq("registration_key", key)\
+            .gte("suspension_end", datetime.date.today().isoformat())
+        response = _execute(request, BLACKLIST_TABLE, "lookup")
+        return [row["suspension_end"] for row in response.data or []]
+
+    def add_to_blacklist(self, registration: str, suspension_end: str) -> None:
+        _execute(self.client.table(BLACKLIST_TABLE).insert({
+            "registration": registration,
+            "registration_key": registration_key(registration),
+            "suspension_end": suspension_end,
+        }), BLACKLIST_TABLE, "insert")
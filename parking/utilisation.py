@@ -0,0 +1,86 @@
+"""
+Utilisation reporting over the daily usage summaries.
+
+Works on the compact per-(site, date) rows from db.fetch_daily_usage (one
+row per car park per day, maintained by sql/007_daily_usage.sql), never on
+individual bookings. Every statistic is a whole-column pandas/NumPy
+operation over those rows.
+"""
+
+from parking.booking_window import SITES, TIMEZONE
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def usage_frame(rows, sites=SITES):
+    """
+    DataFrame of daily usage rows with derived columns:
+
+    - capacity:        the site's total bays
+    - full:            every bay was booked
+    - opens_at:        when the date first became bookable (local time)
+    - minutes_to_full: opens_at to the booking that filled the last bay
+                       (NaN unless full)
+    - expiry_rate:     share of holds that lapsed unconfirmed
+    """
+    import numpy as np
+    import pandas as pd
+
+    columns = ["site", "date", "holds_created", "holds_expired", "holds_released", "bookings",
+               "first_hold_at", "last_booking_at"]
+    df = pd.DataFrame(list(rows), columns=columns)
+    df["date"] = pd.to_datetime(df["date"])
+    for column in ("first_hold_at", "last_booking_at"):
+        df[column] = pd.to_datetime(df[column].astype("float64"), unit="s", utc=True).dt.tz_convert(TIMEZONE)
+
+    by_code = {site.code: site for site in sites}
+    df["capacity"] = df["site"].map({code: site.total_bays for code, site in by_code.items()})
+    days_ahead = df["site"].map({code: site.days_ahead for code, site in by_code.items()})
+    start_hour = df["site"].map({code: site.start_hour for code, site in by_code.items()})
+    df["opens_at"] = (df["date"] - pd.to_timedelta(days_ahead, unit="D")
+                      + pd.to_timedelta(start_hour, unit="h")).dt.tz_localize(TIMEZONE)
+
+    df["full"] = df["bookings"] >= df["capacity"]
+    minutes = (df["last_booking_at"] - df["opens_at"]).dt.total_seconds() / 60
+    df["minutes_to_full"] = minutes.where(df["full"]).clip(lower=0)
+    df["expiry_rate"] = np.divide(df["holds_expired"], df["holds_created"],
+                                  out=np.zeros(len(df)), where=df["holds_created"].to_numpy() > 0)
+    return df
+
+
+def headline(df) -> dict:
+    """Totals across the frame: days, full days, median time to full, hold expiry rate."""
+    created = int(df["holds_created"].sum())
+    return {
+        "days": len(df),
+        "full_days": int(df["full"].sum()),
+        "full_share": float(df["full"].mean()) if len(df) else 0.0,
+        "bookings": int(df["bookings"].sum()),
+        "median_minutes_to_full": float(df["minutes_to_full"].median()) if df["full"].any() else None,
+        "expiry_rate": int(df["holds_expired"].sum()) / created if created else 0.0,
+    }
+
+
+def bookings_by_date(df):
+    """Bookings per date, one column per site (for a bar chart)."""
+    return df.pivot_table(index="date", columns="site", values="bookings", aggfunc="sum", fill_value=0)
+
+
+def minutes_to_full_by_date(df):
+    """Minutes from opening to full per date and site; dates that never filled are NaN."""
+    return df.pivot_table(index="date", columns="site", values="minutes_to_full", aggfunc="first")
+
+
+def weekday_profile(df):
+    """Average bookings, share of days full and hold expiry rate by weekday of the booking date."""
+    import pandas as pd
+
+    grouped = df.assign(weekday=df["date"].dt.weekday).groupby("weekday")
+    profile = pd.DataFrame({
+        "average bookings": grouped["bookings"].mean(),
+        "share full": grouped["full"].mean(),
+        "hold expiry rate": grouped["holds_expired"].sum()
+                            / grouped["holds_created"].sum().where(lambda created: created > 0),
+    })
+    profile.index = [WEEKDAYS[day] for day in profile.index]
+    return profile
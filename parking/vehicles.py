@@ -0,0 +1,92 @@
+"""
+Validation and normalisation rules for approved_registrations rows.
+
+Shared by the single-vehicle form and the bulk import on the Vehicle
+management page, so both apply exactly the same rules.
+"""
+
+import re
+
+from parking.registration import KEY_STRIP_PATTERN, registration_key
+
+# Column -> label shown in error messages (all required)
+FIELDS = {
+    "first_name": "First name",
+    "last_name": "Last name",
+    "email": "Email",
+    "phone": "Phone",
+    "registration": "Vehicle registration",
+    "make": "Vehicle make",
+    "model": "Vehicle model",
+    "colour": "Vehicle colour",
+}
+TITLE_CASE_FIELDS = ("first_name", "last_name", "make", "model", "colour")
+
+# Simple email + phone sanity checks (not strict)
+EMAIL_RE = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+PHONE_RE = r"^[0-9+\-\s()]{6,}$"
+
+
+def validate_vehicle(values: dict):
+    """
+    Validates and normalises one vehicle.
+    Returns (clean, errs) where errs is a list of "• ..." messages.
+    """
+    errs = []
+    for field, label in FIELDS.items():
+        val = values.get(field)
+        if not val or not str(val).strip():
+            errs.append(f"• {label} is required")
+
+    email = values.get("email") or ""
+    phone = values.get("phone") or ""
+    if email and not re.match(EMAIL_RE, email):
+        errs.append("• Please enter a valid email")
+    if phone and not re.match(PHONE_RE, phone):
+        errs.append("• Please enter a valid phone number")
+
+    clean = {field: (values.get(field) or "").strip() for field in FIELDS}
+    for field in TITLE_CASE_FIELDS:
+        clean[field] = clean[field].title()
+    clean["registration"] = re.sub(r"\s+", "", values.get("registration") or "").upper()
+    clean["registration_key"] = registration_key(clean["registration"])
+    return clean, errs
+
+
+def validate_frame(df):
+    """
+    Vectorised validate_vehicle over a DataFrame of uploaded rows.
+
+    Returns (clean, errors): clean holds the normalised valid rows; errors has
+    one row per rejected input row with its 1-based row number and messages.
+    Rows repeating an earlier (email, registration_key) pair are rejected too.
+    """
+    import pandas as pd
+
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(" ", "_"))
+    raw = pd.DataFrame({field: df[field] if field in df else "" for field in FIELDS}, index=df.index)
+    raw = raw.fillna("").astype(str)
+
+    messages = pd.Series([[] for _ in range(len(raw))], index=raw.index, dtype=object)
+
+    def flag(mask, text):
+        for i in mask[mask].index:
+            messages[i].append(text)
+
+    for field, label in FIELDS.items():
+        flag(raw[field].str.strip() == "", f"• {label} is required")
+    flag((raw["email"] != "") & ~raw["email"].str.match(EMAIL_RE), "• Please enter a valid email")
+    flag((raw["phone"] != "") & ~raw["phone"].str.match(PHONE_RE), "• Please enter a valid phone number")
+
+    clean = raw.apply(lambda col: col.str.strip())
+    for field in TITLE_CASE_FIELDS:
+        clean[field] = clean[field].str.title()
+    clean["registration"] = raw["registration"].str.replace(r"\s+", "", regex=True).str.upper()
+    clean["registration_key"] = clean["registration"].str.replace(KEY_STRIP_PATTERN, "", regex=True)
+
+    flag(clean.duplicated(subset=["email", "registration_key"]) & (messages.str.len() == 0),
+         "• Duplicate of an earlier row in this file")
+
+    bad = messages.str.len() > 0
+    errors = pd.DataFrame({"row": raw.index[bad] + 1, "errors": messages[bad].str.join(" ")})
+    return clean[~bad], errors
@@ -0,0 +1,169 @@
+"""
+Process-wide waitlist watcher: promotes waiters when bays free up and
+tells this process's waiting sessions what happened.
+
+The queue itself lives in storage (sql/006_waitlist.sql). This process
+learns about freed bays from its own events: a hold it placed is released,
+or reaches its expiry time unconfirmed. Each event is one promote_waitlist
+call for that site and date. A slow sweep covers bays freed by other
+processes. Every waiting session in the process is served by one batched
+poll_waitlist call per interval rather than each session polling.
+
+Polling marks an entry as seen, so the watcher only polls for sessions
+that are still asking: each session's status fragment calls heartbeat(),
+and a token with no heartbeat for stale_after seconds is dropped. Its entry
+then goes stale in storage and loses its place like any other waiter that
+stopped polling.
+"""
+
+import heapq
+import threading
+import time
+
+
+class WaitlistWatcher:
+    """
+    :param poll:           callable(tokens) -> {token: entry}; see db.poll_waitlist.
+    :param promote:        callable(site_code, booking_date) -> [{token, hold_id,
+                           hold_expires_at}]; see db.promote_waitlist.
+    :param poll_interval:  Seconds between status refreshes for watched sessions.
+    :param sweep_interval: Seconds between promotions for every watched
+                           (site, date), to pick up bays freed elsewhere.
+    :param stale_after:    Seconds without a heartbeat before a token is no
+                           longer polled.
+    """
+
+    def __init__(self, poll, promote, poll_interval: float = 2.0, sweep_interval: float = 15.0,
+                 stale_after: float = 10.0):
+        self._poll = poll
+        self._promote = promote
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.stale_after = stale_after
+        self._cond = threading.Condition()
+        self._watched = {}  # token -> (site_code, booking_date)
+        self._heartbeats = {}  # token -> time of the session's last heartbeat
+        self._status = {}  # token -> latest entry from poll
+        self._due = []  # heap of (at, hold_id, site_code, booking_date)
+        self._holds = {}  # hold_id -> at; holds whose lapse would free a bay
+        self._freed = set()  # (site_code, booking_date) to promote now
+        self._thread = None
+        self._stopping = threading.Event()
+
+    # ---------- Sessions ----------
+
+    def watch(self, token, site_code, booking_date):
+        """Starts reporting token's waitlist entry via status()."""
+        with self._cond:
+            self._watched[token] = (site_code, booking_date)
+            self._heartbeats[token] = time.time()
+            self._status.pop(token, None)
+            self._cond.notify()
+
+    def heartbeat(self, token):
+        """The session behind token is still waiting; keep polling for it."""
+        with self._cond:
+            if token in self._watched:
+                self._heartbeats[token] = time.time()
+
+    def unwatch(self, token):
+        with self._cond:
+            self._watched.pop(token, None)
+            self._heartbeats.pop(token, None)
+            self._status.pop(token, None)
+
+    def status(self, token):
+        """Latest known entry for token, or None before the first poll."""
+        with self._cond:
+            return self._status.get(token)
+
+    # ---------- Events ----------
+
+    def hold_placed(self, hold_id, site_code, booking_date, expires_at):
+        """A hold was created; if it lapses unconfirmed its bay is freed at expires_at."""
+        with self._cond:
+            self._holds[hold_id] = expires_at
+            heapq.heappush(self._due, (expires_at, hold_id, site_code, booking_date))
+            self._cond.notify()
+
+    def hold_settled(self, hold_id):
+        """The hold was confirmed or released, so its expiry no longer frees a bay."""
+        with self._cond:
+            self._holds.pop(hold_id, None)
+
+    def bay_freed(self, site_code, booking_date):
+        """A bay was freed now (e.g. a hold was released)."""
+        with self._cond:
+            self._freed.add((site_code, booking_date))
+            self._cond.notify()
+
+    # ---------- Worker ----------
+
+    def _drop_stale(self, now):
+        # Caller holds self._cond. Forgets sessions that stopped sending heartbeats.
+        for token in [t for t, seen in self._heartbeats.items() if now - seen > self.stale_after]:
+            del self._watched[token], self._heartbeats[token]
+            self._status.pop(token, None)
+
+    def _collect(self, now):
+        # Caller holds self._cond. Returns the (site, date) pairs to promote now.
+        pairs, self._freed = self._freed, set()
+        while self._due and self._due[0][0] <= now:
+            at, hold_id, site_code, booking_date = heapq.heappop(self._due)
+            if self._holds.get(hold_id) == at:
+                del self._holds[hold_id]
+                pairs.add((site_code, booking_date))
+        return pairs
+
+    def run_once(self, now=None, sweep=False):
+        """Promotes for due events (every watched pair too, if sweep), then polls live sessions."""
+        now = time.time() if now is None else now
+        with self._cond:
+            self._drop_stale(now)
+            pairs = self._collect(now)
+            if sweep:
+                pairs.update(self._watched.values())
+            tokens = list(self._watched)
+        for site_code, booking_date in pairs:
+            # A promoted waiter who never confirms frees the bay again at expiry
+            for promotion in self._promote(site_code, booking_date) or []:
+                self.hold_placed(promotion["hold_id"], site_code, booking_date,
+                                 promotion["hold_expires_at"])
+        if tokens:
+            statuses = self._poll(tokens)
+            with self._cond:
+                for token in tokens:
+                    if token in self._watched and token in statuses:
+                        self._status[token] = statuses[token]
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while not self._stopping.is_set():
+            with self._cond:
+                wait = self.poll_interval if self._watched else self.sweep_interval
+                if self._due:
+                    wait = min(wait, max(0.0, self._due[0][0] - time.time()))
+                if not self._freed:
+                    self._cond.wait(wait)
+            sweep = time.monotonic() >= next_sweep
+            if sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+            try:
+                self.run_once(sweep=sweep)
+            except Exception as e:
+                print(f"Error updating waitlist: {e}")
+                self._stopping.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="waitlist-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
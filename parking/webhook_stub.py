@@ -0,0 +1,68 @@
+"""
+Local HTTP stand-in for the Teams Incoming Webhook.
+
+Records every JSON payload it receives and can be told to respond slowly or
+fail, so the outbox and the benchmarks can run with no network access.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WebhookStub:
+    """
+    Threaded HTTP server on 127.0.0.1 that accepts webhook POSTs.
+
+    :param delay:     Seconds to wait before answering each request.
+    :param fail_next: Number of upcoming requests to answer with HTTP 500.
+    """
+
+    def __init__(self, delay: float = 0.0, fail_next: int = 0):
+        self.delay = delay
+        self.fail_next = fail_next
+        self.payloads = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                with stub._lock:
+                    failing = stub.fail_next > 0
+                    if failing:
+                        stub.fail_next -= 1
+                    else:
+                        stub.payloads.append(json.loads(body or b"{}"))
+                self.send_response(500 if failing else 200)
+                self.end_headers()
+                self.wfile.write(b"1")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/webhook"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="webhook-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
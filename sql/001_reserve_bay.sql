@@ -0,0 +1,45 @@
+-- --------------------------------------------------
+-- reserve_bay: atomic capacity check + hold creation
+-- --------------------------------------------------
+-- Called from app.py via supabase.rpc("reserve_bay", {...}).
+-- Sweeps expired TEMP holds, counts the bookings for the date and inserts a
+-- new TEMP hold in a single transaction. Concurrent callers for the same date
+-- are serialised with a transaction-scoped advisory lock, so the table can
+-- never be over-allocated, even transiently.
+--
+-- Returns the id of the new hold, or NULL when the date is already full.
+
+create or replace function public.reserve_bay(
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer
+)
+returns bigint
+language plpgsql
+as $$
+declare
+    v_count integer;
+    v_id bigint;
+begin
+    -- One lock per booking date; released automatically at commit/rollback.
+    perform pg_advisory_xact_lock(hashtext('maca_parking'), p_date - date '2000-01-01');
+
+    delete from public.maca_parking
+     where first_name = 'TEMP'
+       and created_at <= now() - make_interval(secs => p_lock_seconds);
+
+    select count(*) into v_count
+      from public.maca_parking
+     where "date" = p_date;
+
+    if v_count >= p_total_bays then
+        return null;
+    end if;
+
+    insert into public.maca_parking ("date", first_name, surname, email, mobile, registration)
+    values (p_date, 'TEMP', 'TEMP', 'TEMP', 'TEMP', 'TEMP')
+    returning id into v_id;
+
+    return v_id;
+end;
+$$;
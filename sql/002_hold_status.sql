@@ -0,0 +1,88 @@
+-- --------------------------------------------------
+-- Explicit hold status + expiry for maca_parking
+-- --------------------------------------------------
+-- Replaces the 'TEMP' sentinel (written into five columns) with a status
+-- column and an explicit expires_at timestamp. Expiry becomes a single
+-- index-driven bulk delete that never pulls rows back to the client.
+
+alter table public.maca_parking
+    add column if not exists status text not null default 'confirmed'
+        check (status in ('hold', 'confirmed')),
+    add column if not exists expires_at timestamptz;
+
+-- Holds no longer carry personal details until they are confirmed.
+alter table public.maca_parking
+    alter column first_name drop not null,
+    alter column surname drop not null,
+    alter column email drop not null,
+    alter column mobile drop not null,
+    alter column registration drop not null;
+
+-- Migrate any in-flight TEMP rows.
+update public.maca_parking
+   set status = 'hold',
+       expires_at = created_at + interval '60 seconds',
+       first_name = null, surname = null, email = null, mobile = null, registration = null
+ where first_name = 'TEMP';
+
+create index if not exists maca_parking_hold_expiry_idx
+    on public.maca_parking (expires_at)
+ where status = 'hold';
+
+create index if not exists maca_parking_date_idx
+    on public.maca_parking ("date");
+
+
+-- expire_holds: bulk delete of every lapsed hold. Returns the number removed.
+create or replace function public.expire_holds()
+returns integer
+language sql
+as $$
+    with gone as (
+        delete from public.maca_parking
+         where status = 'hold'
+           and expires_at <= now()
+        returning 1
+    )
+    select count(*)::integer from gone;
+$$;
+
+
+-- reserve_bay: as in 001, but creates a 'hold' row with an explicit expiry.
+create or replace function public.reserve_bay(
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer
+)
+returns bigint
+language plpgsql
+as $$
+declare
+    v_count integer;
+    v_id bigint;
+begin
+    perform pg_advisory_xact_lock(hashtext('maca_parking'), p_date - date '2000-01-01');
+
+    delete from public.maca_parking
+     where status = 'hold'
+       and expires_at <= now();
+
+    select count(*) into v_count
+      from public.maca_parking
+     where "date" = p_date;
+
+    if v_count >= p_total_bays then
+        return null;
+    end if;
+
+    insert into public.maca_parking ("date", status, expires_at)
+    values (p_date, 'hold', now() + make_interval(secs => p_lock_seconds))
+    returning id into v_id;
+
+    return v_id;
+end;
+$$;
+
+
+-- Optional background sweeper (requires the pg_cron extension):
+-- select cron.schedule('expire-maca-holds', '* * * * *', 'select public.expire_holds()');
@@ -0,0 +1,16 @@
+-- --------------------------------------------------
+-- One approved_registrations row per (email, registration)
+-- --------------------------------------------------
+-- Lets Vehicle management add vehicles with a single upsert
+-- (on_conflict = email,registration, ignore duplicates) instead of a racy
+-- select-then-insert, and lets bulk imports be re-run safely.
+
+-- Remove existing duplicates, keeping the oldest row.
+delete from public.approved_registrations a
+ using public.approved_registrations b
+ where a.email = b.email
+   and a.registration = b.registration
+   and a.id > b.id;
+
+alter table public.approved_registrations
+    add constraint approved_registrations_email_registration_key unique (email, registration);
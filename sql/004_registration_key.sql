@@ -0,0 +1,100 @@
+-- --------------------------------------------------
+-- Canonical registration_key on all three tables
+-- --------------------------------------------------
+-- registration_key is the registration upper-cased with everything but
+-- letters and digits removed (parking/registration.py does the same in
+-- Python). Exact lookups become indexed equality matches instead of ILIKE.
+--
+-- The column is added nullable and filled by a trigger for new rows, so the
+-- ALTER is instant. Existing rows are filled in small batches by
+-- tools/backfill_registration_keys.py via backfill_registration_keys().
+
+create or replace function public.registration_key(p_registration text)
+returns text
+language sql
+immutable
+as $$
+    select upper(regexp_replace(coalesce(p_registration, ''), '[^0-9A-Za-z]+', '', 'g'));
+$$;
+
+alter table public.maca_parking add column if not exists registration_key text;
+alter table public.approved_registrations add column if not exists registration_key text;
+alter table public.blacklist add column if not exists registration_key text;
+
+-- Build without blocking writers. CONCURRENTLY cannot run inside a
+-- transaction block, so run these three on their own if your SQL runner
+-- wraps scripts in one.
+create index concurrently if not exists maca_parking_registration_key_idx
+    on public.maca_parking (registration_key);
+create index concurrently if not exists approved_registrations_registration_key_idx
+    on public.approved_registrations (registration_key);
+create index concurrently if not exists blacklist_registration_key_idx
+    on public.blacklist (registration_key);
+
+
+create or replace function public.set_registration_key()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.registration_key := public.registration_key(new.registration);
+    return new;
+end;
+$$;
+
+drop trigger if exists maca_parking_registration_key on public.maca_parking;
+create trigger maca_parking_registration_key
+    before insert or update of registration on public.maca_parking
+    for each row execute function public.set_registration_key();
+
+drop trigger if exists approved_registrations_registration_key on public.approved_registrations;
+create trigger approved_registrations_registration_key
+    before insert or update of registration on public.approved_registrations
+    for each row execute function public.set_registration_key();
+
+drop trigger if exists blacklist_registration_key on public.blacklist;
+create trigger blacklist_registration_key
+    before insert or update of registration on public.blacklist
+    for each row execute function public.set_registration_key();
+
+
+-- backfill_registration_keys: fills registration_key for the next p_batch rows
+-- with id > p_after_id. Each call is its own short transaction touching at
+-- most p_batch rows. Returns the last id examined, or NULL when finished.
+create or replace function public.backfill_registration_keys(
+    p_table text,
+    p_after_id bigint,
+    p_batch integer
+)
+returns bigint
+language plpgsql
+as $$
+declare
+    v_last bigint;
+begin
+    if p_table not in ('maca_parking', 'approved_registrations', 'blacklist') then
+        raise exception 'unsupported table %', p_table;
+    end if;
+
+    execute format($q$
+        with batch as (
+            select id from public.%I
+             where id > $1
+             order by id
+             limit $2
+        ), updated as (
+            update public.%I t
+               set registration_key = public.registration_key(t.registration)
+              from batch
+             where t.id = batch.id
+               and t.registration_key is distinct from public.registration_key(t.registration)
+            returning t.id
+        )
+        select max(id) from batch
+    $q$, p_table, p_table)
+    into v_last
+    using p_after_id, p_batch;
+
+    return v_last;
+end;
+$$;
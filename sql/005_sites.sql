@@ -0,0 +1,74 @@
+-- --------------------------------------------------
+-- Multiple car parks (sites) and batched availability
+-- --------------------------------------------------
+-- Site codes, capacities and booking windows are configured in
+-- parking/booking_window.py (SITES). Existing rows belong to the original
+-- car park, 'colin_st'.
+
+alter table public.maca_parking
+    add column if not exists site text not null default 'colin_st';
+
+create index if not exists maca_parking_site_date_idx
+    on public.maca_parking (site, "date");
+
+
+-- booking_counts: confirmed bookings plus unexpired holds for each
+-- (p_sites[i], p_dates[i]) pair, in one grouped query. Pairs with no
+-- bookings are returned with booked = 0.
+create or replace function public.booking_counts(
+    p_sites text[],
+    p_dates date[]
+)
+returns table (site text, booking_date date, booked integer)
+language sql
+stable
+as $$
+    select q.site, q.booking_date, count(m.id)::integer
+      from unnest(p_sites, p_dates) as q(site, booking_date)
+      left join public.maca_parking m
+        on m.site = q.site
+       and m."date" = q.booking_date
+       and (m.status = 'confirmed' or m.expires_at > now())
+     group by q.site, q.booking_date;
+$$;
+
+
+-- reserve_bay: as in 002, per site. Holds on different sites (or dates)
+-- take different advisory locks and never wait on each other.
+drop function if exists public.reserve_bay(date, integer, integer);
+
+create or replace function public.reserve_bay(
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer,
+    p_site text default 'colin_st'
+)
+returns bigint
+language plpgsql
+as $$
+declare
+    v_count integer;
+    v_id bigint;
+begin
+    perform pg_advisory_xact_lock(hashtext('maca_parking:' || p_site), p_date - date '2000-01-01');
+
+    delete from public.maca_parking
+     where status = 'hold'
+       and expires_at <= now();
+
+    select count(*) into v_count
+      from public.maca_parking
+     where site = p_site
+       and "date" = p_date;
+
+    if v_count >= p_total_bays then
+        return null;
+    end if;
+
+    insert into public.maca_parking (site, "date", status, expires_at)
+    values (p_site, p_date, 'hold', now() + make_interval(secs => p_lock_seconds))
+    returning id into v_id;
+
+    return v_id;
+end;
+$$;
@@ -0,0 +1,213 @@
+-- --------------------------------------------------
+-- Per-(site, date) waitlist with automatic promotion
+-- --------------------------------------------------
+-- Sessions that find no free bay join the waitlist once. Whenever a bay is
+-- freed (a hold released or lapsed), promote_waitlist hands it straight to
+-- the head of the queue as a new hold, so waiting users never have to poll
+-- "Check Available Bays". reserve_bay promotes first and refuses newcomers
+-- while anyone is still waiting, so the queue cannot be jumped.
+
+create table if not exists public.maca_waitlist (
+    id bigserial primary key,
+    created_at timestamptz not null default now(),
+    site text not null,
+    "date" date not null,
+    token text not null,
+    status text not null default 'waiting'
+        check (status in ('waiting', 'promoted', 'left')),
+    last_seen timestamptz not null default now(),
+    hold_id bigint,
+    hold_expires_at timestamptz
+);
+
+create unique index if not exists maca_waitlist_waiting_token_idx
+    on public.maca_waitlist (site, "date", token)
+ where status = 'waiting';
+
+create index if not exists maca_waitlist_queue_idx
+    on public.maca_waitlist (site, "date", id)
+ where status = 'waiting';
+
+create index if not exists maca_waitlist_token_idx
+    on public.maca_waitlist (token);
+
+
+-- join_waitlist: idempotent; re-joining keeps the original place.
+create or replace function public.join_waitlist(p_site text, p_date date, p_token text)
+returns void
+language sql
+as $$
+    insert into public.maca_waitlist (site, "date", token)
+    values (p_site, p_date, p_token)
+    on conflict (site, "date", token) where status = 'waiting'
+    do update set last_seen = now();
+$$;
+
+
+create or replace function public.leave_waitlist(p_token text)
+returns void
+language sql
+as $$
+    update public.maca_waitlist
+       set status = 'left'
+     where token = p_token
+       and status = 'waiting';
+$$;
+
+
+-- _promote_waitlist: caller holds the (site, date) advisory lock and has
+-- swept expired holds. Drops waiters that stopped polling, then turns the
+-- head of the queue into holds until the site is full.
+create or replace function public._promote_waitlist(
+    p_site text,
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer,
+    p_stale_seconds integer
+)
+returns table (token text, hold_id bigint, hold_expires_at float8)
+language plpgsql
+as $$
+declare
+    v_free integer;
+    v_entry record;
+    v_hold bigint;
+    v_expires timestamptz;
+begin
+    update public.maca_waitlist w
+       set status = 'left'
+     where w.site = p_site
+       and w."date" = p_date
+       and w.status = 'waiting'
+       and w.last_seen < now() - make_interval(secs => p_stale_seconds);
+
+    select p_total_bays - count(*) into v_free
+      from public.maca_parking m
+     where m.site = p_site
+       and m."date" = p_date;
+
+    for v_entry in
+        select w.id, w.token
+          from public.maca_waitlist w
+         where w.site = p_site
+           and w."date" = p_date
+           and w.status = 'waiting'
+         order by w.id
+         limit greatest(v_free, 0)
+    loop
+        v_expires := now() + make_interval(secs => p_lock_seconds);
+        insert into public.maca_parking (site, "date", status, expires_at)
+        values (p_site, p_date, 'hold', v_expires)
+        returning id into v_hold;
+
+        update public.maca_waitlist w
+           set status = 'promoted', hold_id = v_hold, hold_expires_at = v_expires
+         where w.id = v_entry.id;
+
+        token := v_entry.token;
+        hold_id := v_hold;
+        hold_expires_at := extract(epoch from v_expires);
+        return next;
+    end loop;
+end;
+$$;
+
+
+-- promote_waitlist: one ordered queue operation per freed bay.
+create or replace function public.promote_waitlist(
+    p_site text,
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer,
+    p_stale_seconds integer default 30
+)
+returns table (token text, hold_id bigint, hold_expires_at float8)
+language plpgsql
+as $$
+begin
+    perform pg_advisory_xact_lock(hashtext('maca_parking:' || p_site), p_date - date '2000-01-01');
+
+    delete from public.maca_parking
+     where status = 'hold'
+       and expires_at <= now();
+
+    return query
+        select * from public._promote_waitlist(p_site, p_date, p_total_bays, p_lock_seconds, p_stale_seconds);
+end;
+$$;
+
+
+-- poll_waitlist: status of many sessions' entries in one round trip. Also
+-- marks waiting entries as seen, so abandoned ones can be dropped.
+create or replace function public.poll_waitlist(p_tokens text[])
+returns table (token text, status text, site text, booking_date text, "position" integer,
+               hold_id bigint, hold_expires_at float8)
+language sql
+as $$
+    with seen as (
+        update public.maca_waitlist w
+           set last_seen = now()
+         where w.token = any(p_tokens)
+           and w.status = 'waiting'
+        returning w.id
+    ),
+    latest as (
+        select distinct on (w.token) w.*
+          from public.maca_waitlist w
+         where w.token = any(p_tokens)
+         order by w.token, w.id desc
+    )
+    select l.token, l.status, l.site, l."date"::text,
+           (select count(*)::integer
+              from public.maca_waitlist a
+             where a.site = l.site and a."date" = l."date"
+               and a.status = 'waiting' and a.id < l.id),
+           l.hold_id, extract(epoch from l.hold_expires_at)::float8
+      from latest l;
+$$;
+
+
+-- reserve_bay: as in 005, but serves the waitlist first and refuses
+-- newcomers while anyone is still waiting for this site and date.
+create or replace function public.reserve_bay(
+    p_date date,
+    p_total_bays integer,
+    p_lock_seconds integer,
+    p_site text default 'colin_st'
+)
+returns bigint
+language plpgsql
+as $$
+declare
+    v_count integer;
+    v_id bigint;
+begin
+    perform pg_advisory_xact_lock(hashtext('maca_parking:' || p_site), p_date - date '2000-01-01');
+
+    delete from public.maca_parking
+     where status = 'hold'
+       and expires_at <= now();
+
+    perform public._promote_waitlist(p_site, p_date, p_total_bays, p_lock_seconds, 30);
+
+    if exists (select 1 from public.maca_waitlist
+                where site = p_site and "date" = p_date and status = 'waiting') then
+        return null;
+    end if;
+
+    select count(*) into v_count
+      from public.maca_parking
+     where site = p_site
+       and "date" = p_date;
+
+    if v_count >= p_total_bays then
+        return null;
+    end if;
+
+    insert into public.maca_parking (site, "date", status, expires_at)
+    values (p_site, p_date, 'hold', now() + make_interval(secs => p_lock_seconds))
+    returning id into v_id;
+
+    return v_id;
+end;
+$$;
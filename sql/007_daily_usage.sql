@@ -0,0 +1,111 @@
+-- --------------------------------------------------
+-- Incrementally maintained usage summaries
+-- --------------------------------------------------
+-- One row per (site, date) and one per registration, kept up to date by a
+-- trigger on maca_parking, so reporting (pages/4_Utilisation.py) reads a
+-- few hundred summary rows instead of scanning the booking history. The
+-- summaries only ever count events, so deleting or archiving old bookings
+-- leaves them intact.
+--
+-- Run while booking is closed (08:30-16:00) so no booking lands between
+-- creating the trigger and the backfill at the end.
+
+create table if not exists public.maca_daily_usage (
+    site text not null,
+    "date" date not null,
+    holds_created integer not null default 0,
+    holds_expired integer not null default 0,
+    holds_released integer not null default 0,
+    bookings integer not null default 0,
+    first_hold_at timestamptz,
+    last_booking_at timestamptz,
+    primary key (site, "date")
+);
+
+create table if not exists public.maca_registration_usage (
+    registration_key text primary key,
+    registration text,
+    bookings integer not null default 0,
+    last_date date
+);
+
+create index if not exists maca_registration_usage_bookings_idx
+    on public.maca_registration_usage (bookings desc);
+
+
+create or replace function public._count_booking(p_site text, p_date date, p_key text,
+                                                 p_registration text, p_at timestamptz)
+returns void
+language sql
+as $$
+    insert into public.maca_daily_usage (site, "date", bookings, last_booking_at)
+    values (p_site, p_date, 1, p_at)
+    on conflict (site, "date") do update
+       set bookings = maca_daily_usage.bookings + 1,
+           last_booking_at = greatest(maca_daily_usage.last_booking_at, excluded.last_booking_at);
+
+    insert into public.maca_registration_usage (registration_key, registration, bookings, last_date)
+    select p_key, p_registration, 1, p_date
+     where coalesce(p_key, '') <> ''
+    on conflict (registration_key) do update
+       set bookings = maca_registration_usage.bookings + 1,
+           registration = excluded.registration,
+           last_date = greatest(maca_registration_usage.last_date, excluded.last_date);
+$$;
+
+
+-- Holds created, confirmed (as bookings), and deleted before confirmation
+-- (expired if past expires_at, otherwise released). Deleting a confirmed
+-- booking is not an event.
+create or replace function public.track_daily_usage()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'INSERT' and new.status = 'hold' then
+        insert into public.maca_daily_usage (site, "date", holds_created, first_hold_at)
+        values (new.site, new."date", 1, new.created_at)
+        on conflict (site, "date") do update
+           set holds_created = maca_daily_usage.holds_created + 1,
+               first_hold_at = least(maca_daily_usage.first_hold_at, excluded.first_hold_at);
+    elsif tg_op = 'INSERT' and new.status = 'confirmed' then
+        perform public._count_booking(new.site, new."date", new.registration_key, new.registration, now());
+    elsif tg_op = 'UPDATE' and old.status = 'hold' and new.status = 'confirmed' then
+        perform public._count_booking(new.site, new."date", new.registration_key, new.registration, now());
+    elsif tg_op = 'DELETE' and old.status = 'hold' then
+        update public.maca_daily_usage
+           set holds_expired = holds_expired + (old.expires_at <= now())::integer,
+               holds_released = holds_released + (old.expires_at > now())::integer
+         where site = old.site
+           and "date" = old."date";
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists maca_parking_daily_usage on public.maca_parking;
+create trigger maca_parking_daily_usage
+    after insert or update of status or delete on public.maca_parking
+    for each row execute function public.track_daily_usage();
+
+
+-- One-off backfill from existing bookings. Lapsed holds were deleted
+-- without trace, so historical expiry counts start at zero; confirmation
+-- times were never stored, so the hold's created_at stands in for them.
+insert into public.maca_daily_usage (site, "date", holds_created, bookings, first_hold_at, last_booking_at)
+select site, "date",
+       count(*),
+       count(*) filter (where status = 'confirmed'),
+       min(created_at),
+       max(created_at) filter (where status = 'confirmed')
+  from public.maca_parking
+ group by site, "date"
+on conflict (site, "date") do nothing;
+
+insert into public.maca_registration_usage (registration_key, registration, bookings, last_date)
+select registration_key, max(registration), count(*), max("date")
+  from public.maca_parking
+ where status = 'confirmed'
+   and coalesce(registration_key, '') <> ''
+ group by registration_key
+on conflict (registration_key) do nothing;
@@ -0,0 +1,87 @@
+-- --------------------------------------------------
+-- Archive tables for old bookings and expired blacklist entries
+-- --------------------------------------------------
+-- tools/archive.py calls archive_rows() repeatedly; each call moves at most
+-- p_batch rows out of the hot table in one short transaction. Rows are
+-- deleted and inserted by the same statement, so a batch is either fully
+-- archived or untouched, and re-running simply carries on with whatever is
+-- left. Concurrent runs skip each other's locked rows.
+--
+-- Usage summaries (sql/007_daily_usage.sql) ignore deleted bookings, so
+-- reporting is unaffected.
+--
+-- The archive tables copy the hot tables' columns, in order, followed by
+-- archived_at, and archive_rows relies on that order. A later migration
+-- that adds a column to a hot table must also change archive_rows to name
+-- its columns (an added archive column would land after archived_at).
+
+create table if not exists public.maca_parking_archive
+    (like public.maca_parking);
+alter table public.maca_parking_archive
+    add column if not exists archived_at timestamptz not null default now();
+create index if not exists maca_parking_archive_date_idx
+    on public.maca_parking_archive ("date");
+
+create table if not exists public.blacklist_archive
+    (like public.blacklist);
+alter table public.blacklist_archive
+    add column if not exists archived_at timestamptz not null default now();
+
+create index if not exists blacklist_suspension_end_idx
+    on public.blacklist (suspension_end);
+
+
+-- archive_rows: moves up to p_batch rows older than p_before:
+--   maca_parking: confirmed bookings with "date" < p_before
+--   blacklist:    entries whose suspension_end < p_before
+-- Returns the number of rows moved (0 when nothing is left).
+create or replace function public.archive_rows(
+    p_table text,
+    p_before date,
+    p_batch integer
+)
+returns integer
+language plpgsql
+as $$
+declare
+    v_moved integer;
+begin
+    if p_table = 'maca_parking' then
+        with batch as (
+            select id from public.maca_parking
+             where "date" < p_before
+               and status = 'confirmed'
+             order by id
+             limit p_batch
+               for update skip locked
+        ), moved as (
+            delete from public.maca_parking m
+             using batch
+             where m.id = batch.id
+            returning m.*
+        )
+        insert into public.maca_parking_archive
+        select moved.*, now() from moved;
+    elsif p_table = 'blacklist' then
+        with batch as (
+            select id from public.blacklist
+             where suspension_end < p_before
+             order by id
+             limit p_batch
+               for update skip locked
+        ), moved as (
+            delete from public.blacklist b
+             using batch
+             where b.id = batch.id
+            returning b.*
+        )
+        insert into public.blacklist_archive
+        select moved.*, now() from moved;
+    else
+        raise exception 'unsupported table %', p_table;
+    end if;
+
+    get diagnostics v_moved = row_count;
+    return v_moved;
+end;
+$$;
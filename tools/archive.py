@@ -0,0 +1,138 @@
+"""
+Batched archiving of old bookings and expired blacklist entries.
+
+Keeps maca_parking and blacklist small. Confirmed bookings dated more than
+--keep-days ago, and blacklist entries whose suspension ended more than
+--blacklist-grace-days ago, are moved out --batch-size rows at a time, one
+short transaction per batch, pausing between batches to leave room for
+live traffic. Lapsed holds are swept first.
+
+Targets:
+    database  (default) archive_rows() moves each batch into
+              maca_parking_archive / blacklist_archive in one statement
+              (sql/008_archive.sql).
+    parquet   each batch is written to
+              <out-dir>/<table>/<table>-<first id>-<last id>.parquet and
+              synced to disk, and only then deleted from the hot table.
+
+Safe to run repeatedly: every batch is all-or-nothing, so an interrupted
+run leaves the remaining rows for the next one. (With parquet, a batch
+interrupted between writing and deleting is written again next run; id
+stays unique across the archive files.)
+
+Usage (from the repo root, with .streamlit/secrets.toml in place):
+    python tools/archive.py [--target database|parquet] [--keep-days 90]
+        [--blacklist-grace-days 0] [--batch-size 500] [--pause 0.2]
+        [--out-dir archive] [--table maca_parking ...]
+
+Nightly while booking is closed, e.g. from cron:
+    0 10 * * * cd /srv/parking && python tools/archive.py >> archive.log 2>&1
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking import db  # noqa: E402
+from parking.booking_window import local_now  # noqa: E402
+from parking.export import write_parquet  # noqa: E402
+from parking.storage import ARCHIVE_TABLES, EXPORTS  # noqa: E402
+
+TABLES = tuple(ARCHIVE_TABLES)
+
+
+def archive_before(table, today, keep_days, grace_days):
+    """Rows dated (bookings) or suspended until (blacklist) before this date are archived."""
+    days = keep_days if table == db.BOOKINGS_TABLE else grace_days
+    return today - datetime.timedelta(days=days)
+
+
+def archive_to_database(table, before, batch_size, pause):
+    total = 0
+    while True:
+        moved = db.archive_rows(table, before, batch_size)
+        if not moved:
+            print(f"{table}: {total} row(s) archived to {ARCHIVE_TABLES[table]}")
+            return total
+        total += moved
+        print(f"{table}: moved {moved} (total {total})")
+        time.sleep(pause)  # leave room for live traffic between batches
+
+
+@contextmanager
+def exclusive(path):
+    """Stops two parquet runs writing the same batches at once."""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        sys.exit(f"{path} exists: another archive run is in progress (delete it if not).")
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(path)
+
+
+def archive_to_parquet(table, before, batch_size, pause, out_dir):
+    spec = EXPORTS[table]
+    table_dir = os.path.join(out_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+    total, after_id = 0, 0
+    while True:
+        # Same rows archive_rows would move: the export projection, dated before `before`
+        rows = db.fetch_export_page(table, after_id, batch_size, None, before - datetime.timedelta(days=1))
+        if not rows:
+            print(f"{table}: {total} row(s) archived to {table_dir}")
+            return total
+        first, last = rows[0]["id"], rows[-1]["id"]
+        path = os.path.join(table_dir, f"{table}-{first:010d}-{last:010d}.parquet")
+        with open(path + ".tmp", "wb") as out:
+            write_parquet([rows], spec, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(path + ".tmp", path)
+
+        db.purge_rows(table, [row["id"] for row in rows])
+        total += len(rows)
+        after_id = last
+        print(f"{table}: wrote {os.path.basename(path)} (total {total})")
+        time.sleep(pause)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--target", choices=("database", "parquet"), default="database")
+    ap.add_argument("--table", action="append", choices=TABLES, help="Table(s) to archive (default: all)")
+    ap.add_argument("--keep-days", type=int, default=90, help="Days of past bookings kept in maca_parking")
+    ap.add_argument("--blacklist-grace-days", type=int, default=0,
+                    help="Days expired blacklist entries are kept after suspension_end")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--pause", type=float, default=0.2, help="Seconds to sleep between batches")
+    ap.add_argument("--out-dir", default="archive", help="Parquet target directory")
+    args = ap.parse_args()
+
+    print(f"Swept {db.expire_holds()} lapsed hold(s)")
+    today = local_now().date()
+    tables = args.table or TABLES
+    if args.target == "database":
+        for table in tables:
+            archive_to_database(table, archive_before(table, today, args.keep_days, args.blacklist_grace_days),
+                                args.batch_size, args.pause)
+        return 0
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with exclusive(os.path.join(args.out_dir, ".archive.lock")):
+        for table in tables:
+            archive_to_parquet(table, archive_before(table, today, args.keep_days, args.blacklist_grace_days),
+                               args.batch_size, args.pause, args.out_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
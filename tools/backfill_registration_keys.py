@@ -0,0 +1,76 @@
+"""
+Resumable, batched backfill of registration_key.
+
+Walks each table in id order calling db.backfill_registration_keys (the
+backfill_registration_keys() database function, sql/004_registration_key.sql,
+on Postgres), one short transaction per batch, so rows are never locked for
+long. Works with every [storage] BACKEND. Progress is saved to a state file
+after every batch; re-running picks up where the last run stopped.
+
+Usage (from the repo root, with .streamlit/secrets.toml in place):
+    python tools/backfill_registration_keys.py [--batch-size 500] [--pause 0.2]
+        [--table maca_parking ...] [--state-file .backfill_state.json] [--restart]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking import db  # noqa: E402
+
+TABLES = (db.BOOKINGS_TABLE, db.APPROVED_TABLE, db.BLACKLIST_TABLE)
+
+
+def load_state(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def backfill_table(table, state, state_file, batch_size, pause):
+    entry = state.setdefault(table, {"after_id": 0, "done": False})
+    if entry["done"]:
+        print(f"{table}: already complete")
+        return
+    while True:
+        last_id = db.backfill_registration_keys(table, entry["after_id"], batch_size)
+        if last_id is None:
+            entry["done"] = True
+            save_state(state_file, state)
+            print(f"{table}: complete")
+            return
+        entry["after_id"] = last_id
+        save_state(state_file, state)
+        print(f"{table}: through id {last_id}")
+        time.sleep(pause)  # leave room for live traffic between batches
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--table", action="append", choices=TABLES, help="Table(s) to backfill (default: all)")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--pause", type=float, default=0.2, help="Seconds to sleep between batches")
+    ap.add_argument("--state-file", default=".backfill_state.json")
+    ap.add_argument("--restart", action="store_true", help="Ignore saved progress")
+    args = ap.parse_args()
+
+    state = {} if args.restart else load_state(args.state_file)
+    for table in args.table or TABLES:
+        backfill_table(table, state, args.state_file, args.batch_size, args.pause)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())